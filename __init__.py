@@ -1,7 +1,7 @@
-__all__ = ['core', 'individual', 'spatial', 'network', 'helper', 'io', 'utils', 'tests', 'special']
+__all__ = ['core', 'individual', 'spatial', 'network', 'helper', 'io', 'utils', 'tests', 'special', 'columnar', 'cache', 'dataset', 'batch', 'attributes']
 
 from .io import read_csv
 from .core import User
-from . import individual, spatial, network, helper, utils, io, tests, core, special
+from . import individual, spatial, network, helper, utils, io, tests, core, special, columnar, cache, dataset, batch, attributes
 
 __version__ = "0.4.0"
@@ -0,0 +1,176 @@
+"""
+A single table holding the attributes of a whole population, loaded once
+and queried for each user instead of reading one attributes file per user.
+"""
+
+from __future__ import division
+
+import bandicoot_dev as bc
+
+import csv
+import os
+import numpy as np
+
+
+class AttributesTable(object):
+    """
+    The attributes of many users, indexed by user id.
+
+    User ids are kept in a sorted array, and each column holds the codes of
+    its values in a list of distinct values, so that a table of millions of
+    users with a few categorical attributes (e.g. age and gender) only takes
+    a few bytes per user.
+
+    Tables are created with :meth:`read_attributes_table`, from a CSV file
+    with one row per user or a binary file written by :meth:`save`.
+
+    Examples
+    --------
+
+    >>> table = bandicoot.attributes.read_attributes_table('attributes.csv')
+    >>> table.get('ego')
+    {'age': '42', 'gender': 'male'}
+    """
+
+    def __init__(self, ids, columns, codes, categories, path=None):
+        self.ids = ids
+        self.columns = columns
+        self.codes = codes
+        self.categories = categories
+        self.path = path
+
+    @classmethod
+    def from_csv(cls, filename, user_column='user_id'):
+        """
+        Read a CSV file with a header, a ``user_column`` column with the
+        user ids, and one column per attribute. Empty cells are missing
+        attributes. The file can be compressed (.gz, .bz2 or .xz).
+        """
+        with bc.io._open_input(filename) as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            if user_column not in header:
+                raise KeyError(user_column)
+            key = header.index(user_column)
+            columns = [c for i, c in enumerate(header) if i != key]
+
+            ids = []
+            codes = [[] for _ in columns]
+            values = [{} for _ in columns]
+            for row in reader:
+                if not row:
+                    continue
+                ids.append(row[key])
+                del row[key]
+                row += [''] * (len(columns) - len(row))
+                for value, column_codes, column_values in zip(row, codes, values):
+                    if value == '':
+                        column_codes.append(-1)
+                    else:
+                        column_codes.append(column_values.setdefault(value, len(column_values)))
+
+        ids = np.array(ids, dtype=str)
+        order = np.argsort(ids, kind='mergesort')
+        ids = ids[order]
+        duplicates = ids[1:][ids[1:] == ids[:-1]]
+        if len(duplicates) > 0:
+            raise ValueError("User {} has more than one row.".format(duplicates[0]))
+
+        categories = []
+        for i, column_values in enumerate(values):
+            dtype = np.min_scalar_type(-max(len(column_values), 1))
+            codes[i] = np.array(codes[i], dtype=dtype)[order]
+            categories.append([v for v, _ in sorted(column_values.items(), key=lambda t: t[1])])
+
+        return cls(ids, columns, codes, categories, filename)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Read a table written by :meth:`save`.
+        """
+        with np.load(filename) as f:
+            columns = f['columns'].tolist()
+            return cls(f['ids'], columns,
+                       [f['codes_%d' % i] for i in range(len(columns))],
+                       [f['categories_%d' % i].tolist() for i in range(len(columns))],
+                       filename)
+
+    def save(self, filename):
+        """
+        Write the table in NumPy's .npz format, to be read back without
+        parsing by :meth:`read_attributes_table`.
+        """
+        arrays = {'ids': self.ids, 'columns': np.array(self.columns, dtype=str)}
+        for i in range(len(self.columns)):
+            arrays['codes_%d' % i] = self.codes[i]
+            arrays['categories_%d' % i] = np.array(self.categories[i], dtype=str)
+        with open(filename, 'wb') as f:
+            np.savez(f, **arrays)
+
+    def _index(self, user_id):
+        i = np.searchsorted(self.ids, user_id)
+        if i < len(self.ids) and self.ids[i] == user_id:
+            return i
+        return None
+
+    def get(self, user_id, default=None):
+        """
+        Return the dictionary of attributes of ``user_id``, or ``default``
+        if the user is not in the table.
+        """
+        i = self._index(user_id)
+        if i is None:
+            return default
+        attributes = {}
+        for column, codes, categories in zip(self.columns, self.codes, self.categories):
+            code = codes[i]
+            if code >= 0:
+                attributes[column] = categories[code]
+        return attributes
+
+    def __contains__(self, user_id):
+        return self._index(user_id) is not None
+
+    def __len__(self):
+        return len(self.ids)
+
+
+_tables = {}
+
+
+def read_attributes_table(filename, user_column='user_id'):
+    """
+    Load an :class:`AttributesTable` from a CSV file (see
+    :meth:`AttributesTable.from_csv`) or a .npz file written by
+    :meth:`AttributesTable.save`.
+
+    Tables are loaded once per process, and loaded again if the file
+    changes.
+    """
+    stat = os.stat(filename)
+    key = (os.path.abspath(filename), user_column)
+    signature = (stat.st_size, stat.st_mtime)
+
+    if key not in _tables or _tables[key][0] != signature:
+        if filename.endswith('.npz'):
+            table = AttributesTable.load(filename)
+        else:
+            table = AttributesTable.from_csv(filename, user_column)
+        _tables[key] = (signature, table)
+    return _tables[key][1]
+
+
+def attributes_table(attributes_path):
+    """
+    Return the table given as ``attributes_path`` (an
+    :class:`AttributesTable` or the path of a file), or None if it is a
+    directory of attributes files.
+    """
+    if attributes_path is None:
+        return None
+    if not isinstance(attributes_path, basestring):
+        return attributes_path
+    if os.path.isfile(attributes_path):
+        return read_attributes_table(attributes_path)
+    return None
@@ -0,0 +1,504 @@
+"""
+Computing indicators for many users in parallel, streaming the results.
+"""
+
+from __future__ import division
+
+import bandicoot_dev as bc
+from bandicoot_dev.helper.tools import OrderedDict
+
+from collections import deque
+from functools import partial
+import multiprocessing
+import multiprocessing.util
+import os
+import Queue
+import threading
+import time
+
+
+ERROR_FIELDS = ['error', 'error_type', 'error_message']
+
+
+def _error_row(user_id, error):
+    return OrderedDict([
+        ('name', user_id),
+        ('error', True),
+        ('error_type', type(error).__name__),
+        ('error_message', str(error))
+    ])
+
+
+def _run_chunk(loader, compute, user_ids):
+    """
+    Load and compute the users of one chunk. Errors raised for a user are
+    returned as error rows.
+    """
+    if hasattr(loader, 'prefetch'):
+        loader.prefetch(user_ids)
+
+    results = []
+    for user_id in user_ids:
+        try:
+            user = loader(user_id) if callable(loader) else loader[user_id]
+            results.append(compute(user))
+        except Exception as e:
+            results.append(_error_row(user_id, e))
+    return results
+
+
+# The loader and compute function of a pool worker, set by _init_worker
+_WORKER = None
+
+
+def _init_worker(loader, compute):
+    global _WORKER
+    _WORKER = (loader, compute)
+    if hasattr(loader, 'close'):
+        # Reading threads are kept for the lifetime of the worker
+        multiprocessing.util.Finalize(None, loader.close, exitpriority=10)
+
+
+def _run_worker_chunk(user_ids):
+    """
+    Run a chunk in a pool worker. The counters of the worker's loader (see
+    :meth:`PrefetchLoader.stats`) are returned with the results, as their
+    increase during the chunk.
+    """
+    loader, compute = _WORKER
+    before = _counters(loader)
+    results = _run_chunk(loader, compute, user_ids)
+    after = _counters(loader)
+    return results, dict((key, after[key] - before[key]) for key in after)
+
+
+def _counters(loader):
+    if not isinstance(loader, PrefetchLoader):
+        return {}
+    return dict((key, getattr(loader, key)) for key in PrefetchLoader.COUNTERS)
+
+
+def _add_counters(loader, counters):
+    for key, value in counters.items():
+        setattr(loader, key, getattr(loader, key) + value)
+
+
+def _chunks(user_ids, chunksize, estimate, relative=False):
+    """
+    Group user ids in chunks whose estimated sizes add up to ``chunksize``.
+    If ``relative`` is True, sizes are measured in average users: chunks add
+    up to ``chunksize`` times the mean estimate of the users seen so far.
+    """
+    if estimate is None:
+        relative, estimate = False, lambda user_id: 1
+
+    chunk, size = [], 0
+    total, seen = 0, 0
+    for user_id in user_ids:
+        chunk.append(user_id)
+        if relative:
+            # One more unit per user, so that empty users still add up
+            user_size = estimate(user_id) + 1
+            total += user_size
+            seen += 1
+        else:
+            user_size = estimate(user_id)
+        size += user_size
+        if size >= (chunksize * total / seen if relative else chunksize):
+            yield chunk
+            chunk, size = [], 0
+    if chunk:
+        yield chunk
+
+
+def _files_size(user_id, paths):
+    """
+    The total size in bytes of the files of ``user_id`` in the directories
+    ``paths``, as read by :meth:`~bandicoot.io.read_csv`.
+    """
+    size = 0
+    for path in paths:
+        if path is None or bc.io.attributes_table(path) is not None:
+            continue
+        try:
+            size += os.path.getsize(bc.io._user_file(path, user_id))
+        except OSError:
+            pass
+    return size
+
+
+def _size_hint(loader):
+    """
+    A cheap estimate of the size of each user of ``loader``: the ``size``
+    method of datasets and prefetching loaders, or the size of the files
+    read by a partial :meth:`~bandicoot.io.read_csv`. Returns None if the
+    loader gives no hint.
+    """
+    if hasattr(loader, 'size'):
+        return loader.size
+    if isinstance(loader, partial) and loader.func is bc.io.read_csv:
+        paths = [(loader.keywords or {}).get(name) for name in _PATHS]
+        return lambda user_id: _files_size(user_id, paths)
+    return None
+
+
+_PATHS = ['call_path', 'text_path', 'physical_path', 'screen_path', 'stop_path',
+          'attributes_path']
+
+
+class _Prefetched(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.files = None
+        self.seconds = 0
+
+
+class PrefetchLoader(object):
+    """
+    Load users with :meth:`~bandicoot.io.read_csv`, reading the files of the
+    next users on background threads while the current user is computed.
+
+    :meth:`prefetch` queues user ids to read in advance. The files of at most
+    ``prefetch`` users are read ahead of the user being loaded, so the memory
+    used stays bounded. Users which were not queued are read when they are
+    loaded. :meth:`~bandicoot.batch.run` queues the users of each chunk.
+    Users are expected to be loaded in the order they were queued: loading a
+    user forgets the users queued before it, which were skipped.
+
+    Parameters
+    ----------
+    threads : int, default 2
+        Number of reading threads.
+    prefetch : int, default 4
+        Maximum number of users read in advance.
+    **kwargs
+        The arguments of :meth:`~bandicoot.io.read_csv`, e.g. ``call_path``.
+
+    Attributes
+    ----------
+    prefetched, direct : int
+        Number of users loaded from files read in advance, or read directly.
+    read_time : float
+        Seconds spent by the threads reading the files of prefetched users.
+    wait_time : float
+        Seconds spent waiting for these files when loading the users. The
+        difference, ``read_time - wait_time``, is the reading time hidden
+        behind computations (see :meth:`stats`).
+
+    When the loader is given to :meth:`~bandicoot.batch.run`, the counters
+    of the copies used by the worker processes are added to these ones. The
+    copies are closed with the workers, but this loader is left open:
+    call :meth:`close` to stop its threads.
+
+    Examples
+    --------
+
+    >>> loader = bc.batch.PrefetchLoader(call_path='records/', describe=False)
+    >>> bc.batch.run(user_ids, loader, workers=8, output='indicators.csv')
+    >>> loader.stats()['hidden_time']
+    """
+
+    COUNTERS = ('prefetched', 'direct', 'read_time', 'wait_time')
+
+    def __init__(self, threads=2, prefetch=4, **kwargs):
+        self.threads = threads
+        self.prefetch_size = prefetch
+        self.kwargs = kwargs
+        self.prefetched = 0
+        self.direct = 0
+        self.read_time = 0.
+        self.wait_time = 0.
+        self._paths = [kwargs.get(name) for name in _PATHS]
+        self._tasks = Queue.Queue()
+        self._queued = deque()
+        self._pending = OrderedDict()
+        self._workers = []
+
+    def size(self, user_id):
+        """
+        The size in bytes of the files of ``user_id``, used by
+        :meth:`~bandicoot.batch.run` to balance the chunks.
+        """
+        return _files_size(user_id, self._paths)
+
+    def stats(self):
+        return {'prefetched': self.prefetched, 'direct': self.direct,
+                'read_time': self.read_time, 'wait_time': self.wait_time,
+                'hidden_time': self.read_time - self.wait_time}
+
+    def prefetch(self, user_ids):
+        """
+        Queue ``user_ids`` to be read in advance, in this order.
+        """
+        self._queued.extend(user_ids)
+        self._submit()
+
+    def _submit(self):
+        while self._queued and len(self._pending) < self.prefetch_size:
+            user_id = self._queued.popleft()
+            if user_id in self._pending:
+                continue
+            self._pending[user_id] = slot = _Prefetched()
+            self._tasks.put((user_id, slot))
+
+        while len(self._workers) < min(self.threads, len(self._pending)):
+            worker = threading.Thread(target=self._read)
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def _read(self):
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                return
+            user_id, slot = task
+            start = time.time()
+            try:
+                slot.files = bc.io._read_user_files(user_id, self._paths)
+            except Exception:
+                pass  # Read again when loading the user, to raise the error there
+            slot.seconds = time.time() - start
+            slot.done.set()
+
+    def _skip(self, user_id):
+        """
+        Forget the users queued before ``user_id``, so that their files do
+        not take the place of the next users.
+        """
+        if user_id in self._pending:
+            while next(iter(self._pending)) != user_id:
+                self._pending.popitem(last=False)
+        elif user_id in self._queued:
+            self._pending.clear()
+            while self._queued.popleft() != user_id:
+                pass
+
+    def __call__(self, user_id):
+        self._skip(user_id)
+        slot = self._pending.pop(user_id, None)
+        if slot is not None:
+            start = time.time()
+            while not slot.done.wait(0.1):
+                pass
+            self.wait_time += time.time() - start
+            self.read_time += slot.seconds
+            self.prefetched += 1
+        else:
+            self.direct += 1
+
+        # Read the next users while this one is parsed and computed
+        self._submit()
+        files = slot.files if slot is not None else None
+        return bc.read_csv(user_id, files=files, **self.kwargs)
+
+    def close(self):
+        """
+        Stop the reading threads, and forget the queued users. Threads are
+        started again when users are queued.
+        """
+        self._queued.clear()
+        for _ in self._workers:
+            self._tasks.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+        self._pending = OrderedDict()
+        self._tasks = Queue.Queue()
+
+    def __getstate__(self):
+        return {'threads': self.threads, 'prefetch': self.prefetch_size, 'kwargs': self.kwargs}
+
+    def __setstate__(self, state):
+        self.__init__(state['threads'], state['prefetch'], **state['kwargs'])
+
+
+class _CSVOutput(object):
+    """
+    Write result rows with a :class:`~bandicoot.io.CSVWriter` as they
+    arrive. The columns are the flattened keys of the first successful
+    result, followed by the error columns. Error rows received before are
+    kept until the columns are known.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.writer = None
+        self.pending = []
+
+    def __call__(self, row):
+        if self.writer is None:
+            if row.get('error') is True:
+                self.pending.append(row)
+                return
+            self._start(bc.utils.flatten(row).keys())
+        self.writer.write(row)
+
+    def _start(self, keys):
+        fields = list(keys) + [k for k in ERROR_FIELDS if k not in keys]
+        self.writer = bc.io.CSVWriter(self.f, fields=fields)
+        self.writer.writerows(self.pending)
+        self.pending = []
+
+    def close(self):
+        if self.writer is None:
+            self._start(['name'])
+        self.writer.close()
+
+
+def _is_jsonl(output):
+    if not isinstance(output, basestring):
+        return False
+    base, ext = os.path.splitext(output)
+    if ext in bc.io._COMPRESSIONS:
+        base, ext = os.path.splitext(base)
+    return ext == '.jsonl'
+
+
+def run(user_ids, loader, workers=None, chunksize=16, output=None,
+        estimate=None, max_in_flight=None, compute=None, **kwargs):
+    """
+    Compute the indicators of many users with a pool of worker processes.
+
+    Users are loaded and computed in chunks by the workers, and results are
+    written to ``output`` as soon as a chunk is done, in order of
+    completion. At most ``max_in_flight`` chunks are submitted at a time, so
+    the memory used does not depend on the number of users.
+
+    Parameters
+    ----------
+    user_ids : iterable
+        The ids of the users, e.g. a generator.
+    loader : callable or Dataset
+        Called with a user id to load the user in a worker, e.g.
+        ``functools.partial(bc.read_csv, call_path='records/', describe=False)``.
+        It must be picklable. A :class:`~bandicoot.dataset.Dataset` can also
+        be given, and users are then loaded with ``dataset[user_id]``.
+    workers : int, optional
+        Number of worker processes, by default the number of CPUs. With 0,
+        users are computed in the current process.
+    chunksize : int, default 16
+        Estimated size of each chunk of users sent to a worker, in users of
+        average size unless ``estimate`` is given.
+    output : str, file or callable, optional
+        A path or an open file to write the results in CSV format (see
+        :class:`~bandicoot.io.CSVWriter`), a path ending with .jsonl
+        (optionally compressed, e.g. .jsonl.gz) to write them in JSON Lines
+        format (see :class:`~bandicoot.io.JSONLinesWriter`), or a function
+        called with each result. If None, the results are returned in a list.
+    estimate : callable, optional
+        Returns the estimated size of a user (e.g. its number of records or
+        the size of its files), to balance the chunks. Chunks then add up to
+        ``chunksize`` in this unit. By default, the size hint of the loader
+        is used: the number of records of a dataset user, or the size of the
+        files read by :class:`PrefetchLoader` or a partial
+        :meth:`~bandicoot.io.read_csv`. Chunks are then balanced to hold the
+        records of about ``chunksize`` users of average size. Without a
+        hint, each user counts as 1.
+    max_in_flight : int, optional
+        Maximum number of chunks submitted and not yet written. Defaults to
+        twice the number of workers.
+    compute : callable, optional
+        Computes the result of a user, by default
+        :meth:`~bandicoot.utils.all` called with the other keyword arguments.
+        It must be picklable.
+
+    Returns
+    -------
+    The list of results if ``output`` is None, otherwise a dictionary
+    counting the ``users`` and the ``errors``.
+
+    Errors raised while loading or computing a user are reported with a row
+    holding the user's ``name``, and the ``error``, ``error_type`` and
+    ``error_message`` fields.
+
+    Examples
+    --------
+
+    >>> loader = functools.partial(bc.read_csv, call_path='records/', describe=False)
+    >>> bc.batch.run(user_ids, loader, workers=8, output='indicators.csv')
+    {'users': 1000, 'errors': 2}
+    """
+    if compute is None:
+        compute = partial(bc.utils.all, **kwargs)
+    elif kwargs:
+        raise TypeError("Keyword arguments are only used with the default compute function.")
+
+    results = []
+    counts = {'users': 0, 'errors': 0}
+
+    close = None
+    if output is None:
+        sink = results.append
+    elif callable(output):
+        sink = output
+    elif _is_jsonl(output):
+        writer = bc.io.JSONLinesWriter(output)
+        sink, close = writer.write, writer.close
+    else:
+        writer = _CSVOutput(output)
+        sink, close = writer, writer.close
+
+    def _write(rows):
+        for row in rows:
+            counts['users'] += 1
+            if row.get('error') is True:
+                counts['errors'] += 1
+            sink(row)
+
+    if estimate is None:
+        chunks = _chunks(user_ids, chunksize, _size_hint(loader), relative=True)
+    else:
+        chunks = _chunks(user_ids, chunksize, estimate)
+    try:
+        if workers == 0:
+            for chunk in chunks:
+                _write(_run_chunk(loader, compute, chunk))
+        else:
+            _run_pool(chunks, loader, compute, workers, max_in_flight, _write)
+    finally:
+        if close is not None:
+            close()
+
+    return results if output is None else counts
+
+
+def _run_pool(chunks, loader, compute, workers, max_in_flight, write):
+    # The loader and compute function are sent once to each worker, and
+    # only user ids are sent with the chunks
+    pool = multiprocessing.Pool(workers, _init_worker, (loader, compute))
+    if max_in_flight is None:
+        max_in_flight = 2 * (workers or multiprocessing.cpu_count())
+
+    pending = {}  # Submitted chunks, by number
+    done = Queue.Queue()
+
+    def _wait():
+        while True:
+            try:
+                k, (rows, counters) = done.get(timeout=0.1)
+            except Queue.Empty:
+                # Chunks failing outside _run_chunk never call back
+                for result in pending.values():
+                    if result.ready() and not result.successful():
+                        result.get()
+                continue
+            del pending[k]
+            _add_counters(loader, counters)
+            write(rows)
+            return
+
+    try:
+        for k, chunk in enumerate(chunks):
+            if len(pending) >= max_in_flight:
+                _wait()
+            pending[k] = pool.apply_async(_run_worker_chunk, (chunk, ),
+                                          callback=lambda result, k=k: done.put((k, result)))
+        while pending:
+            _wait()
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
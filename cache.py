@@ -0,0 +1,254 @@
+"""Caches of users parsed from CSV files, on disk and in memory."""
+
+from __future__ import division
+
+import bandicoot_dev as bc
+from bandicoot_dev.helper.tools import OrderedDict
+from bandicoot_dev.columnar import ColumnarRecords, StringTable, STRINGS, INTERACTIONS
+
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+
+
+VERSION = 2
+
+_CODED_FIELDS = ['correspondent_id', 'position', 'event']
+
+
+def _to_str(obj):
+    """
+    Convert the unicode strings returned by ``json.loads`` back to ``str``.
+    """
+    if isinstance(obj, unicode):
+        return obj.encode('utf-8')
+    if isinstance(obj, dict):
+        return dict((_to_str(k), _to_str(v)) for k, v in obj.items())
+    if isinstance(obj, list):
+        return [_to_str(v) for v in obj]
+    return obj
+
+
+class DiskCache(object):
+    """
+    Cache of the users loaded by :meth:`~bandicoot.io.read_csv`, stored in a
+    directory.
+
+    Each user is stored in a NumPy ``.npz`` file holding its validated,
+    sorted and deduplicated records (in the layout of
+    :class:`~bandicoot.columnar.ColumnarRecords`, with a string table of their
+    own), its ``ignored_records`` counts, its attributes, and the size and
+    modification time of the files it was read from. The cached user is used
+    as long as none of these files changed.
+
+    Attributes
+    ----------
+    path : str
+        The cache directory, created if needed.
+    hits : int
+        Number of users loaded from the cache.
+    misses : int
+        Number of users which were not in the cache, or were outdated.
+
+    Examples
+    --------
+
+    >>> cache = bandicoot.cache.DiskCache('/tmp/bandicoot')
+    >>> user = bandicoot.read_csv('u1', 'records/', cache=cache)
+    >>> cache.stats()
+    {'hits': 0, 'misses': 1}
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+    def _filename(self, user_id, sources):
+        # The user id is only hashed, as it can contain '/' or '..'
+        digest = hashlib.sha1(json.dumps([user_id, sources])).hexdigest()
+        return os.path.join(self.path, '%s.npz' % digest)
+
+    @staticmethod
+    def _signature(sources):
+        signature = []
+        for source in sources:
+            try:
+                stat = os.stat(source)
+                signature.append([stat.st_size, stat.st_mtime])
+            except (OSError, TypeError):
+                signature.append(None)
+        return signature
+
+    def load(self, user_id, sources, columnar=False):
+        """
+        Return the user cached for ``user_id`` and the source files
+        ``sources`` (the records files of each interaction type, then the
+        attributes file, None when there is none), or None if there is no
+        up-to-date entry.
+        """
+        try:
+            with np.load(self._filename(user_id, sources)) as f:
+                meta = _to_str(json.loads(str(f['meta'])))
+                if meta['version'] != VERSION or \
+                        meta['signature'] != self._signature(sources):
+                    raise ValueError("Outdated cache entry")
+                strings = f['strings']
+                arrays = dict((t, f[t]) for t in meta['records'])
+        except (IOError, KeyError, ValueError):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+
+        # Codes of the cached string table in the shared table of the process.
+        # Records converted to objects use a table of their own, so that
+        # their strings are not kept by the process.
+        table = STRINGS if columnar else StringTable()
+        mapping = np.array([table.code(s) for s in strings.tolist()] + [-1], dtype=np.int32)
+
+        user = bc.core.User(columnar=columnar)
+        user.name = user_id
+        for interaction in INTERACTIONS:
+            if interaction not in arrays:
+                continue
+            data = arrays[interaction]
+            for field in _CODED_FIELDS:
+                data[field] = mapping[data[field]]
+            records = ColumnarRecords(data, table, meta['int_durations'][interaction])
+            setattr(user, interaction + '_records', records if columnar else list(records))
+            user.ignored_records[interaction] = meta['ignored'][interaction]
+
+        user.attributes = meta['attributes']
+        return user
+
+    def save(self, user_id, sources, user):
+        """
+        Store ``user`` in the cache, for the source files ``sources`` (see
+        :meth:`load`).
+        """
+        strings = StringTable()
+        arrays, meta = {}, {
+            'version': VERSION,
+            'signature': self._signature(sources),
+            'records': [],
+            'ignored': {},
+            'int_durations': {},
+            'attributes': user.attributes
+        }
+
+        for interaction in INTERACTIONS:
+            ignored = user.ignored_records[interaction]
+            if ignored is None:
+                continue
+            store = ColumnarRecords.from_records(getattr(user, interaction + '_records'), strings)
+            arrays[interaction] = store.data
+            meta['records'].append(interaction)
+            meta['ignored'][interaction] = ignored
+            meta['int_durations'][interaction] = store.int_durations
+
+        arrays['strings'] = np.array([strings.string(i) for i in range(len(strings))], dtype=str)
+        arrays['meta'] = np.array(json.dumps(meta))
+
+        # Write to a temporary file first, so that readers never see a
+        # partial entry
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.npz')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **arrays)
+        os.rename(tmp, self._filename(user_id, sources))
+
+
+
+def _number_of_records(user):
+    return sum(len(getattr(user, '_%s_records' % t)) for t in INTERACTIONS)
+
+
+class UserCache(object):
+    """
+    In-memory cache of users, shared by the network loads of
+    :meth:`~bandicoot.io.read_csv` in a process, so that the file of a
+    correspondent is parsed once rather than once per ego knowing them.
+
+    The least recently used users are evicted when there are more than
+    ``max_users`` users, or more than ``max_records`` records in total (a
+    proxy for memory). Entries are dropped when their files change.
+
+    Cached users are shared: callers must not modify them, and should work
+    on a :meth:`~bandicoot.core.User.copy` instead.
+
+    Parameters
+    ----------
+    max_users : int, default 1024
+        Maximum number of users kept. With 0, nothing is cached.
+    max_records : int, optional
+        Maximum number of records kept, for all users.
+
+    Examples
+    --------
+
+    >>> cache = bandicoot.cache.UserCache(max_records=10 ** 7)
+    >>> for user_id in user_ids:
+    ...     user = bandicoot.read_csv(user_id, 'records/', network=True,
+    ...                               network_cache=cache)
+    >>> cache.stats()
+    {'hits': 9812, 'misses': 1000, 'evictions': 0, 'users': 1000, 'records': 52135}
+    """
+
+    def __init__(self, max_users=1024, max_records=None):
+        self.max_users = max_users
+        self.max_records = max_records
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.records = 0
+        self._users = OrderedDict()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'users': len(self._users), 'records': self.records}
+
+    def get(self, key, sources, load):
+        """
+        Return the user cached under ``key``, or store and return
+        ``load()``. The entry is only used while the files ``sources``
+        (see :meth:`DiskCache.load`) are unchanged.
+        """
+        signature = DiskCache._signature(sources)
+        entry = self._users.pop(key, None)
+        if entry is not None and entry[0] == signature:
+            self.hits += 1
+            self._users[key] = entry
+            return entry[1]
+
+        if entry is not None:
+            self.records -= entry[2]
+        self.misses += 1
+        user = load()
+
+        size = _number_of_records(user)
+        self._users[key] = (signature, user, size)
+        self.records += size
+        self._evict()
+        return user
+
+    def _evict(self):
+        while self._users and (len(self._users) > self.max_users or
+                               self.max_records is not None and self.records > self.max_records):
+            _, (_, _, size) = self._users.popitem(last=False)
+            self.records -= size
+            self.evictions += 1
+
+    def clear(self):
+        self._users.clear()
+        self.records = 0
+
+
+# Used by read_csv to load the networks of users, unless another cache is given
+network_cache = UserCache()
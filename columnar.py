@@ -0,0 +1,382 @@
+"""Columnar storage of user records, backed by NumPy structured arrays."""
+
+from __future__ import division
+
+import bandicoot_dev as bc
+
+import datetime
+import threading
+import numpy as np
+
+
+INTERACTIONS = ['call', 'text', 'physical', 'screen', 'stop']
+DIRECTIONS = ['in', 'out']
+
+# Datetimes are stored as microseconds since the epoch
+RECORD_DTYPE = np.dtype([
+    ('datetime', np.int64),
+    ('interaction', np.int8),
+    ('direction', np.int8),
+    ('correspondent_id', np.int32),
+    ('duration', np.float64),
+    ('position', np.int32),
+    ('event', np.int32)
+])
+
+_INTERACTION_CODES = dict((interaction, i) for i, interaction in enumerate(INTERACTIONS))
+_DIRECTION_CODES = dict((direction, i) for i, direction in enumerate(DIRECTIONS))
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def to_timestamp(dt):
+    """
+    Convert a naive datetime to an integer number of seconds since the epoch,
+    without going through the local timezone.
+    """
+    delta = dt - _EPOCH
+    return delta.days * 86400 + delta.seconds
+
+
+def from_timestamp(ts):
+    """
+    Convert an integer number of seconds since the epoch back to a naive
+    datetime. This is the inverse of :meth:`to_timestamp`.
+    """
+    return _EPOCH + datetime.timedelta(seconds=int(ts))
+
+
+def to_microseconds(dt):
+    """
+    Convert a naive datetime to an integer number of microseconds since the
+    epoch, as stored in the ``datetime`` column of ``RECORD_DTYPE``. Unlike
+    :meth:`to_timestamp`, sub-second precision is kept.
+    """
+    delta = dt - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 10 ** 6 + delta.microseconds
+
+
+def from_microseconds(us):
+    """
+    Convert an integer number of microseconds since the epoch back to a
+    naive datetime. This is the inverse of :meth:`to_microseconds`.
+    """
+    return _EPOCH + datetime.timedelta(microseconds=int(us))
+
+
+class StringTable(object):
+    """
+    Dictionary coding of strings (correspondent ids, stop ids, events) to
+    compact integers. The code ``-1`` is reserved for missing values.
+
+    Codes are never reassigned, so arrays coded with the same table can be
+    compared and concatenated. ``STRINGS`` is the table shared by all the
+    columnar users loaded in a process. Records stored as objects do not
+    use it, so that their strings are freed with them.
+    """
+
+    def __init__(self):
+        self._codes = {}
+        self._strings = []
+        self._lock = threading.Lock()
+
+    def code(self, s):
+        if s is None:
+            return -1
+        try:
+            return self._codes[s]
+        except KeyError:
+            with self._lock:
+                if s not in self._codes:
+                    self._codes[s] = len(self._strings)
+                    self._strings.append(s)
+                return self._codes[s]
+
+    def lookup(self, s):
+        """
+        Return the code of ``s``, or None if it is not in the table. Unlike
+        :meth:`code`, the string is not added.
+        """
+        if s is None:
+            return -1
+        return self._codes.get(s)
+
+    def intern(self, s):
+        """
+        Return the instance of ``s`` stored in the table, adding it if needed,
+        so that repeated ids share a single string object.
+        """
+        return None if s is None else self._strings[self.code(s)]
+
+    def string(self, code):
+        return None if code < 0 else self._strings[code]
+
+    def decode(self, codes):
+        """
+        Reverse lookup of an array of codes, as an object array of strings
+        (``None`` for missing values).
+        """
+        table = np.array(self._strings + [None], dtype=object)
+        codes = np.asarray(codes)
+        return table[np.where(codes < 0, len(self._strings), codes)]
+
+    def __len__(self):
+        return len(self._strings)
+
+
+STRINGS = StringTable()
+
+
+def count_codes(codes):
+    """
+    Return the number of occurrences of each distinct code in ``codes``, in
+    increasing order of code.
+
+    Only columnar records are coded: users storing Record objects keep
+    string ids, and their indicators count them with a ``Counter``.
+    """
+    codes = np.asarray(codes)
+    if len(codes) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    low, high = codes.min(), codes.max()
+    if high - low < 4 * len(codes):
+        counts = np.bincount(codes - low)
+        return counts[counts > 0]
+    return np.unique(codes, return_counts=True)[1]
+
+
+def sequential_sum(values):
+    """
+    Sum ``values`` from left to right, rounding as the built-in ``sum``
+    does. ``np.sum`` uses pairwise summation, whose floating point result
+    can differ in the last bits.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return 0
+    return float(np.add.accumulate(values)[-1])
+
+
+def _row_hashes(data):
+    """
+    Hash each row of a RECORD_DTYPE array to an unsigned 64-bit integer,
+    combining its fields as FNV-1a does with bytes.
+    """
+    hashes = np.full(len(data), 0xcbf29ce484222325, dtype=np.uint64)
+    prime = np.uint64(0x100000001b3)
+    with np.errstate(over='ignore'):
+        for field in RECORD_DTYPE.names:
+            column = np.ascontiguousarray(data[field])
+            if column.dtype == np.float64:
+                column = column.view(np.uint64)
+            hashes ^= column.astype(np.uint64)
+            hashes *= prime
+    return hashes
+
+
+class ColumnarRecords(object):
+    """
+    A read-only sequence of records of one interaction type, stored in a
+    NumPy structured array (see ``RECORD_DTYPE``).
+
+    Iterating or indexing returns record objects (see ``io.RECORD_TYPES``)
+    built on demand, so indicator code written for lists of records keeps working.
+    Vectorized code should read ``data`` directly.
+
+    Attributes
+    ----------
+    data : numpy.ndarray
+        Structured array of records, sorted by ``datetime`` when owned by a
+        :class:`~bandicoot.core.User`.
+    strings : StringTable
+        Table used to decode ``correspondent_id``, ``position`` and ``event``.
+    int_durations : bool
+        True if durations were integers before being stored as floats.
+    """
+
+    __slots__ = ['data', 'strings', 'int_durations']
+
+    def __init__(self, data, strings, int_durations=True):
+        self.data = data
+        self.strings = strings
+        self.int_durations = int_durations
+
+    @classmethod
+    def from_records(cls, records, strings):
+        """
+        Build a columnar store from an iterable of records. The order of the
+        records is kept.
+        """
+        if isinstance(records, ColumnarRecords):
+            return records.recode(strings, copy=True)
+
+        records = list(records)
+
+        data = np.empty(len(records), dtype=RECORD_DTYPE)
+        data['datetime'] = [to_microseconds(r.datetime) for r in records]
+        data['interaction'] = [_INTERACTION_CODES[r.interaction] for r in records]
+        data['direction'] = [_DIRECTION_CODES.get(getattr(r, 'direction', None), -1)
+                             for r in records]
+        for field in ('correspondent_id', 'position', 'event'):
+            data[field] = [strings.code(getattr(r, field, None)) for r in records]
+
+        durations = [getattr(r, 'duration', None) for r in records]
+        int_durations = all(d is None or isinstance(d, (int, long)) for d in durations)
+        data['duration'] = [np.nan if d is None else d for d in durations]
+
+        return cls(data, strings, int_durations)
+
+    def recode(self, strings, copy=False):
+        """
+        Return the records with codes from the table ``strings``. Codes are
+        translated once per distinct value. The data is only copied if the
+        table differs, or if ``copy`` is True.
+        """
+        if strings is self.strings:
+            data = self.data.copy() if copy else self.data
+            return ColumnarRecords(data, strings, self.int_durations)
+
+        data = self.data.copy()
+        for field in ('correspondent_id', 'position', 'event'):
+            codes, inverse = np.unique(data[field], return_inverse=True)
+            mapping = np.array([strings.code(self.strings.string(c)) for c in codes],
+                               dtype=np.int32)
+            data[field] = mapping[inverse]
+        return ColumnarRecords(data, strings, self.int_durations)
+
+    def sorted(self):
+        """
+        Return the records sorted by datetime. The sort is stable, as
+        ``sorted(records, key=lambda r: r.datetime)`` is. Records which are
+        already sorted are returned without copying.
+        """
+        times = self.data['datetime']
+        if np.all(times[1:] >= times[:-1]):
+            return ColumnarRecords(self.data, self.strings, self.int_durations)
+        order = np.argsort(times, kind='mergesort')
+        return ColumnarRecords(self.data[order], self.strings, self.int_durations)
+
+    def unique(self):
+        """
+        Return a copy sorted by datetime, without duplicated records. Rows are
+        compared on their raw bytes, so no record object is created. Only the
+        rows sharing their datetime with another row are compared.
+        """
+        data = self.sorted().data
+        times = data['datetime']
+        same = times[1:] == times[:-1]
+        shared = np.zeros(len(data), dtype=bool)
+        shared[1:] |= same
+        shared[:-1] |= same
+
+        # Rows with a distinct hash are distinct, so the raw bytes are only
+        # compared for the others
+        candidates = np.flatnonzero(shared)
+        _, inverse, counts = np.unique(_row_hashes(data[candidates]),
+                                       return_inverse=True, return_counts=True)
+        candidates = candidates[counts[inverse] > 1]
+        if len(candidates) == 0:
+            return ColumnarRecords(data, self.strings, self.int_durations)
+
+        rows = np.ascontiguousarray(data[candidates]).view(
+            np.dtype((np.void, RECORD_DTYPE.itemsize)))
+        _, first = np.unique(rows, return_index=True)
+        keep = np.ones(len(data), dtype=bool)
+        keep[candidates] = False
+        keep[candidates[first]] = True
+        return ColumnarRecords(data[keep], self.strings, self.int_durations)
+
+    def group_by(self, field):
+        """
+        Split the records on the value of a coded field (``correspondent_id``,
+        ``position`` or ``event``), using integer codes only.
+
+        Returns a dictionary mapping decoded values to ColumnarRecords, with
+        keys inserted in order of first appearance and records in their
+        original order. Record objects are not coded, and are grouped by
+        their string ids instead (see ``individual._interaction_grouper``).
+        """
+        if len(self.data) == 0:
+            return {}
+
+        codes = self.data[field]
+        order = np.argsort(codes, kind='mergesort')
+        bounds = np.flatnonzero(np.diff(codes[order])) + 1
+        groups = sorted(np.split(order, bounds), key=lambda idx: idx[0])
+
+        return dict((self.strings.string(codes[idx[0]]), self[idx])
+                    for idx in groups if len(idx) > 0)
+
+    def _record(self, row):
+        interaction = INTERACTIONS[row['interaction']]
+        values = {
+            'interaction': interaction,
+            'datetime': from_microseconds(row['datetime'])
+        }
+
+        record_type = bc.io.RECORD_TYPES[interaction]
+        for key in record_type.parameters:
+            if key == 'direction':
+                values[key] = DIRECTIONS[row['direction']] if row['direction'] >= 0 else None
+            elif key == 'duration':
+                d = row['duration']
+                values[key] = None if np.isnan(d) else (int(d) if self.int_durations else float(d))
+            elif key in ('correspondent_id', 'position', 'event'):
+                values[key] = self.strings.string(row[key])
+
+        record = record_type(**values)
+        record.timestamp = int(row['datetime'] // 10 ** 6)
+        return record
+
+    def to_records(self):
+        """
+        Return a list of record objects. Fields are converted a column at a
+        time and set through the slots of the record classes, which is much
+        faster than building records one row at a time.
+        """
+        records = [None] * len(self.data)
+        kinds = self.data['interaction']
+        for code in np.unique(kinds):
+            idx = np.flatnonzero(kinds == code)
+            rows = self.data[idx]
+            record_type = bc.io.RECORD_TYPES[INTERACTIONS[code]]
+
+            columns = {
+                'interaction': [INTERACTIONS[code]] * len(rows),
+                'timestamp': (rows['datetime'] // 10 ** 6).tolist(),
+                'datetime': rows['datetime'].astype('datetime64[us]').astype(object).tolist(),
+                'direction': np.array(DIRECTIONS + [None], dtype=object)[rows['direction']].tolist()
+            }
+            if 'duration' in record_type.parameters:
+                durations = rows['duration']
+                missing = np.isnan(durations)
+                values = np.where(missing, 0, durations)
+                values = (values.astype(np.int64) if self.int_durations else values).astype(object)
+                values[missing] = None
+                columns['duration'] = values.tolist()
+            for field in ('correspondent_id', 'position', 'event'):
+                if field in record_type.parameters:
+                    columns[field] = self.strings.decode(rows[field]).tolist()
+
+            batch = map(object.__new__, [record_type] * len(rows))
+            for field in record_type.parameters + ('timestamp', ):
+                map(getattr(record_type, field).__set__, batch, columns[field])
+            for k, r in zip(idx.tolist(), batch):
+                records[k] = r
+
+        return records
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        return iter(self.to_records())
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, long, np.integer)):
+            return self._record(self.data[key])
+        return ColumnarRecords(self.data[key], self.strings, self.int_durations)
+
+    def __repr__(self):
+        return "ColumnarRecords(%d records)" % len(self)
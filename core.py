@@ -1,9 +1,12 @@
 from __future__ import division
 
+import collections
+import copy
 import datetime
+import numpy as np
 from collections import Counter
-from bandicoot_dev.helper.tools import Colors
-from bandicoot_dev.helper.group import _binning
+from bandicoot_dev.helper.tools import Colors, OrderedDict
+from bandicoot_dev.helper.group import _binning, time_columns
 import bandicoot_dev as bc
 
 
@@ -25,6 +28,9 @@ class Record(object):
         Durations of the call in seconds. None if the record is a text message.
     position : Position
         The geographic position of the user at the time of the interaction.
+    timestamp : int
+        ``datetime`` as seconds since the epoch. It is set when the record is
+        assigned to a :class:`User`, and is not part of the record's fields.
     """
 
     def __init__(self, **kwargs):
@@ -35,21 +41,36 @@ class Record(object):
     def __repr__(self):
         return "Record(" + ", ".join(map(lambda x: "%s=%r" % (x, getattr(self, x)), self.parameters)) + ")"
 
+    def _key(self):
+        return tuple(getattr(self, attr, None) for attr in self.parameters)
+
     def __eq__(self, other):
-        if isinstance(other, self.__class__) and self.parameters == other.parameters:
-            return all(getattr(self, attr) == getattr(other, attr) for attr in self.parameters)
-        return False
+        # Records are equal if they have the same fields and values, whatever
+        # their class (e.g. a CallRecord and a Record built by hand)
+        if not isinstance(other, Record):
+            return False
+        if type(self) is type(other) and self.parameters == other.parameters:
+            return self._key() == other._key()
+        if set(self.parameters) != set(other.parameters):
+            return False
+        return all(getattr(self, attr, None) == getattr(other, attr, None) for attr in self.parameters)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
 
     def __hash__(self):
-        return hash(self.__repr__())
+        # Fields are sorted, so that equal records hash alike whatever the
+        # order of their parameters
+        return hash(tuple((attr, getattr(self, attr, None)) for attr in sorted(self.parameters)))
 
     def matches(self, other):
         """
         Returns true if two records 'match' - that is, they correspond to the same event from two perspectives.
         """
+        # Texts have no duration and physical records no direction
         return self.interaction == other.interaction and \
-            self.direction != other.direction and \
-            self.duration == other.duration and \
+            getattr(self, 'direction', None) != getattr(other, 'direction', None) and \
+            getattr(self, 'duration', None) == getattr(other, 'duration', None) and \
             abs((self.datetime - other.datetime).total_seconds()) < 30
 
     def all_matches(self, iterable):
@@ -59,6 +80,44 @@ class Record(object):
         return len(self.all_matches(iterable)) > 0
 
 
+def record_class(name, fields, module=__name__):
+    """
+    Create a subclass of :class:`Record` storing ``fields`` in ``__slots__``.
+
+    Instances have no ``__dict__`` and no per-record ``parameters`` list, but
+    the same attribute names, ``matches()``, equality and repr as a Record
+    built with the same keyword arguments. Fields which are not given to the
+    constructor are left unset, so ``hasattr`` still tells record types apart.
+    An extra ``timestamp`` slot holds the epoch time set by :class:`User`.
+
+    ``module`` should be the module where the class is stored, so that records
+    can be pickled (e.g. when sent to worker processes).
+    """
+    fields = tuple(fields)
+
+    def __init__(self, **kwargs):
+        for kw, arg in kwargs.items():
+            if kw not in fields:
+                raise TypeError("%s has no field %r" % (name, kw))
+            setattr(self, kw, arg)
+
+    def __getstate__(self):
+        return dict((kw, getattr(self, kw)) for kw in fields + ('timestamp', ) if hasattr(self, kw))
+
+    def __setstate__(self, state):
+        for kw, arg in state.items():
+            setattr(self, kw, arg)
+
+    return type(name, (Record,), {
+        '__slots__': fields + ('timestamp', ),
+        '__module__': module,
+        'parameters': fields,
+        '__init__': __init__,
+        '__getstate__': __getstate__,
+        '__setstate__': __setstate__
+    })
+
+
 class Position(object):
     """
     Data structure storing a generic location. Can be instantiated with either a
@@ -111,21 +170,95 @@ class Position(object):
         return not self.__eq__(other)
 
     def __hash__(self):
-        return hash(self.__repr__())
+        # Positions sharing a stop are equal whatever their location
+        return hash(self.stop) if self.stop else hash(self.location)
+
+
+class LazyNetwork(collections.Mapping):
+    """
+    The correspondents of a user, loaded the first time one of them is
+    accessed.
+
+    The ids of the correspondents, and whether their records can be loaded
+    (see :meth:`exists`), are known without loading them. Getting a
+    correspondent calls ``load``, which returns a dictionary of all the
+    correspondents, with None for the missing ones.
+    """
+
+    def __init__(self, candidates, load):
+        self._candidates = OrderedDict(sorted(candidates.items()))
+        self._load = load
+        self._users = None
+
+    @property
+    def loaded(self):
+        return self._users is not None
+
+    def exists(self, c_id):
+        """
+        Whether the records of ``c_id`` can be loaded, without loading them.
+        """
+        return self._candidates.get(c_id, False)
+
+    def load(self):
+        if self._users is None:
+            self._users = self._load()
+            self._load = None
+        return self._users
+
+    def __getitem__(self, c_id):
+        return self.load()[c_id]
+
+    def __contains__(self, c_id):
+        return c_id in self._candidates
+
+    def __iter__(self):
+        return iter(self._candidates)
+
+    def __len__(self):
+        return len(self._candidates)
+
+    def __repr__(self):
+        return "<LazyNetwork of %d correspondents, %s>" % (
+            len(self), 'loaded' if self.loaded else 'not loaded')
+
+
+def _in_network(network, c_id):
+    if isinstance(network, LazyNetwork):
+        return network.exists(c_id)
+    return network.get(c_id) is not None
 
 
 class User(object):
     """
     Data structure storing all the call, text or mobility records of the user.
+
+    Parameters
+    ----------
+    columnar : bool, default False
+        If True, records are stored in NumPy arrays (see
+        :class:`~bandicoot.columnar.ColumnarRecords`) instead of lists of
+        Record objects. The ``*_records`` properties then return lazy views.
+    group_cache_size : int, default 128
+        Maximum number of groupings kept by :meth:`cached_groups`.
     """
 
-    def __init__(self):
+    def __init__(self, columnar=False, group_cache_size=128):
+        self.columnar = columnar
+        self.strings = bc.columnar.STRINGS if columnar else None
+
         self._call_records = []
         self._text_records = []
         self._physical_records = []
         self._screen_records = []
         self._stop_records = []
         self._stops = {}
+        self._time_index = {}
+        self._group_cache = OrderedDict()
+        self._group_cache_settings = None
+        self.group_cache_size = group_cache_size
+        self.group_cache_hits = 0
+        self.group_cache_misses = 0
 
         self.name = None
         self.stops_path = None
@@ -174,19 +307,182 @@ class User(object):
                 self.end_time["any"] = t
 
 
+    def _set_records(self, interaction, input):
+        if self.columnar:
+            records = bc.columnar.ColumnarRecords.from_records(input, self.strings).sorted()
+        else:
+            records = sorted(input, key=lambda r: r.datetime)
+            for r in records:
+                r.timestamp = bc.columnar.to_timestamp(r.datetime)
+        setattr(self, '_%s_records' % interaction, records)
+        self._update_records(interaction, records)
+
+    def _update_records(self, interaction, records):
+        """
+        Update the time range and supported types after the records of type
+        ``interaction`` changed, and drop the caches derived from them.
+        """
+        time_range = (self.start_time['any'], self.end_time['any'])
+
+        if len(records) > 0:
+            self.start_time[interaction] = records[0].datetime
+            self.end_time[interaction] = records[-1].datetime
+            self.update_time_any("start", self.start_time[interaction])
+            self.update_time_any("end", self.end_time[interaction])
+            self.supported_types[interaction] = True
+
+        self._time_index.pop(interaction, None)
+        if time_range != (self.start_time['any'], self.end_time['any']):
+            # Every grouping has new bins
+            self.clear_group_cache()
+        else:
+            for key in [k for k in self._group_cache if interaction in k[0]]:
+                del self._group_cache[key]
+
+    def append_records(self, interaction, records):
+        """
+        Add new records of type ``interaction`` to the user.
+
+        Records are validated and deduplicated with
+        :meth:`~bandicoot.io.filter_record`, then merged with the stored
+        records. Only the stored records at or after the first new datetime
+        are merged again, so appending a batch of recent records (e.g. one
+        day at a time) takes linear time instead of sorting all the records.
+
+        Parameters
+        ----------
+        interaction : str
+            One of 'call', 'text', 'physical', 'screen' or 'stop'.
+        records : list
+            A list or a generator of Record objects.
+
+        Returns
+        -------
+        bad_records : list
+            The records which were ignored because of missing or inconsistent
+            fields. They are also counted in ``ignored_records``.
+        """
+        if interaction not in ['call', 'text', 'physical', 'screen', 'stop']:
+            raise ValueError("%s is not a valid interaction value. Only 'call', "
+                             "'text', 'physical', 'screen', 'stop' are accepted." % interaction)
+
+        new, ignored, bad_records = bc.io.filter_record(records, interaction)
+
+        if self.ignored_records[interaction] is None:
+            self.ignored_records[interaction] = dict(ignored)
+        else:
+            for key, count in ignored.items():
+                self.ignored_records[interaction][key] = \
+                    self.ignored_records[interaction].get(key, 0) + count
+
+        if len(new) == 0:
+            return bad_records
+
+        old = getattr(self, '_%s_records' % interaction)
+
+        if self.columnar:
+            new = bc.columnar.ColumnarRecords.from_records(new, self.strings)
+            if not isinstance(old, bc.columnar.ColumnarRecords):
+                old = bc.columnar.ColumnarRecords.from_records(old, self.strings)
+            lo = np.searchsorted(old.data['datetime'], new.data['datetime'][0], 'left')
+            tail = bc.columnar.ColumnarRecords(
+                np.concatenate([old.data[lo:], new.data]), self.strings,
+                old.int_durations and new.int_durations).unique()
+            merged = bc.columnar.ColumnarRecords(
+                np.concatenate([old.data[:lo], tail.data]), self.strings, tail.int_durations)
+            setattr(self, '_%s_records' % interaction, merged)
+        else:
+            for r in new:
+                r.timestamp = bc.columnar.to_timestamp(r.datetime)
+
+            # Stored records sharing a datetime with the new ones are merged
+            # again, so that duplicates across batches are removed. A new list
+            # is built, as copies of the user share the stored one.
+            lo = len(old)
+            while lo > 0 and old[lo - 1].datetime >= new[0].datetime:
+                lo -= 1
+            merged = old[:lo] + bc.io.unique_records(old[lo:] + new)
+            setattr(self, '_%s_records' % interaction, merged)
+
+        self._update_records(interaction, merged)
+        return bad_records
+
+    def time_index(self, interaction):
+        """
+        Time columns of the records of type ``interaction``, used to group
+        records. See :meth:`~bandicoot.helper.group.time_columns`.
+
+        The columns are computed on first use and kept until the records or
+        the ``night_start``, ``night_end`` and ``weekend`` settings change.
+        """
+        settings = (self.night_start, self.night_end, tuple(self.weekend))
+        index = self._time_index.get(interaction)
+        if index is None or index[0] != settings:
+            records = getattr(self, '_%s_records' % interaction)
+            index = self._time_index[interaction] = (settings, time_columns(records, *settings))
+        return index[1]
+
+    def cached_groups(self, key, compute):
+        """
+        Return the groups of records stored under ``key``, or store and return
+        ``compute()`` if there are none. This is used by
+        :meth:`~bandicoot.helper.group.group_records`, and the groups are
+        shared between callers, so they should not be modified.
+
+        The cache keeps the ``group_cache_size`` most recently used groupings.
+        It is cleared when records or stops are assigned, and when
+        ``night_start``, ``night_end`` or ``weekend`` change.
+        ``group_cache_hits`` and ``group_cache_misses`` count the lookups.
+        """
+        settings = (self.night_start, self.night_end, tuple(self.weekend))
+        if settings != self._group_cache_settings:
+            self._group_cache.clear()
+            self._group_cache_settings = settings
+
+        if key in self._group_cache:
+            self.group_cache_hits += 1
+            groups = self._group_cache.pop(key)
+        else:
+            self.group_cache_misses += 1
+            groups = compute()
+            while self._group_cache and len(self._group_cache) >= self.group_cache_size:
+                self._group_cache.popitem(last=False)
+
+        if self.group_cache_size > 0:
+            self._group_cache[key] = groups
+        return groups
+
+    def clear_group_cache(self):
+        """
+        Drop the groupings stored by :meth:`cached_groups`. The hit and miss
+        counters are kept.
+        """
+        self._group_cache.clear()
+
+    def copy(self):
+        """
+        Return a copy of the user which can be modified (e.g. by assigning
+        new records) without changing this one. Records are shared, as they
+        are replaced rather than modified when assigned.
+        """
+        user = copy.copy(self)
+        for name in ['start_time', 'end_time', 'supported_types', '_stops', '_time_index']:
+            setattr(user, name, dict(getattr(self, name)))
+        if isinstance(self.network, dict):
+            user.network = dict(self.network)
+        user.ignored_records = copy.deepcopy(self.ignored_records)
+        user.attributes = copy.copy(self.attributes)
+        user.weekend = list(self.weekend)
+        user._group_cache = OrderedDict(self._group_cache)
+        return user
+
     @property
     def call_records(self):
         return self._call_records
 
     @call_records.setter
     def call_records(self, input):
-        self._call_records = sorted(input, key=lambda r: r.datetime)
-        if len(self._call_records) > 0:
-            self.start_time['call'] = self._call_records[0].datetime
-            self.end_time['call'] = self._call_records[-1].datetime
-            self.update_time_any("start", self.start_time['call'])
-            self.update_time_any("end", self.end_time['call'])
-            self.supported_types['call'] = True
+        self._set_records('call', input)
 
     @property
     def text_records(self):
@@ -194,13 +490,7 @@ class User(object):
 
     @text_records.setter
     def text_records(self, input):
-        self._text_records = sorted(input, key=lambda r: r.datetime)
-        if len(self._text_records) > 0:
-            self.start_time['text'] = self._text_records[0].datetime
-            self.end_time['text'] = self._text_records[-1].datetime
-            self.update_time_any("start", self.start_time['text'])
-            self.update_time_any("end", self.end_time['text'])
-            self.supported_types['text'] = True
+        self._set_records('text', input)
 
     @property
     def physical_records(self):
@@ -208,13 +498,7 @@ class User(object):
 
     @physical_records.setter
     def physical_records(self, input):
-        self._physical_records = sorted(input, key=lambda r: r.datetime)
-        if len(self._physical_records) > 0:
-            self.start_time['physical'] = self._physical_records[0].datetime
-            self.end_time['physical'] = self._physical_records[-1].datetime
-            self.update_time_any("start", self.start_time['physical'])
-            self.update_time_any("end", self.end_time['physical'])
-            self.supported_types['physical'] = True
+        self._set_records('physical', input)
 
     @property
     def screen_records(self):
@@ -222,13 +506,7 @@ class User(object):
 
     @screen_records.setter
     def screen_records(self, input):
-        self._screen_records = sorted(input, key=lambda r: r.datetime)
-        if len(self._screen_records) > 0:
-            self.start_time['screen'] = self._screen_records[0].datetime
-            self.end_time['screen'] = self._screen_records[-1].datetime
-            self.update_time_any("start", self.start_time['screen'])
-            self.update_time_any("end", self.end_time['screen'])
-            self.supported_types['screen'] = True
+        self._set_records('screen', input)
 
     @property
     def stop_records(self):
@@ -236,13 +514,7 @@ class User(object):
 
     @stop_records.setter
     def stop_records(self, input):
-        self._stop_records = sorted(input, key=lambda r: r.datetime)
-        if len(self._stop_records) > 0:
-            self.start_time['stop'] = self._stop_records[0].datetime
-            self.end_time['stop'] = self._stop_records[-1].datetime
-            self.update_time_any("start", self.start_time['stop'])
-            self.update_time_any("end", self.end_time['stop'])
-            self.supported_types['stop'] = True
+        self._set_records('stop', input)
 
         #self.recompute_home()
 
@@ -259,6 +531,7 @@ class User(object):
     def stops(self, input_):
         self._stops = input_
         self.supported_types['stops'] = len(input_) > 0
+        self.clear_group_cache()
         for r in self._stop_records:
             if r.position.stop in self._stops:
                 r.position.location = self._stops[r.position.stop]
@@ -279,16 +552,23 @@ class User(object):
         when loading a network user.
         """
 
-        oon_records = [r for r in self.records if self.network.get(r.correspondent_id, None) is None]
+        # Correspondents loaded by read_csv, for calls or texts. Lazy networks
+        # are not loaded: only the files of the correspondents are checked.
+        networks = [self.network] + [getattr(self, 'network_' + interaction, {})
+                                     for interaction in ['call', 'text']]
+        in_network = lambda c_id: any(_in_network(n, c_id) for n in networks)
+
+        records = list(self.call_records) + list(self.text_records)
+        oon_records = [r for r in records if not in_network(r.correspondent_id)]
         num_oon_calls = len([r for r in oon_records if r.interaction == 'call'])
         num_oon_texts = len([r for r in oon_records if r.interaction == 'text'])
         num_oon_neighbors = len(set(x.correspondent_id for x in oon_records))
         oon_call_durations = sum([r.duration for r in oon_records if r.interaction == 'call'])
 
-        num_calls = len([r for r in self.records if r.interaction == 'call'])
-        num_texts = len([r for r in self.records if r.interaction == 'text'])
-        total_neighbors = len(set(x.correspondent_id for x in self.records))
-        total_call_durations = sum([r.duration for r in self.records if r.interaction == 'call'])
+        num_calls = len([r for r in records if r.interaction == 'call'])
+        num_texts = len([r for r in records if r.interaction == 'text'])
+        total_neighbors = len(set(x.correspondent_id for x in records))
+        total_call_durations = sum([r.duration for r in records if r.interaction == 'call'])
 
         def _safe_div(a, b, default):
             return a / b if b != 0 else default
@@ -411,7 +691,7 @@ class User(object):
 
     @property
     def has_network(self):
-        return self.network != {}
+        return len(self.network) > 0
 
     def set_home(self, new_home):
         """
@@ -0,0 +1,276 @@
+"""
+Memory-mapped files holding the records of a whole population, to share
+parsed users between processes.
+"""
+
+from __future__ import division
+
+from bandicoot_dev.core import User
+from bandicoot_dev.columnar import ColumnarRecords, StringTable, RECORD_DTYPE, INTERACTIONS
+from bandicoot_dev.cache import _to_str
+
+import json
+import struct
+import numpy as np
+
+
+MAGIC = 'BCDSET03'
+
+# The file starts with MAGIC and ends with the offset of the JSON footer
+# followed by MAGIC. The footer only holds the position of each section, so
+# opening a dataset takes the same time whatever its number of users.
+# Records, the offset index, the string table, the user names (with their
+# sorted order) and the metadata of each user are stored in between.
+_TRAILER = struct.Struct('<q8s')
+
+
+def _write_blobs(f, items):
+    """
+    Write byte strings as an int64 array of end offsets followed by their
+    concatenation. Returns the start of the section.
+    """
+    start = f.tell()
+    f.write(np.cumsum([0] + [len(s) for s in items], dtype=np.int64)[1:].tobytes())
+    f.write(''.join(items))
+    return start
+
+
+def _encode(name):
+    return name.encode('utf-8') if isinstance(name, unicode) else str(name)
+
+
+def write_dataset(path, users):
+    """
+    Write users to a dataset file, which can be opened with
+    :meth:`open_dataset`.
+
+    Users should come from :meth:`~bandicoot.io.load` (e.g. through
+    :meth:`~bandicoot.io.read_csv` or :meth:`~bandicoot.io.read_stream`), so
+    that their records are validated, sorted and deduplicated. ``users`` can
+    be a generator: users are written one at a time, and only the strings
+    and the index are kept in memory.
+
+    Parameters
+    ----------
+    path : str
+        The file to create.
+    users : iterable
+        The :class:`~bandicoot.core.User` objects to store. Their names must
+        be unique.
+
+    Examples
+    --------
+
+    >>> users = bandicoot.io.read_stream('records.csv', grouped=True)
+    >>> bandicoot.io.write_dataset('population.bcd', users)
+    """
+    strings = StringTable()
+    offsets, names, metadata = [], [], []
+    n_records = 0
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        for user in users:
+            row = [n_records]
+            entry = {'attributes': user.attributes, 'ignored_records': {}, 'int_durations': {}}
+
+            for interaction in INTERACTIONS:
+                store = ColumnarRecords.from_records(
+                    getattr(user, interaction + '_records'), strings)
+                f.write(store.data.tobytes())
+                n_records += len(store)
+                row.append(n_records)
+                entry['ignored_records'][interaction] = user.ignored_records[interaction]
+                entry['int_durations'][interaction] = store.int_durations
+
+            offsets.append(row)
+            names.append(_encode(user.name))
+            metadata.append(json.dumps(entry))
+
+        offsets = np.array(offsets, dtype=np.int64).reshape(-1, len(INTERACTIONS) + 1)
+        offsets_start = f.tell()
+        f.write(offsets.tobytes())
+
+        strings_start = _write_blobs(f, [strings.string(i) for i in range(len(strings))])
+        names_start = _write_blobs(f, names)
+        order_start = f.tell()
+        f.write(np.array(sorted(range(len(names)), key=names.__getitem__), dtype=np.int64).tobytes())
+        metadata_start = _write_blobs(f, metadata)
+
+        footer_start = f.tell()
+        f.write(json.dumps({
+            'records': [len(MAGIC), n_records],
+            'users': len(names),
+            'offsets': offsets_start,
+            'strings': [strings_start, len(strings)],
+            'names': [names_start, order_start],
+            'metadata': metadata_start
+        }))
+        f.write(_TRAILER.pack(footer_start, MAGIC))
+
+
+def open_dataset(path):
+    """
+    Open a dataset file written by :meth:`write_dataset`. See
+    :class:`Dataset`.
+    """
+    return Dataset(path)
+
+
+class Dataset(object):
+    """
+    A population of users stored in a file written by
+    :meth:`write_dataset`. The records are memory-mapped: users are built
+    on demand, and their records are read-only views of the file, so
+    processes opening the same dataset share its pages.
+
+    Datasets can be pickled (e.g. sent to worker processes); they are opened
+    again from their path.
+
+    Examples
+    --------
+
+    >>> dataset = bandicoot.io.open_dataset('population.bcd')
+    >>> user = dataset['u1']
+    >>> len(dataset)
+    1000
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError("%s is not a bandicoot dataset." % path)
+            f.seek(-_TRAILER.size, 2)
+            footer_end = f.tell()
+            footer_start, magic = _TRAILER.unpack(f.read(_TRAILER.size))
+            if magic != MAGIC:
+                raise ValueError("%s is truncated." % path)
+            f.seek(footer_start)
+            footer = _to_str(json.loads(f.read(footer_end - footer_start)))
+
+        records_start, n_records = footer['records']
+        self.records = self._map(RECORD_DTYPE, records_start, n_records)
+        self.offsets = self._map(np.int64, footer['offsets'],
+                                 footer['users'] * (len(INTERACTIONS) + 1))
+        self.offsets = self.offsets.reshape(-1, len(INTERACTIONS) + 1)
+
+        strings_start, n_strings = footer['strings']
+        self._strings = self._map_blobs(strings_start, n_strings)
+        self.strings = None
+
+        names_start, order_start = footer['names']
+        self._names = self._map_blobs(names_start, footer['users'])
+        self._order = self._map(np.int64, order_start, footer['users'])
+        self._metadata = self._map_blobs(footer['metadata'], footer['users'])
+
+    def _map(self, dtype, offset, count):
+        if count == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(self.path, dtype=dtype, mode='r', offset=offset, shape=(count, ))
+
+    def _map_blobs(self, offset, count):
+        ends = self._map(np.int64, offset, count)
+        blob = self._map(np.uint8, offset + ends.nbytes, int(ends[-1]) if count else 0)
+        return blob, ends
+
+    @staticmethod
+    def _blob(blobs, k):
+        blob, ends = blobs
+        return blob[int(ends[k - 1]) if k > 0 else 0:int(ends[k])].tobytes()
+
+    def _position(self, user_id):
+        # Binary search in the sorted names
+        user_id = _encode(user_id)
+        lo, hi = 0, len(self._order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._blob(self._names, int(self._order[mid])) < user_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self._order) and self._blob(self._names, int(self._order[lo])) == user_id:
+            return int(self._order[lo])
+        raise KeyError(user_id)
+
+    def _string_table(self):
+        # Built on first use, with the codes used in the file
+        if self.strings is None:
+            blob, ends = self._strings
+            data = blob.tobytes()
+            strings = StringTable()
+            start = 0
+            for end in ends.tolist():
+                strings.code(data[start:end])
+                start = end
+            self.strings = strings
+        return self.strings
+
+    def user_ids(self):
+        return [self._blob(self._names, k) for k in range(len(self))]
+
+    def size(self, user_id):
+        """
+        The number of records of ``user_id``, read from the offset index.
+        """
+        k = self._position(user_id)
+        return int(self.offsets[k, -1] - self.offsets[k, 0])
+
+    def load(self, user_id, columnar=True):
+        """
+        Build the user ``user_id``. Columnar users hold views of the file;
+        otherwise records are converted to Record objects.
+        """
+        k = self._position(user_id)
+        entry = _to_str(json.loads(self._blob(self._metadata, k)))
+        strings = self._string_table()
+
+        user = User(columnar=columnar)
+        user.name = user_id
+        if columnar:
+            user.strings = strings
+
+        for i, interaction in enumerate(INTERACTIONS):
+            ignored = entry['ignored_records'][interaction]
+            start, end = self.offsets[k, i], self.offsets[k, i + 1]
+            # Users built by hand have records but no ignored counts
+            if ignored is None and start == end:
+                continue
+            records = ColumnarRecords(self.records[start:end], strings,
+                                      entry['int_durations'][interaction])
+            if columnar:
+                # Records are already sorted: the views are used as they are
+                setattr(user, '_%s_records' % interaction, records)
+                user._update_records(interaction, records)
+            else:
+                setattr(user, interaction + '_records', records.to_records())
+            user.ignored_records[interaction] = ignored
+
+        user.attributes = entry['attributes']
+        return user
+
+    def __getitem__(self, user_id):
+        return self.load(user_id)
+
+    def __contains__(self, user_id):
+        try:
+            self._position(user_id)
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        return iter(self.user_ids())
+
+    def __len__(self):
+        return len(self._order)
+
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def __repr__(self):
+        return "Dataset(%r, %d users)" % (self.path, len(self))
@@ -1,6 +1,9 @@
 from functools import partial
 import itertools, datetime
+import time
+import numpy as np
 from bandicoot_dev.helper.tools import mean, std, SummaryStats, advanced_wrap, AutoVivification, flatarr
+from bandicoot_dev.columnar import ColumnarRecords, RECORD_DTYPE
 
 
 DATE_GROUPERS = {
@@ -11,26 +14,117 @@ DATE_GROUPERS = {
     "year": lambda d: d.year
 }
 
-def _groupby_groups(min_, max_, _fun):
-        day_each_week = range(0, (max_ - min_).days, 7)
-        groups = set([_fun(min_+datetime.timedelta(days=d)) for d in day_each_week])
-        if list(groups)[0] == None:
-            return [None]
-        if len(list(groups)[0]) == 1:
-            return sorted(groups)
-        if len(list(groups)[0]) == 2:
-            return sorted(groups, key=lambda x: (x[0], x[1]))
-
-def _group_date(user, records, _fun):
-    for g in _groupby_groups(user.start_time['any'], user.end_time['any'], _fun):
-        yield filter(lambda r: _fun(r.datetime) == g, records)
-        
+def _time_to_us(t):
+    return ((t.hour * 60 + t.minute) * 60 + t.second) * 10 ** 6 + t.microsecond
+
+
+def time_columns(records, night_start, night_end, weekend):
+    """
+    Compute the partition columns of a sorted list of records (or of a
+    :class:`~bandicoot.columnar.ColumnarRecords`), used by
+    :meth:`group_records`.
+
+    Returns a dictionary of NumPy arrays aligned with ``records``:
+
+    * ``time``: microseconds since the epoch, to merge record types;
+    * ``day``, ``week``, ``month``, ``year``: bin ids for each ``groupby``
+      value (ISO weeks start on Monday);
+    * ``weekend``: True if the isoweekday of the record is in ``weekend``;
+    * ``night``: True if the record falls between ``night_start`` and
+      ``night_end``.
+    """
+    if isinstance(records, ColumnarRecords):
+        ts, us = np.divmod(records.data['datetime'], 10 ** 6)
+    else:
+        ts = np.fromiter((r.timestamp for r in records), np.int64, len(records))
+        us = np.fromiter((r.datetime.microsecond for r in records), np.int64, len(records))
+
+    day = ts // 86400
+    time_of_day = (ts - day * 86400) * 10 ** 6 + us
+    start, end = _time_to_us(night_start), _time_to_us(night_end)
+    if start < end:
+        night = (end > time_of_day) & (time_of_day > start)
+    else:
+        night = ~((end < time_of_day) & (time_of_day < start))
+
+    dates = ts.astype('datetime64[s]')
+    return {
+        'time': ts * 10 ** 6 + us,
+        'day': day,
+        'week': (day + 3) // 7,  # 1970-01-01 is a Thursday
+        'month': dates.astype('datetime64[M]').astype(np.int64),
+        'year': dates.astype('datetime64[Y]').astype(np.int64),
+        'weekend': np.in1d((day + 3) % 7 + 1, list(weekend)),
+        'night': night
+    }
+
+
+def _width_us(width):
+    width = int(width.total_seconds() * 10 ** 6)
+    if width <= 0:
+        raise ValueError("Custom bins must have a positive width.")
+    return width
+
+
+def _bin_id(d, groupby):
+    """
+    Bin id of a datetime, consistent with :meth:`bin_column`.
+    """
+    if isinstance(groupby, datetime.timedelta):
+        delta = d - datetime.datetime(1970, 1, 1)
+        us = (delta.days * 86400 + delta.seconds) * 10 ** 6 + delta.microseconds
+        return us // _width_us(groupby)
+    if groupby == 'month':
+        return (d.year - 1970) * 12 + d.month - 1
+    if groupby == 'year':
+        return d.year - 1970
+
+    day = (d - datetime.datetime(1970, 1, 1)).days
+    return day if groupby == 'day' else (day + 3) // 7
+
+
+def bin_column(index, groupby):
+    """
+    Bin ids of the records of a time index (see :meth:`time_columns`) for a
+    ``groupby`` value: 'day', 'week', 'month', 'year', or a
+    ``datetime.timedelta`` for fixed-width bins aligned on the epoch.
+    """
+    if isinstance(groupby, datetime.timedelta):
+        return index['time'] // _width_us(groupby)
+    if groupby not in ('day', 'week', 'month', 'year'):
+        raise KeyError("{} is not a valid value for groupby. It should be None, 'day', 'week', 'month', 'year' or a timedelta.".format(groupby))
+    return index[groupby]
+
+
+def partition(bin_ids, first, last):
+    """
+    Split a sorted array of bin ids into contiguous bins, for every bin from
+    ``first`` to ``last`` (included), in a single pass.
+
+    Returns the ``last - first + 2`` boundaries: the records of bin
+    ``first + k`` are between ``bounds[k]`` and ``bounds[k + 1]``. Empty bins
+    have equal boundaries.
+    """
+    return np.searchsorted(bin_ids, np.arange(first, last + 2), 'left')
+
 
 def group_records(user, interaction_types=None, groupby='week', part_of_week='allweek', part_of_day='allday'):
     """
     Group records by year and week number. This function is used by the
     ``@grouping`` decorator.
 
+    Records are partitioned with the time columns of
+    :meth:`User.time_index <bandicoot.core.User.time_index>`, which are only
+    computed again when the records, ``night_start``, ``night_end`` or
+    ``weekend`` change. One group is returned for every bin between the first
+    and the last record of the user, including empty bins. Records of a
+    columnar user are grouped in :class:`~bandicoot.columnar.ColumnarRecords`
+    batches.
+
+    Groups are cached on the user (see :meth:`User.cached_groups
+    <bandicoot.core.User.cached_groups>`) and shared between calls with the
+    same arguments, so they should not be modified.
+
     Parameters
     ----------
     records : iterator
@@ -41,6 +135,7 @@ def group_records(user, interaction_types=None, groupby='week', part_of_week='al
         * None: records are not grouped. This is useful if you don't want to
           divide records in chunks.
         * "day", "month", and "year" also accepted.
+        * a ``datetime.timedelta``: fixed-width bins, aligned on the epoch.
     part_of_week : {'allweek', 'weekday', 'weekend'}, default 'allweek'
         * 'weekend': keep only the weekend records
         * 'weekday': keep only the weekdays records
@@ -60,37 +155,61 @@ def group_records(user, interaction_types=None, groupby='week', part_of_week='al
     ## Change interaction paradigme so "callandtext" --> [['call', 'text']].
     ## ---------------------------------------------------------------------
 
-    def get_records(interaction_type):
-        if interaction_type == "call":     return user.call_records
-        if interaction_type == "text":     return user.text_records
-        if interaction_type == "physical": return user.physical_records
-        if interaction_type == "screen":   return user.screen_records
-        if interaction_type == "stop":     return user.stop_records
-
-    records = sorted(
-        flatarr([get_records(i) for i in flatarr(interaction_types)]),
-        key=lambda r: r.datetime
-    )
-
-    if part_of_week == 'weekday':
-        records = filter(lambda r: r.datetime.isoweekday() not in user.weekend, records)
-    elif part_of_week == 'weekend':
-        records = filter(lambda r: r.datetime.isoweekday() in user.weekend, records)
-    elif part_of_week is not 'allweek':
+    if part_of_week not in ['allweek', 'weekday', 'weekend']:
         raise KeyError("{} is not a valid value for part_of_week. it should be 'weekday', 'weekend' or 'allweek'.".format(part_of_week))
+    if part_of_day not in ['allday', 'day', 'night']:
+        raise KeyError("{} is not a valid value for part_of_day. It should be 'day', 'night' or 'allday'.".format(part_of_day))
+
+    if interaction_types is None:
+        interaction_types = ['call', 'text', 'physical', 'screen', 'stop']
+    interaction_types = flatarr(interaction_types)
+
+    key = (tuple(interaction_types), groupby, part_of_week, part_of_day)
+    return iter(user.cached_groups(
+        key, lambda: _partition_records(user, interaction_types, groupby, part_of_week, part_of_day)))
+
+
+def _partition_records(user, interaction_types, groupby, part_of_week, part_of_day):
+    """
+    Compute the list of groups returned by :meth:`group_records`.
+    """
+
+    def column(name):
+        return np.concatenate([user.time_index(i)[name] for i in interaction_types] +
+                              [np.zeros(0, dtype=np.int64)])
+
+    # Stable sort, as sorted() on the concatenated lists of records
+    selected = np.argsort(column('time'), kind='mergesort')
 
-    if user.night_start < user.night_end:
-        night_filter = lambda r: user.night_end > r.datetime.time() > user.night_start
+    if part_of_week != 'allweek':
+        weekend = column('weekend')[selected].astype(bool)
+        selected = selected[weekend if part_of_week == 'weekend' else ~weekend]
+
+    if part_of_day != 'allday':
+        night = column('night')[selected].astype(bool)
+        selected = selected[night if part_of_day == 'night' else ~night]
+
+    if user.columnar:
+        stores = [r for r in (getattr(user, i + '_records') for i in interaction_types)
+                  if isinstance(r, ColumnarRecords)]
+        data = np.concatenate([s.data for s in stores] + [np.zeros(0, dtype=RECORD_DTYPE)])
+        int_durations = all(s.int_durations for s in stores)
+        take = lambda idx: ColumnarRecords(data[idx], user.strings, int_durations)
     else:
-        night_filter = lambda r: not(user.night_end < r.datetime.time() < user.night_start)
+        records = [r for i in interaction_types for r in getattr(user, i + '_records')]
+        take = lambda idx: [records[k] for k in idx]
 
-    if part_of_day == 'day':
-        records = filter(lambda r: not(night_filter(r)), records)
-    elif part_of_day == 'night':
-        records = filter(night_filter, records)
-    elif part_of_day is not 'allday':
-        raise KeyError("{} is not a valid value for part_of_day. It should be 'day', 'night' or 'allday'.".format(part_of_day))
-    return _group_date(user, records, DATE_GROUPERS[groupby])
+    start, end = user.start_time['any'], user.end_time['any']
+    if start is None:
+        return []
+    if groupby is None:
+        return [take(selected)]
+
+    bin_ids = np.concatenate([bin_column(user.time_index(i), groupby) for i in interaction_types] +
+                             [np.zeros(0, dtype=np.int64)])[selected]
+    bounds = partition(bin_ids, _bin_id(start, groupby), _bin_id(end, groupby))
+
+    return [take(selected[lo:hi]) for lo, hi in zip(bounds[:-1], bounds[1:])]
 
 
 def statistics(data, summary='default', datatype=None):
@@ -206,23 +325,8 @@ def grouping(f=None, user_kwd=False, interaction=['call', 'text'], summary='defa
         return partial(grouping, user_kwd=user_kwd, interaction=interaction, summary=summary)
 
     def wrapper(user, groupby='week', interaction=interaction, summary=summary, split_week=False, split_day=False, datatype=None, **kwargs):
-        if interaction is None:
-            interaction = ['call', 'text']
-        if type(interaction) is str:
-            interaction = [interaction.split("and")]
-
-        part_of_day = ['allday']
-        if split_day:
-            part_of_day += ['day', 'night']
-
-        part_of_week = ['allweek']
-        if split_week:
-            part_of_week += ['weekday', 'weekend']
-
-        for i in flatarr(interaction):
-            if i not in ['call', 'text', 'physical', 'screen', 'stop']:
-                raise ValueError("%s is not a valid interaction value. Only 'call', \
-                    'text', 'physical', 'screen', 'stop' are accepted." % i)
+        interaction = _interactions(interaction)
+        part_of_week, part_of_day = _parts(split_week, split_day)
 
         def map_filters(interaction, part_of_week, part_of_day):
             """
@@ -234,28 +338,162 @@ def grouping(f=None, user_kwd=False, interaction=['call', 'text'], summary='defa
                     continue
                 for filter_week in part_of_week:
                     for filter_day in part_of_day:
-                        if user_kwd is True:
-                            result = [f(g, user, **kwargs) if len(g) != 0 else None
-                                for g in group_records(user, i, groupby, filter_week, filter_day)]
-                        else:
-                            result = [f(g, **kwargs) if len(g) != 0 else None
-                                for g in group_records(user, i, groupby, filter_week, filter_day)]
-                        
+                        groups = group_records(user, i, groupby, filter_week, filter_day)
+                        result = _apply(f, groups, user if user_kwd else None, kwargs)
+
                         i_label = '+'.join(i) if type(i) is list else i
                         yield filter_week, filter_day, i_label, result
 
-        returned = AutoVivification()  # nested dict structure
-        for (f_w, f_d, i_label, m) in map_filters(interaction, part_of_week, part_of_day):
-            if groupby is None:
-                m = m[0] if len(m) != 0 else None
-            else:
-                if len(m) == 0:
-                    continue
-            returned[f_w][f_d][i_label] = statistics(m, summary=summary, datatype=datatype)
+        return _assemble(map_filters(interaction, part_of_week, part_of_day),
+                         groupby, summary, datatype)
 
-        return returned
+    decorated = advanced_wrap(f, wrapper)
+    decorated.grouping = {'function': f, 'user_kwd': user_kwd,
+                          'interaction': interaction, 'summary': summary}
+    return decorated
 
-    return advanced_wrap(f, wrapper)
+
+def _interactions(interaction):
+    """
+    Normalize and check the ``interaction`` argument of an indicator
+    decorated with :meth:`grouping`.
+    """
+    if interaction is None:
+        interaction = ['call', 'text']
+    if type(interaction) is str:
+        interaction = [interaction.split("and")]
+
+    for i in flatarr(interaction):
+        if i not in ['call', 'text', 'physical', 'screen', 'stop']:
+            raise ValueError("%s is not a valid interaction value. Only 'call', \
+                'text', 'physical', 'screen', 'stop' are accepted." % i)
+    return interaction
+
+
+def _parts(split_week, split_day):
+    part_of_week = ['allweek']
+    if split_week:
+        part_of_week += ['weekday', 'weekend']
+
+    part_of_day = ['allday']
+    if split_day:
+        part_of_day += ['day', 'night']
+
+    return part_of_week, part_of_day
+
+
+def _apply(f, groups, user, kwargs):
+    """
+    Call an indicator on each group of records, or return None for empty
+    groups. The user is passed to indicators using ``user_kwd``.
+    """
+    if user is not None:
+        return [f(g, user, **kwargs) if len(g) != 0 else None for g in groups]
+    return [f(g, **kwargs) if len(g) != 0 else None for g in groups]
+
+
+def _assemble(results, groupby, summary, datatype):
+    """
+    Nest the results of an indicator, given as (part_of_week, part_of_day,
+    interaction label, result per group) tuples, computing their statistics.
+    """
+    returned = AutoVivification()  # nested dict structure
+    for (f_w, f_d, i_label, m) in results:
+        if groupby is None:
+            m = m[0] if len(m) != 0 else None
+        else:
+            if len(m) == 0:
+                continue
+        returned[f_w][f_d][i_label] = statistics(m, summary=summary, datatype=datatype)
+
+    return returned
+
+
+class ExecutionPlan(object):
+    """
+    Compute many indicators on the same user, grouping the records once.
+
+    Indicators decorated with :meth:`grouping` are added with :meth:`add`,
+    and their distinct groupings, one per interaction, part of the week and
+    part of the day, are computed once by :meth:`run` and handed to every
+    indicator which uses them. Results are the same as calling each
+    indicator, e.g. ``number_of_contacts(user, groupby='week')``.
+
+    If the statistics of an indicator cannot be computed with the requested
+    ``summary`` (for instance the 'extended' summary of scalar indicators),
+    the default summary of the indicator is used, without computing the
+    indicator again.
+
+    Other indicators (e.g. spatial indicators) are called as usual.
+
+    Examples
+    --------
+
+    >>> plan = ExecutionPlan(user, groupby='week', split_week=True)
+    >>> plan.add(bandicoot.individual.number_of_contacts, 'distribution_scalar')
+    >>> for name, metric, seconds in plan.run(summary='default'):
+    ...     print name, metric
+    """
+
+    def __init__(self, user, groupby='week', split_week=False, split_day=False):
+        self.user = user
+        self.groupby = groupby
+        self.split_week = split_week
+        self.split_day = split_day
+        self.steps = []
+        self.groups = {}
+
+    def add(self, fun, datatype=None):
+        spec = getattr(fun, 'grouping', None)
+        keys = []
+        if spec is not None:
+            part_of_week, part_of_day = _parts(self.split_week, self.split_day)
+            for i in _interactions(spec['interaction']):
+                types = flatarr(i)
+                if sum(self.user.supported_types[t] for t in types) != len(types):
+                    continue
+                label = '+'.join(i) if type(i) is list else i
+                for filter_week in part_of_week:
+                    for filter_day in part_of_day:
+                        key = (tuple(types), filter_week, filter_day)
+                        self.groups[key] = None
+                        keys.append((filter_week, filter_day, label, key))
+
+        self.steps.append((fun, spec, datatype, keys))
+
+    def _group(self):
+        for key in self.groups:
+            if self.groups[key] is None:
+                types, filter_week, filter_day = key
+                self.groups[key] = list(group_records(
+                    self.user, list(types), self.groupby, filter_week, filter_day))
+
+    def run(self, summary='default'):
+        """
+        Compute the indicators, in the order they were added. Yields a
+        ``(name, result, seconds)`` tuple for each indicator.
+        """
+        self._group()
+
+        for fun, spec, datatype, keys in self.steps:
+            start = time.time()
+            if spec is None:
+                kwargs = dict(groupby=self.groupby, datatype=datatype,
+                              split_week=self.split_week, split_day=self.split_day)
+                try:
+                    metric = fun(self.user, summary=summary, **kwargs)
+                except ValueError:
+                    metric = fun(self.user, **kwargs)
+            else:
+                user = self.user if spec['user_kwd'] else None
+                results = [(f_w, f_d, label, _apply(spec['function'], self.groups[key], user, {}))
+                           for f_w, f_d, label, key in keys]
+                try:
+                    metric = _assemble(results, self.groupby, summary, datatype)
+                except ValueError:
+                    metric = _assemble(results, self.groupby, spec['summary'], datatype)
+
+            yield fun.__name__, metric, time.time() - start
 
 def _binning(records):
     """
@@ -305,8 +543,7 @@ def spatial_grouping(f=None, user_kwd=False, summary='default', use_records=Fals
             for filter_week in part_of_week:
                 for filter_day in part_of_day:
                     if user_kwd is True:
-                        result = [f(map_records(g), user, **kwargs) for g in 
-(user, None, groupby, filter_week, filter_day)]
+                        result = [f(map_records(g), user, **kwargs) for g in group_records(user, None, groupby, filter_week, filter_day)]
                     else:
                         result = [f(map_records(g), **kwargs) for g in group_records(user, None, groupby, filter_week, filter_day)]
 
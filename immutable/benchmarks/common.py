@@ -0,0 +1,59 @@
+"""
+Shared helpers for the benchmark scripts. Benchmarks expect bandicoot_dev to
+be importable, e.g. by running them from the directory containing it.
+"""
+
+from __future__ import division
+
+import datetime
+import random
+import time
+
+
+def best_of(f, repeat=3):
+    """
+    Return the fastest wall-clock time of ``repeat`` calls to ``f``, in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.time()
+        f()
+        timings.append(time.time() - start)
+    return min(timings)
+
+
+def record_kwargs(n, interaction='call', n_contacts=48, seed=42,
+                  start=datetime.datetime(2012, 1, 1), days=60):
+    """
+    Generate ``n`` keyword dictionaries for records of type ``interaction``,
+    spread over ``days`` days, with the fields of ``io.TYPE_SCHEME``.
+    """
+    rng = random.Random(seed)
+    span = days * 86400
+
+    for _ in xrange(n):
+        r = {
+            'interaction': interaction,
+            'datetime': start + datetime.timedelta(seconds=rng.randint(0, span))
+        }
+        if interaction in ('call', 'text'):
+            r['direction'] = rng.choice(['in', 'in', 'out'])
+        if interaction in ('call', 'text', 'physical'):
+            r['correspondent_id'] = "correspondent_{}".format(
+                rng.randint(0, n_contacts // 2) + rng.randint(0, n_contacts // 2))
+        if interaction in ('call', 'screen', 'stop'):
+            r['duration'] = rng.randint(1, 1000)
+        if interaction == 'stop':
+            r['position'] = "stop_{}".format(rng.randint(0, 20))
+            r['event'] = rng.choice(['campus', 'other'])
+        yield r
+
+
+def report(title, rows):
+    """
+    Print a small aligned table: ``rows`` is a list of (label, value) tuples.
+    """
+    print title
+    width = max(len(label) for label, _ in rows)
+    for label, value in rows:
+        print "    %s  %s" % (label.ljust(width), value)
@@ -0,0 +1,91 @@
+"""
+Reading compressed call files with ``read_csv``, against reading the
+pre-decompressed files and against decompressing them to scratch disk
+first.
+
+    python compressed_input.py [n_users] [n_records]
+"""
+
+from __future__ import division
+
+import csv
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import bandicoot_dev as bc
+
+from common import record_kwargs, report
+
+
+FIELDS = ['interaction', 'direction', 'correspondent_id', 'datetime', 'duration']
+COMMANDS = {'.gz': ['gzip', '-k'], '.bz2': ['bzip2', '-k'], '.xz': ['xz', '-k']}
+
+
+def write_users(path, n_users, n):
+    for u in range(n_users):
+        with open(os.path.join(path, 'u%d.csv' % u), 'wb') as f:
+            w = csv.writer(f)
+            w.writerow(FIELDS)
+            for kw in record_kwargs(n, 'call', days=365, seed=u):
+                kw['datetime'] = kw['datetime'].strftime("%Y-%m-%d %H:%M:%S")
+                w.writerow([kw.get(key, '') for key in FIELDS])
+
+
+def compress(path, ext):
+    compressed = os.path.join(path, ext[1:])
+    os.mkdir(compressed)
+    for name in os.listdir(os.path.join(path, 'plain')):
+        subprocess.check_call(COMMANDS[ext] + [os.path.join(path, 'plain', name)])
+        os.rename(os.path.join(path, 'plain', name + ext), os.path.join(compressed, name + ext))
+    return compressed
+
+
+def load_all(path, n_users):
+    start = time.time()
+    for u in range(n_users):
+        bc.read_csv('u%d' % u, path, describe=False, warnings=False)
+    return time.time() - start
+
+
+def decompress_then_load(path, ext, n_users):
+    start = time.time()
+    scratch = tempfile.mkdtemp()
+    try:
+        for name in os.listdir(path):
+            with open(os.path.join(scratch, name[:-len(ext)]), 'wb') as f:
+                subprocess.check_call(COMMANDS[ext][:1] + ['-dc', os.path.join(path, name)], stdout=f)
+        load_all(scratch, n_users)
+    finally:
+        shutil.rmtree(scratch)
+    return time.time() - start
+
+
+def main(n_users, n):
+    path = tempfile.mkdtemp()
+    try:
+        os.mkdir(os.path.join(path, 'plain'))
+        write_users(os.path.join(path, 'plain'), n_users, n)
+        size = sum(os.path.getsize(os.path.join(path, 'plain', f))
+                   for f in os.listdir(os.path.join(path, 'plain')))
+
+        t = load_all(os.path.join(path, 'plain'), n_users)
+        rows = [('plain', '%.3fs (%.1f MB/s)' % (t, size / t / 1e6))]
+        for ext in ['.gz', '.bz2', '.xz']:
+            compressed = compress(path, ext)
+            t = load_all(compressed, n_users)
+            rows.append((ext[1:] + ' streamed', '%.3fs (%.1f MB/s)' % (t, size / t / 1e6)))
+            t = decompress_then_load(compressed, ext, n_users)
+            rows.append((ext[1:] + ' to scratch', '%.3fs (%.1f MB/s)' % (t, size / t / 1e6)))
+
+        report('%d users, %d call records each, %.1f MB' % (n_users, n, size / 1e6), rows)
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 20000)
@@ -0,0 +1,49 @@
+"""
+Count and ratio indicators on a columnar user, computed with NumPy masks on
+the record arrays, against the same user with record objects.
+
+    python count_kernels.py [n_records_per_type]
+
+The user has call, text, screen and stop records spread over a year, grouped by
+week.
+"""
+
+from __future__ import division
+
+import sys
+
+import bandicoot_dev as bc
+
+from common import best_of, record_kwargs, report
+
+
+INDICATORS = ['number_of_interactions', 'balance_of_interactions', 'percent_nocturnal',
+              'ratio_call_text', 'number_of_contacts', 'active_days', 'time_at_campus']
+
+
+def make_user(n, columnar):
+    user = bc.User(columnar=columnar)
+    for seed, interaction in enumerate(['call', 'text', 'screen', 'stop']):
+        record = getattr(bc.io, interaction.capitalize() + 'Record')
+        setattr(user, interaction + '_records',
+                sorted((record(**kw) for kw in record_kwargs(n, interaction, seed=seed, days=365)),
+                       key=lambda r: r.datetime))
+    return user
+
+
+def main(n):
+    users = [make_user(n, False), make_user(n, True)]
+    rows = []
+    for name in INDICATORS:
+        f = getattr(bc.individual, name)
+        results = [repr(f(user, summary=None)) for user in users]
+        assert results[0] == results[1]
+
+        timings = ['%.3fs' % best_of(lambda: f(user, summary=None)) for user in users]
+        rows.append((name, '%s (objects)  %s (arrays)' % tuple(timings)))
+
+    report('%d records per type, grouped by week' % n, rows)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
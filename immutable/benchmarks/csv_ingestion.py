@@ -0,0 +1,47 @@
+"""
+Rows parsed per second for each interaction type, with ``csv.DictReader``
+and ``_parse_record`` (the previous ``read_csv`` path) against the bulk
+``io.read_records`` reader, for Record objects and columnar output.
+
+    python csv_ingestion.py [n_rows]
+"""
+
+from __future__ import division
+
+import csv
+from StringIO import StringIO
+import sys
+
+import bandicoot_dev as bc
+
+from common import best_of, record_kwargs, report
+
+
+FIELDS = ['interaction', 'direction', 'correspondent_id', 'datetime',
+          'duration', 'position', 'event']
+
+
+def make_csv(interaction, n):
+    f = StringIO()
+    w = csv.writer(f)
+    w.writerow(FIELDS)
+    for kw in record_kwargs(n, interaction, days=365):
+        kw['datetime'] = kw['datetime'].strftime("%Y-%m-%d %H:%M:%S")
+        w.writerow([kw.get(key, '') for key in FIELDS])
+    return f.getvalue()
+
+
+def main(n):
+    for interaction in ['call', 'text', 'physical', 'screen', 'stop']:
+        content = make_csv(interaction, n)
+        readers = [
+            ('DictReader', lambda: map(bc.io._parse_record, csv.DictReader(StringIO(content)))),
+            ('read_records', lambda: bc.io.read_records(StringIO(content))),
+            ('read_records columnar', lambda: bc.io.read_records(StringIO(content), columnar=True))
+        ]
+        report(interaction, [(label, '%8.0f rows/s' % (n / best_of(f)))
+                             for label, f in readers])
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
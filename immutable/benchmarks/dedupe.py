@@ -0,0 +1,50 @@
+"""
+Deduplication of records, as done by ``io.filter_record``.
+
+    python dedupe.py [n_records ...]
+
+Compares the previous implementation (a set of records hashed on their repr
+string, then sorted) with hashing on field tuples, with the sort-then-compare
+path of ``io.unique_records``, and with ``ColumnarRecords.unique``.
+"""
+
+from __future__ import division
+
+import sys
+
+import bandicoot_dev as bc
+
+from common import best_of, record_kwargs, report
+
+
+def repr_dedupe(records):
+    # Equivalent of the former sorted(set(records)) with Record.__hash__
+    # returning hash(self.__repr__())
+    unique = dict((repr(r), r) for r in records)
+    return sorted(unique.values(), key=lambda r: r.datetime)
+
+
+def tuple_dedupe(records):
+    return sorted(set(records), key=lambda r: r.datetime)
+
+
+def main(sizes):
+    for n in sizes:
+        # 10% of duplicated records
+        kwargs = list(record_kwargs(n - n // 10, 'call'))
+        kwargs += kwargs[:n // 10]
+        records = [bc.io.CallRecord(**kw) for kw in kwargs]
+        store = bc.columnar.ColumnarRecords.from_records(records, bc.columnar.StringTable())
+
+        assert len(repr_dedupe(records)) == len(bc.io.unique_records(records)) == len(store.unique())
+
+        report('%d call records' % n, [
+            ('set, repr hash', '%.3fs' % best_of(lambda: repr_dedupe(records))),
+            ('set, tuple hash', '%.3fs' % best_of(lambda: tuple_dedupe(records))),
+            ('io.unique_records', '%.3fs' % best_of(lambda: bc.io.unique_records(records))),
+            ('ColumnarRecords.unique', '%.3fs' % best_of(lambda: store.unique())),
+        ])
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [10 ** 4, 10 ** 6])
@@ -0,0 +1,65 @@
+"""
+Loading users with ``read_csv``, parsing the CSV files (cold) against
+loading them from a ``cache.DiskCache`` (warm).
+
+    python disk_cache.py [n_users] [n_records_per_type]
+"""
+
+from __future__ import division
+
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import bandicoot_dev as bc
+
+from common import record_kwargs, report
+
+
+TYPES = ['call', 'text', 'physical', 'screen', 'stop']
+FIELDS = ['interaction', 'direction', 'correspondent_id', 'datetime',
+          'duration', 'position', 'event']
+
+
+def write_users(path, n_users, n):
+    for interaction in TYPES:
+        os.mkdir(os.path.join(path, interaction))
+        for u in range(n_users):
+            with open(os.path.join(path, interaction, 'u%d.csv' % u), 'wb') as f:
+                w = csv.writer(f)
+                w.writerow(FIELDS)
+                for kw in record_kwargs(n, interaction, days=365, seed=u):
+                    kw['datetime'] = kw['datetime'].strftime("%Y-%m-%d %H:%M:%S")
+                    w.writerow([kw.get(key, '') for key in FIELDS])
+
+
+def load_all(path, n_users, **kwargs):
+    start = time.time()
+    for u in range(n_users):
+        bc.read_csv('u%d' % u, *[os.path.join(path, t) for t in TYPES],
+                    describe=False, warnings=False, **kwargs)
+    return time.time() - start
+
+
+def main(n_users, n):
+    path = tempfile.mkdtemp()
+    try:
+        write_users(path, n_users, n)
+        cache = bc.cache.DiskCache(os.path.join(path, 'cache'))
+
+        rows = [('no cache', load_all(path, n_users)),
+                ('cold cache', load_all(path, n_users, cache=cache)),
+                ('warm cache', load_all(path, n_users, cache=cache))]
+        report('%d users, %d records per type' % (n_users, n),
+               [(label, '%.3fs' % t) for label, t in rows] +
+               [('cache stats', cache.stats())])
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 5000)
@@ -0,0 +1,61 @@
+"""
+Indicators converting datetimes to epoch seconds, with the precomputed
+``Record.timestamp`` field against a ``strftime("%s")`` call per access.
+
+    python epoch_timestamps.py [n_records_per_type]
+
+The user has physical and screen records spread over several months.
+"""
+
+from __future__ import division
+
+import sys
+
+import bandicoot_dev as bc
+from bandicoot_dev.core import Record
+
+from common import best_of, record_kwargs, report
+
+
+class StrftimeRecord(Record):
+    """
+    Record computing its timestamp on each access, as the indicators did
+    before timestamps were stored on records.
+    """
+
+    @property
+    def timestamp(self):
+        return int(self.datetime.strftime("%s"))
+
+    @timestamp.setter
+    def timestamp(self, value):
+        pass
+
+
+INDICATORS = [
+    bc.individual.overlap_conversations,
+    bc.individual.ratio_social_screen_alone_screen,
+    bc.individual.interaction_autocorrelation,
+    bc.individual.percent_ei_percent_durations,
+]
+
+
+def make_user(cls, n):
+    user = bc.User()
+    user.physical_records = [cls(**kw) for kw in record_kwargs(n, 'physical', days=120)]
+    user.screen_records = [cls(**kw) for kw in record_kwargs(n, 'screen', days=120, seed=7)]
+    user.stop_records = [cls(**kw) for kw in record_kwargs(n, 'stop', days=120, seed=9)]
+    return user
+
+
+def main(n):
+    users = [('strftime("%s")', make_user(StrftimeRecord, n)),
+             ('Record.timestamp', make_user(Record, n))]
+
+    for f in INDICATORS:
+        report(f.__name__, [(label, '%.3fs' % best_of(lambda: f(user, groupby=None)))
+                            for label, user in users])
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
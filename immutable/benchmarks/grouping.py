@@ -0,0 +1,60 @@
+"""
+Grouping records into weeks and days, with the single-pass partition of
+``group_records`` against the previous implementation, which ran one filter
+over all the records per bin.
+
+    python grouping.py [n_records_per_type]
+
+The user has call and text records spread over two years.
+"""
+
+from __future__ import division
+
+import datetime
+import sys
+
+import bandicoot_dev as bc
+from bandicoot_dev.helper.group import DATE_GROUPERS, group_records
+
+from common import best_of, record_kwargs, report
+
+
+def legacy_group_records(user, interaction_types, groupby='week'):
+    """
+    Grouping as it was done before the time index: bins are found by stepping
+    seven days at a time from the first record, then each bin is filled by
+    filtering the whole list again.
+    """
+    _fun = DATE_GROUPERS[groupby]
+    records = sorted(
+        [r for i in interaction_types for r in getattr(user, i + '_records')],
+        key=lambda r: r.datetime)
+
+    min_, max_ = user.start_time['any'], user.end_time['any']
+    groups = sorted(set(_fun(min_ + datetime.timedelta(days=d))
+                        for d in range(0, (max_ - min_).days, 7)))
+    for g in groups:
+        yield filter(lambda r: _fun(r.datetime) == g, records)
+
+
+def make_user(n):
+    user = bc.User()
+    user.call_records = [bc.io.CallRecord(**kw) for kw in record_kwargs(n, 'call', days=730)]
+    user.text_records = [bc.io.TextRecord(**kw) for kw in record_kwargs(n, 'text', days=730, seed=7)]
+    return user
+
+
+def main(n):
+    user = make_user(n)
+    types = ['call', 'text']
+
+    for groupby in ['week', 'day']:
+        n_bins = len(list(group_records(user, types, groupby=groupby)))
+        report('groupby=%r (%d bins)' % (groupby, n_bins), [
+            ('filter per bin', '%.3fs' % best_of(lambda: list(legacy_group_records(user, types, groupby)))),
+            ('single pass', '%.3fs' % best_of(lambda: list(group_records(user, types, groupby=groupby))))
+        ])
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
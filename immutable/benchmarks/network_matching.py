@@ -0,0 +1,106 @@
+"""
+Removing non-reciprocated records of an ego network, with the indexed
+matching of ``io._read_network`` against a ``Record.has_match`` scan of the
+correspondent's records.
+
+    python network_matching.py [n_alters] [n_calls_per_alter]
+
+Each alter shares ``n_calls_per_alter`` calls with the ego, of which one in
+ten is not reciprocated. Both methods should report the same counts.
+"""
+
+from __future__ import division
+
+import copy
+import datetime
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import bandicoot_dev as bc
+
+
+def make_network(n_alters, n_calls, seed=42):
+    rng = random.Random(seed)
+    start = datetime.datetime(2012, 1, 1)
+
+    ego = bc.User()
+    ego.name = 'ego'
+    ego_records, alters = [], {}
+
+    for a in range(n_alters):
+        name = 'alter_%d' % a
+        alter_records = []
+        for _ in range(n_calls):
+            dt = start + datetime.timedelta(seconds=rng.randint(0, 90 * 86400))
+            duration = rng.randint(1, 600)
+            direction = rng.choice(['in', 'out'])
+            ego_records.append(bc.io.CallRecord(
+                interaction='call', direction=direction, correspondent_id=name,
+                datetime=dt, duration=duration))
+            if rng.random() < 0.9:
+                alter_records.append(bc.io.CallRecord(
+                    interaction='call', direction='in' if direction == 'out' else 'out',
+                    correspondent_id='ego', duration=duration,
+                    datetime=dt + datetime.timedelta(seconds=rng.randint(-20, 20))))
+
+        alters[name] = bc.User()
+        alters[name].name = name
+        alters[name].call_records = alter_records
+
+    ego.call_records = ego_records
+    return ego, alters
+
+
+def legacy_filter(ego, alters):
+    """
+    Filter the records as ``_read_network`` did, with ``Record.has_match``.
+    Returns the number of removed records.
+    """
+    users = dict(alters, ego=ego)
+
+    def _is_consistent(record):
+        correspondent = users.get(record.correspondent_id)
+        return True if correspondent is None else record.has_match(correspondent.call_records)
+
+    total = sum(len(u.call_records) for u in users.values())
+    for u in [ego] + alters.values():
+        u.call_records = filter(_is_consistent, u.call_records)
+    return total - sum(len(u.call_records) for u in users.values())
+
+
+def indexed_filter(ego, alters):
+    """
+    Filter the records with ``io._read_network``, reading the alters from
+    empty files. Returns the number of removed records.
+    """
+    path = tempfile.mkdtemp()
+    try:
+        for name in alters:
+            open(os.path.join(path, name + '.csv'), 'w').close()
+        read_function = lambda c_id, **kwargs: alters[c_id]
+
+        total = len(ego.call_records) + sum(len(u.call_records) for u in alters.values())
+        bc.io._read_network(ego, path, None, read_function, 'call')
+        return total - len(ego.call_records) - sum(len(u.call_records) for u in alters.values())
+    finally:
+        shutil.rmtree(path)
+
+
+def main(n_alters, n_calls):
+    network = make_network(n_alters, n_calls)
+    print "%d alters, %d ego records" % (n_alters, len(network[0].call_records))
+
+    for label, f in [('has_match scan', legacy_filter), ('indexed', indexed_filter)]:
+        ego, alters = copy.deepcopy(network)
+        start = time.time()
+        removed = f(ego, alters)
+        print "    %s  %.3fs  (%d records removed)" % (label.ljust(14), time.time() - start, removed)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 20)
@@ -0,0 +1,69 @@
+"""
+Memory and construction throughput of the generic, kwargs-driven Record class
+against the slotted per-type classes of ``io.RECORD_TYPES``.
+
+    python record_memory.py [n_records ...]
+
+Defaults to a sample_user-sized dataset (1482 records) and 10M records. Large
+sizes are constructed in chunks which are discarded, so that the benchmark
+measures throughput without holding 10M objects in memory.
+"""
+
+from __future__ import division
+
+import sys
+import time
+
+import bandicoot_dev as bc
+from bandicoot_dev.core import Record
+
+from common import record_kwargs, report
+
+CHUNK = 100000
+
+
+def deep_size(record):
+    """
+    Bytes used by the record itself, excluding field values (which are shared
+    by both implementations).
+    """
+    size = sys.getsizeof(record)
+    if hasattr(record, '__dict__') and not hasattr(type(record), '__slots__'):
+        size += sys.getsizeof(record.__dict__)
+        size += sys.getsizeof(record.parameters)
+    return size
+
+
+def throughput(cls, n, interaction):
+    kwargs = list(record_kwargs(min(n, CHUNK), interaction))
+    built, elapsed = 0, 0.
+    while built < n:
+        chunk = kwargs[:n - built]
+        start = time.time()
+        records = [cls(**kw) for kw in chunk]
+        elapsed += time.time() - start
+        built += len(records)
+        del records
+    return built / elapsed
+
+
+def main(sizes):
+    for interaction in ['call', 'text', 'physical', 'screen', 'stop']:
+        kw = next(record_kwargs(1, interaction))
+        new_cls = bc.io.RECORD_TYPES[interaction]
+        old_size, new_size = deep_size(Record(**kw)), deep_size(new_cls(**kw))
+
+        rows = [
+            ('bytes/record (Record)', old_size),
+            ('bytes/record (%s)' % new_cls.__name__, new_size),
+        ]
+        for n in sizes:
+            old_rate = throughput(Record, n, interaction)
+            new_rate = throughput(new_cls, n, interaction)
+            rows.append(('%d records, Record' % n, '%.0f records/s, %.1f MB' % (old_rate, old_size * n / 2 ** 20)))
+            rows.append(('%d records, %s' % (n, new_cls.__name__), '%.0f records/s, %.1f MB' % (new_rate, new_size * n / 2 ** 20)))
+        report(interaction, rows)
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [1482, 10 ** 7])
@@ -0,0 +1,85 @@
+"""
+Computing all the indicators of a user with ``utils.all``, which runs them
+through an execution plan, against the previous loop calling each decorated
+indicator in turn.
+
+    python utils_all.py [n_records_per_type]
+
+The user has records of every type over two months. Indicators are
+computed with the 'extended' summary and the week and day splits, as in
+the regression tests.
+"""
+
+from __future__ import division
+
+import sys
+
+import bandicoot_dev as bc
+
+from common import best_of, record_kwargs, report
+
+
+ARGS = {'summary': 'extended', 'split_week': True, 'split_day': True}
+
+# The individual indicators computed by utils.all
+SCALAR = ['number_of_contacts', 'number_of_interactions', 'percent_ei_percent_durations',
+          'balance_of_interactions', 'duration', 'overlap_conversations',
+          'percent_nocturnal', 'interevent_time', 'ratio_social_screen_alone_screen',
+          'ratio_interactions_campus_other', 'percent_outside_campus_from_campus',
+          'time_at_campus', 'number_of_contacts_less', 'first_seen_response_rate',
+          'ratio_call_text', 'interaction_autocorrelation']
+SUMMARY = ['percent_initiated_conversations', 'percent_concluded_conversations',
+           'response_delay', 'response_rate']
+
+
+def legacy_all(user, groupby='week', summary='default', split_week=False, split_day=False):
+    """
+    The loop of ``utils.all`` before execution plans: each indicator groups
+    its records through its decorator, and when the requested summary does
+    not apply, the indicator is computed again with its default summary.
+    """
+    indicators = [(name, 'distribution_scalar') for name in SCALAR] + \
+        [(name, 'distribution_summarystats') for name in SUMMARY]
+
+    returned = {}
+    for name, datatype in indicators:
+        fun = getattr(bc.individual, name)
+        try:
+            metric = fun(user, groupby=groupby, summary=summary, datatype=datatype,
+                         split_week=split_week, split_day=split_day)
+        except ValueError:
+            metric = fun(user, groupby=groupby, datatype=datatype,
+                         split_week=split_week, split_day=split_day)
+        if len(metric) > 0:
+            returned[name] = metric
+    return returned
+
+
+def make_user(n):
+    user = bc.User()
+    for seed, interaction in enumerate(['call', 'text', 'physical', 'screen', 'stop']):
+        record = getattr(bc.io, interaction.capitalize() + 'Record')
+        setattr(user, interaction + '_records',
+                sorted((record(**kw) for kw in record_kwargs(n, interaction, seed=seed)),
+                       key=lambda r: r.datetime))
+    return user
+
+
+def main(n):
+    user = make_user(n)
+    expected = legacy_all(user, **ARGS)
+    result = bc.utils.all(user, **ARGS)
+    assert all(repr(result[name]) == repr(metric) for name, metric in expected.items())
+
+    def run(f):
+        user.clear_group_cache()
+        f(user, **ARGS)
+
+    report('%d indicators, %d records per type' % (len(expected), n), [
+        ('one call per indicator', '%.3fs' % best_of(lambda: run(legacy_all))),
+        ('execution plan', '%.3fs' % best_of(lambda: run(bc.utils.all)))
+    ])
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
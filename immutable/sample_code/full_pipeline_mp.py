@@ -1,30 +1,17 @@
 import sys
 sys.path.append("../")
 import bandicoot as bc
+import functools
 import glob
-import multiprocessing as mp
 import os
 
 records_path = 'users_bandicoot/'
-antenna_file = 'antennas.csv'
 number_of_processors = 8
 
+user_list = sorted(os.path.basename(f)[:-4] for f in glob.glob(records_path + '*.csv'))
+loader = functools.partial(bc.read_csv, call_path=records_path, describe=False)
 
-def load_and_compute(f):
-    user_id = os.path.basename(f)[:-4]
-    try:
-        B = bc.read_csv(user_id, records_path, antenna_file, describe=False)
-        metrics_dic = bc.utils.all(B)
-    except Exception as e:
-        metrics_dic = {'name': user_id, 'error': True}
-    return metrics_dic
-
-user_list = sorted(glob.glob(records_path + '*.csv'))
-indicators = []
-pool = mp.Pool(number_of_processors)
-indicators = pool.map_async(load_and_compute, user_list)
-indicators = indicators.get()
-pool.close()
-pool.join()
-
-bc.io.to_csv(indicators, 'bandicoot_indicators_mp.csv')
+# Users are loaded and computed by the workers, and their indicators are
+# written as soon as they are ready
+bc.batch.run(user_list, loader, workers=number_of_processors,
+             output='bandicoot_indicators_mp.csv')
@@ -1,7 +1,9 @@
 from __future__ import division
 
-from bandicoot_dev.helper.group import grouping
+from bandicoot_dev.helper.group import grouping, _time_to_us
 from bandicoot_dev.helper.tools import summary_stats, entropy, pairwise
+from bandicoot_dev.columnar import ColumnarRecords, count_codes, sequential_sum, \
+    INTERACTIONS, DIRECTIONS
 from collections import Counter, defaultdict
 
 import math
@@ -37,6 +39,11 @@ def _conversations(group, delta=datetime.timedelta(hours=1)):
         yield results
         
 def _interaction_grouper(records, dtype=None):
+    # Only columnar users split on integer codes; Record objects hold the
+    # ids as strings and are grouped in a dictionary of lists
+    if isinstance(records, ColumnarRecords):
+        return records.group_by('position' if dtype == "stop" else 'correspondent_id')
+
     interactions = defaultdict(list)
     if dtype != "stop":
         for r in records:
@@ -46,6 +53,18 @@ def _interaction_grouper(records, dtype=None):
             interactions[r.position].append(r)
     return interactions
 
+def _direction_mask(data, direction):
+    """
+    Mask of the rows of a ColumnarRecords array with the given direction.
+    """
+    code = DIRECTIONS.index(direction) if direction in DIRECTIONS else -2
+    return data['direction'] == code
+
+
+def _number_of_days(data):
+    return len(np.unique(data['datetime'] // (86400 * 10 ** 6)))
+
+
 @grouping(interaction='screen')
 def active_days(records):
     """Number of days during which the user was active. 
@@ -54,6 +73,9 @@ def active_days(records):
     a call, receives a call, or has a mobility point.
     """
 
+    if isinstance(records, ColumnarRecords):
+        return _number_of_days(records.data)
+
     days = set(r.datetime.date() for r in records)
     return len(days)
 
@@ -69,6 +91,24 @@ def number_of_contacts(records, direction=None, more=1, perday=False):
     more : int, optional
         Counts only contacts with more than this number of interactions. Defaults to 0.
     """
+    # Codes are counted with bincount for columnar users only; Record
+    # objects are counted by string id below
+    if isinstance(records, ColumnarRecords):
+        data = records.data
+        if INTERACTIONS[data['interaction'][0]] in ('call', 'text', 'physical'):
+            duration = data['duration']
+            with np.errstate(invalid='ignore'):
+                codes = data['correspondent_id'][np.isnan(duration) | (duration > 5)]
+        else:
+            codes = data['position']
+
+        if perday:
+            norm = _number_of_days(data)
+        else:
+            norm = 1
+
+        return int(np.sum(count_codes(codes) > more)) / norm
+
     records = list(records)
 
     if hasattr(records[0], 'correspondent_id'):
@@ -106,6 +146,14 @@ def number_of_interactions(records, direction=None, perday=False):
         If True computes interactions per day, if false computes total number
         of interactions.
     """
+    if isinstance(records, ColumnarRecords):
+        data = records.data
+        if direction is not None:
+            data = data[_direction_mask(data, direction)]
+        weights = np.where(data['interaction'] == INTERACTIONS.index('call'), 4.428, 1)
+        norm = _number_of_days(records.data) if perday else 1
+        return sequential_sum(weights) * 1.0 / norm
+
     if direction is None:
         n_o_interactions = sum([4.428 if r.interaction == 'call' else 1 for r in records])
     else:
@@ -215,7 +263,7 @@ def percent_ei_percent_durations(records, percentage=0.8):
         if hasattr(r, "position"):
             user_count[r.position] += r.duration
         else:
-            user_count[r.datetime.strftime("%s")] += r.duration
+            user_count[r.timestamp] += r.duration
 
     target = int(math.ceil(sum(user_count.values()) * percentage))
     user_sort = sorted(user_count.keys(), key=lambda x: user_count[x])
@@ -244,6 +292,10 @@ def balance_of_interactions(records, weighted=False, thresh=1):
         the number of interactions the user had with this contact.
     """
 
+    if isinstance(records, ColumnarRecords):
+        counter_out = np.count_nonzero(_direction_mask(records.data, 'out'))
+        return counter_out * 1.0 / len(records)
+
     counter_out = 0
     counter = 0
 
@@ -351,8 +403,7 @@ def overlap_conversations(records):
     interactions = _interaction_grouper(records)
 
     def _timespans(grouped):
-        to_ts = lambda dt: int(dt.strftime("%s"))
-        ts = [(to_ts(conv[0].datetime), to_ts(conv[-1].datetime))
+        ts = [(conv[0].timestamp, conv[-1].timestamp)
               for conv in _conversations(grouped, delta=datetime.timedelta(hours=0.5))]
         return ts
 
@@ -461,6 +512,17 @@ def percent_nocturnal(records, user):
     By default, nights are 7pm-7am. Nightimes can be set in
     ``user.night_start`` and ``user.night_end``.
     """
+    if isinstance(records, ColumnarRecords):
+        if len(records) == 0:
+            return None
+        time_of_day = records.data['datetime'] % (86400 * 10 ** 6)
+        start, end = _time_to_us(user.night_start), _time_to_us(user.night_end)
+        if start < end:
+            night = (end > time_of_day) & (time_of_day > start)
+        else:
+            night = ~((end < time_of_day) & (time_of_day < start))
+        return float(np.count_nonzero(night)) / len(records)
+
     records = list(records)
 
     if len(records) == 0:
@@ -503,15 +565,13 @@ def ratio_social_screen_alone_screen(records):
     records = list(records)
     interactions = _interaction_grouper(filter(lambda r: r.interaction == "physical", records))
 
-    to_ts = lambda dt: int(dt.strftime("%s"))
-    
     def _timespans_physical(grouped):
-        ts = [(to_ts(conv[0].datetime), to_ts(conv[-1].datetime))
+        ts = [(conv[0].timestamp, conv[-1].timestamp)
               for conv in _conversations(grouped, datetime.timedelta(hours=1.0/12))]
         return ts
 
     def _timespans_screen(r):
-        return to_ts(r.datetime), to_ts(r.datetime) + r.duration
+        return r.timestamp, r.timestamp + r.duration
 
     timestamps_screen = [
         ts
@@ -594,6 +654,17 @@ def time_at_campus(records, perday=False):
         If True computes interactions per day, if false computes total number
         of interactions.
     """
+    if isinstance(records, ColumnarRecords):
+        data = records.data
+        code = records.strings.lookup("campus")
+        campus = data['event'] == (code if code is not None else -2)
+        counter_campus = sequential_sum(data['duration'][campus])
+        if perday:
+            norm = _number_of_days(data) * 86400 * 5/7
+        else:
+            norm = 1
+        return counter_campus * 1.0 / norm
+
     counter_campus = 0
     for r in records:
         if r.event == "campus":
@@ -678,18 +749,32 @@ def first_seen_response_rate(records):
 def ratio_call_text(records, direction=None):
     """Fraction between number of calls and number of texts.
 
+    Groups without texts give ``None``.
+
     Parameters
     ----------
     direction : str, optional
         Filters the records by their direction: ``None`` for all records,
         ``'in'`` for incoming, and ``'out'`` for outgoing.
     """
-    if direction is None:
-        return len([r for r in records if r.interaction == "call"]) * 1.0 / \
-               len([r for r in records if r.interaction == "text"])
-    else:
-        return len([r for r in records if r.direction == direction and r.interaction == "call"]) * 1.0 / \
-               len([r for r in records if r.direction == direction and r.interaction == "text"])
+    if isinstance(records, ColumnarRecords):
+        data = records.data
+        if direction is not None:
+            data = data[_direction_mask(data, direction)]
+        n_texts = np.count_nonzero(data['interaction'] == INTERACTIONS.index('text'))
+        if n_texts == 0:
+            return None
+        n_calls = np.count_nonzero(data['interaction'] == INTERACTIONS.index('call'))
+        return n_calls * 1.0 / n_texts
+
+    if direction is not None:
+        records = [r for r in records if r.direction == direction]
+
+    n_texts = len([r for r in records if r.interaction == "text"])
+    if n_texts == 0:
+        return None
+
+    return len([r for r in records if r.interaction == "call"]) * 1.0 / n_texts
 
 
 @grouping(interaction=["physical"])
@@ -720,8 +805,7 @@ def interaction_autocorrelation(records, more=5):
     def _conversation_intervals(group):
         conversations = list(_conversations(group))
         return [
-            (int(conv[0].datetime.strftime("%s")), 
-            int(conv[-1].datetime.strftime("%s")))
+            (conv[0].timestamp, conv[-1].timestamp)
             for conv in conversations
         ]
 
@@ -1,17 +1,48 @@
 """Tools for processing files (reading and writing csv and json files)."""
 
-from __future__ import with_statement, division
+from __future__ import with_statement, division, absolute_import
 
 from bandicoot_dev.helper.tools import OrderedDict
-from bandicoot_dev.core import User, Record, Position
+from bandicoot_dev.core import User, Record, Position, LazyNetwork, record_class
+from bandicoot_dev.columnar import ColumnarRecords, STRINGS, RECORD_DTYPE, \
+    INTERACTIONS, DIRECTIONS, to_microseconds
 from bandicoot_dev.helper.tools import warning_str
 from bandicoot_dev.utils import flatten
+from bandicoot_dev.dataset import open_dataset, write_dataset
+from bandicoot_dev.attributes import AttributesTable, attributes_table, read_attributes_table
+import bandicoot_dev as bc
 
 from datetime import datetime
-from json import dumps
-from collections import Counter
+from functools import partial
+from contextlib import closing
+from cStringIO import StringIO
+from json import dumps, loads
+from bisect import bisect_left, bisect_right
+import bz2
 import csv
+import gzip
+import heapq
+import io
+import itertools
+import marshal
 import os
+import subprocess
+import tempfile
+import numpy as np
+
+
+_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_COMPRESSIONS = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz'}
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
 
 def wrap(interaction_type, subscheme):
     """Add datetime and interaction to all subschema."""
@@ -45,6 +76,364 @@ TYPE_SCHEME = {
     })
 }
 
+# Field order of the record classes, following the Record documentation
+_FIELD_ORDER = ['interaction', 'direction', 'correspondent_id', 'datetime',
+                'duration', 'position', 'event']
+
+RECORD_TYPES = dict(
+    (interaction, record_class(
+        interaction.capitalize() + 'Record',
+        [f for f in _FIELD_ORDER if f in scheme], module=__name__))
+    for interaction, scheme in TYPE_SCHEME.items()
+)
+
+CallRecord = RECORD_TYPES['call']
+TextRecord = RECORD_TYPES['text']
+PhysicalRecord = RECORD_TYPES['physical']
+ScreenRecord = RECORD_TYPES['screen']
+StopRecord = RECORD_TYPES['stop']
+
+# The TYPE_SCHEME tests as expressions of a field value, compiled into one
+# function per interaction type by _validator
+_FIELD_TESTS = {
+    'datetime': "isinstance({0}, datetime)",
+    'interaction': "{0} == interaction_type",
+    'direction': "{0} in ('in', 'out')",
+    'correspondent_id': "{0} is not None",
+    'duration': "isinstance({0}, (int, float))",
+    'event': "isinstance({0}, str)",
+    'position': "isinstance({0}, str)"
+}
+
+# The TYPE_SCHEME tests on the columns of ColumnarRecords, which hold -1 or
+# NaN for missing values. Datetimes are always valid once parsed.
+_COLUMN_TESTS = {
+    'datetime': lambda data, interaction_type: np.ones(len(data), dtype=bool),
+    'interaction': lambda data, interaction_type: data['interaction'] == INTERACTIONS.index(interaction_type),
+    'direction': lambda data, interaction_type: data['direction'] >= 0,
+    'correspondent_id': lambda data, interaction_type: data['correspondent_id'] >= 0,
+    'duration': lambda data, interaction_type: ~np.isnan(data['duration']),
+    'event': lambda data, interaction_type: data['event'] >= 0,
+    'position': lambda data, interaction_type: data['position'] >= 0
+}
+
+_VALIDATORS = {}
+
+
+def _validator(interaction_type):
+    """
+    The TYPE_SCHEME tests of ``interaction_type``, compiled into a function
+    returning the fields of a record which fail their test (an empty tuple
+    for a valid record). Missing fields are tested as None.
+    """
+    if interaction_type not in _VALIDATORS:
+        fields = [f for f in _FIELD_ORDER if f in TYPE_SCHEME[interaction_type]]
+        fast = " and ".join(_FIELD_TESTS[f].format('r.' + f) for f in fields)
+        each = ", ".join("(%r, %s)" % (f, _FIELD_TESTS[f].format("getattr(r, %r, None)" % f))
+                         for f in fields)
+        source = "\n".join([
+            "def validate(r):",
+            "    try:",
+            "        if %s:" % fast,
+            "            return ()",
+            "    except AttributeError:",
+            "        pass",
+            "    return tuple(f for f, valid in (%s, ) if not valid)" % each
+        ])
+        namespace = {'datetime': datetime, 'interaction_type': interaction_type}
+        exec source in namespace
+        _VALIDATORS[interaction_type] = namespace['validate']
+    return _VALIDATORS[interaction_type]
+
+
+def _make_repr(item, digits):
+    if item is None:
+        return None
+    elif isinstance(item, float):
+        return repr(round(item, digits))
+    else:
+        return str(item)
+
+
+def _compression(filename, compression):
+    if compression == 'infer':
+        ext = os.path.splitext(filename)[1] if isinstance(filename, basestring) else None
+        return _COMPRESSIONS.get(ext)
+    if compression not in [None] + _COMPRESSIONS.values():
+        raise ValueError("Unknown compression %r." % compression)
+    return compression
+
+
+def _open_output(filename, compression='infer', buffer_size=1 << 20, append=False):
+    """
+    Open a file for writing, compressed with 'gzip', 'bz2' or 'xz' (by
+    default, inferred from the extension). Open files are returned as they
+    are.
+    """
+    if not isinstance(filename, basestring):
+        return filename
+
+    mode = 'ab' if append else 'wb'
+    compression = _compression(filename, compression)
+    if compression == 'gzip':
+        # Appending adds a gzip member, read back as one stream
+        return gzip.open(filename, mode)
+    elif compression == 'bz2':
+        if append:
+            raise ValueError("Cannot append to bz2 files.")
+        return bz2.BZ2File(filename, mode, buffer_size)
+    elif compression == 'xz':
+        if lzma is None:
+            raise ValueError("Writing xz files requires the lzma module "
+                             "(backports.lzma on Python 2).")
+        return lzma.LZMAFile(filename, mode)
+    return open(filename, mode, buffer_size)
+
+
+class _PipeFile(object):
+    """
+    The output of a decompression command, read as a file.
+    """
+
+    def __init__(self, command, buffer_size):
+        self.command = command
+        self._process = subprocess.Popen(command, stdout=subprocess.PIPE, bufsize=buffer_size)
+        self._f = self._process.stdout
+
+    def read(self, *args):
+        return self._f.read(*args)
+
+    def readline(self, *args):
+        return self._f.readline(*args)
+
+    def __iter__(self):
+        return iter(self._f)
+
+    def close(self):
+        self._f.close()
+        # -SIGPIPE if the file is closed before the end
+        if self._process.wait() not in (0, -13):
+            raise IOError("%s failed." % ' '.join(self.command))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _open_input(filename, compression='infer', buffer_size=1 << 20):
+    """
+    Open a file for reading, decompressed as for :meth:`_open_output`, and
+    read in chunks of ``buffer_size`` bytes. Without the lzma module, xz
+    files are decompressed by the ``xz`` command.
+    """
+    compression = _compression(filename, compression)
+    if compression == 'gzip':
+        # Reading lines directly from GzipFile is slow on Python 2
+        return io.BufferedReader(gzip.open(filename, 'rb'), buffer_size)
+    elif compression == 'bz2':
+        return bz2.BZ2File(filename, 'rb', buffer_size)
+    elif compression == 'xz':
+        if lzma is not None:
+            return io.BufferedReader(lzma.LZMAFile(filename, 'rb'), buffer_size)
+        if not os.path.exists(filename):
+            raise IOError("No such file: %r" % filename)
+        return _PipeFile(['xz', '-dc', filename], buffer_size)
+    return open(filename, 'rb', buffer_size)
+
+
+def _user_file(path, user_id, extension='.csv', files=None):
+    """
+    The file of ``user_id`` in the directory ``path``, either plain or
+    compressed (``.gz``, ``.bz2`` or ``.xz``). Returns the plain file name if
+    none exists. If ``files`` is given, the file is looked up in this
+    dictionary of file contents instead of on disk.
+    """
+    filename = os.path.join(path, user_id + extension)
+    exists = os.path.exists if files is None else files.__contains__
+    if not exists(filename):
+        for ext in ['.gz', '.bz2', '.xz']:
+            if exists(filename + ext):
+                return filename + ext
+    return filename
+
+
+def _open_file(filename, files=None):
+    """
+    Open a file with :meth:`_open_input`, or read its decompressed content
+    from the dictionary ``files`` if given.
+    """
+    if files is None:
+        return _open_input(filename)
+    if filename not in files:
+        raise IOError("No such file: %r" % filename)
+    return closing(StringIO(files[filename]))
+
+
+def _read_user_files(user_id, paths):
+    """
+    Read the decompressed content of the files of ``user_id`` in each
+    directory of ``paths`` (None is skipped), as a dictionary mapping file
+    names to strings, to be given to :meth:`read_csv`.
+    """
+    files = {}
+    for path in paths:
+        if path is None or attributes_table(path) is not None:
+            continue
+        filename = _user_file(path, user_id)
+        try:
+            with _open_input(filename) as f:
+                files[filename] = f.read()
+        except IOError:
+            pass
+    return files
+
+
+def _spill_filename(filename):
+    base, ext = os.path.splitext(filename)
+    if ext in _COMPRESSIONS:
+        return os.path.splitext(base)[0] + '.extra.csv' + ext
+    return base + '.extra.csv'
+
+
+class CSVWriter(object):
+    """
+    Write the flattened indicators of users to CSV, one object at a time.
+
+    The columns are either given with ``fields``, or taken from the first
+    ``sample`` objects, in the order they appear. Values of columns found
+    later are written to a side file, with one ``name,column,value`` line
+    per value, so that the schema of the main file never changes.
+
+    Parameters
+    ----------
+    filename : str or file
+        File to export to. Files ending with .gz or .bz2 are compressed.
+    fields : list, optional
+        The columns of the file, e.g. the header of a previous export.
+    sample : int, default 100
+        Number of objects kept in memory to find the columns, if ``fields``
+        is not given.
+    digits : int
+        Precision of floats.
+    compression : str, optional
+        'gzip', 'bz2' or None. By default, inferred from ``filename``.
+    buffer_size : int
+        Size of the write buffer, in bytes.
+    spill_filename : str, optional
+        File for values of late columns. Defaults to ``filename`` with the
+        .extra.csv extension. If ``filename`` is an open file, these values
+        are dropped unless ``spill_filename`` is given.
+
+    Examples
+    --------
+
+    >>> with bc.io.CSVWriter('indicators.csv.gz') as w:
+    ...     for user in users:
+    ...         w.write(bc.utils.all(user))
+    """
+
+    def __init__(self, filename, fields=None, sample=100, digits=5,
+                 compression='infer', buffer_size=1 << 20, spill_filename=None):
+        self.filename = filename
+        self.digits = digits
+        self.sample = sample
+        self.count = 0
+        self.spilled = 0
+        self.dropped = 0
+
+        self._f = _open_output(filename, compression, buffer_size)
+        self._buffer_size = buffer_size
+        self._spill_filename = spill_filename
+        self._spill = None
+        self._pending = []
+
+        self._writer = csv.writer(self._f)
+        self.fields = None
+        if fields is not None:
+            self._start(fields)
+
+    def _start(self, fields):
+        self.fields = list(fields)
+        self._columns = set(self.fields)
+        self._writer.writerow(self.fields)
+
+    def write(self, obj):
+        """
+        Write the indicators of a user, e.g. returned by
+        :meth:`bandicoot.utils.all`.
+        """
+        row = flatten(obj)
+        self.count += 1
+
+        if self.fields is None:
+            self._pending.append(row)
+            if len(self._pending) >= self.sample:
+                self._flush_sample()
+            return
+
+        self._write_row(row)
+
+    def writerows(self, objects):
+        for obj in objects:
+            self.write(obj)
+
+    def _flush_sample(self):
+        fields = OrderedDict()
+        for row in self._pending:
+            for key in row:
+                fields[key] = None
+        self._start(fields.keys())
+
+        for row in self._pending:
+            self._write_row(row)
+        self._pending = []
+
+    def _write_row(self, row):
+        digits = self.digits
+        self._writer.writerow([_make_repr(row.get(k), digits) for k in self.fields])
+
+        late = [k for k in row if k not in self._columns]
+        if late:
+            self._spill_values(row, late)
+
+    def _spill_values(self, row, keys):
+        if self._spill is None:
+            if self._spill_filename is None:
+                if not isinstance(self.filename, basestring):
+                    if not self.dropped:
+                        print warning_str("Warning: columns %s are not in the file and were "
+                                          "dropped, set spill_filename to keep them." % keys)
+                    self.dropped += len(keys)
+                    return
+                self._spill_filename = _spill_filename(self.filename)
+            self._spill_file = _open_output(self._spill_filename, 'infer', self._buffer_size)
+            self._spill = csv.writer(self._spill_file)
+            self._spill.writerow(['name', 'column', 'value'])
+
+        name = row.get('name')
+        for k in keys:
+            self._spill.writerow([name, k, _make_repr(row[k], self.digits)])
+        self.spilled += len(keys)
+
+    def close(self):
+        if self.fields is None:
+            self._flush_sample()
+        if self._spill is not None:
+            self._spill_file.close()
+            self._spill = None
+        if isinstance(self.filename, basestring):
+            self._f.close()
+        else:
+            self._f.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
 
 def to_csv(objects, filename, digits=5):
     """
@@ -52,10 +441,11 @@ def to_csv(objects, filename, digits=5):
 
     Parameters
     ----------
-    objects : list
-        List of objects to be exported.
+    objects : list or iterator
+        Objects to be exported. Iterators are written as they are consumed,
+        see :class:`CSVWriter`.
     filename : string
-        File to export to.
+        File to export to. Files ending with .gz or .bz2 are compressed.
     digits : int
         Precision of floats.
 
@@ -69,30 +459,17 @@ def to_csv(objects, filename, digits=5):
     If you only have one object, you can simply pass it as argument:
     >>> bc.to_csv(bc.utils.all(U_1), 'results_1.csv')
     """
-    if not isinstance(objects, list):
+    if isinstance(objects, dict):
         objects = [objects]
 
-    data = [flatten(obj) for obj in objects]
-    all_keys = [d for datum in data for d in datum.keys()]
-    field_names = sorted(set(all_keys), key=lambda x: all_keys.index(x))
+    # All columns of a list are written to the file; iterators are streamed,
+    # with columns taken from their first objects (see CSVWriter)
+    sample = max(len(objects), 1) if isinstance(objects, list) else 100
 
-    with open(filename, 'wb') as f:
-        w = csv.writer(f)
-        w.writerow(field_names)
-
-        def make_repr(item):
-            if item is None:
-                return None
-            elif isinstance(item, float):
-                return repr(round(item, digits))
-            else:
-                return str(item)
+    with CSVWriter(filename, sample=sample, digits=digits) as w:
+        w.writerows(objects)
 
-        for row in data:
-            row = dict((k, make_repr(v)) for k, v in row.items())
-            w.writerow([make_repr(row.get(k, None)) for k in field_names])
-
-    print "Successfully exported %d object(s) to %s" % (len(objects), filename)
+    print "Successfully exported %d object(s) to %s" % (w.count, filename)
 
 
 def to_json(objects, filename):
@@ -126,6 +503,111 @@ def to_json(objects, filename):
     print "Successfully exported %d object(s) to %s" % (len(objects), filename)
 
 
+class JSONLinesWriter(object):
+    """
+    Write the indicators of users to a JSON Lines file, with one compact
+    JSON object per line, as they arrive.
+
+    Files can be appended to (e.g. to resume a batch) and concatenated, and
+    are read back one object at a time with :meth:`read_jsonl`.
+
+    Parameters
+    ----------
+    filename : str or file
+        File to export to. Files ending with .gz or .bz2 are compressed.
+    append : bool, default False
+        Add the objects at the end of an existing file. Not supported for
+        bz2 files.
+    compression : str, optional
+        'gzip', 'bz2' or None. By default, inferred from ``filename``.
+    buffer_size : int
+        Size of the write buffer, in bytes.
+
+    Examples
+    --------
+
+    >>> with bc.io.JSONLinesWriter('indicators.jsonl.gz') as w:
+    ...     for user in users:
+    ...         w.write(bc.utils.all(user))
+    """
+
+    def __init__(self, filename, append=False, compression='infer', buffer_size=1 << 20):
+        self.filename = filename
+        self.count = 0
+        self._f = _open_output(filename, compression, buffer_size, append)
+
+    def write(self, obj):
+        self._f.write(dumps(obj, separators=(',', ':')))
+        self._f.write('\n')
+        self.count += 1
+
+    def writerows(self, objects):
+        for obj in objects:
+            self.write(obj)
+
+    def close(self):
+        if isinstance(self.filename, basestring):
+            self._f.close()
+        else:
+            self._f.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def to_jsonl(objects, filename, append=False):
+    """
+    Export the indicators of one or several users to JSON Lines, one object
+    per line. Unlike :meth:`to_json`, objects are written as they are
+    consumed, see :class:`JSONLinesWriter`.
+
+    Parameters
+    ----------
+    objects : list or iterator
+        Objects to be exported.
+    filename : string
+        File to export to. Files ending with .gz or .bz2 are compressed.
+    append : bool, default False
+        Add the objects at the end of an existing file.
+    """
+    if isinstance(objects, dict):
+        objects = [objects]
+
+    with JSONLinesWriter(filename, append=append) as w:
+        w.writerows(objects)
+
+    print "Successfully exported %d object(s) to %s" % (w.count, filename)
+
+
+def read_jsonl(filename):
+    """
+    Read the objects of a JSON Lines file written by :meth:`to_jsonl` or
+    :class:`JSONLinesWriter`, one at a time. Keys keep their order.
+
+    An incomplete last line, left by an interrupted export, is skipped with
+    a warning.
+
+    Examples
+    --------
+
+    >>> done = set(obj['name'] for obj in bc.io.read_jsonl('indicators.jsonl.gz'))
+    """
+    with _open_input(filename) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield loads(line, object_pairs_hook=OrderedDict)
+            except ValueError:
+                if line.endswith('\n'):
+                    raise
+                print warning_str("Warning: the incomplete last line of %s was "
+                                  "skipped." % filename)
+
+
 def _tryto(function, argument):
     try:
         return function(argument)
@@ -149,7 +631,7 @@ def _parse_record(data):
         if kw=="correspondent_id":
             return data['correspondent_id']
         if kw=="datetime":
-            return datetime.strptime(data['datetime'], "%Y-%m-%d %H:%M:%S")
+            return datetime.strptime(data['datetime'], _DATETIME_FORMAT)
         if kw=="direction":
             return data['direction']
         if kw=="interaction":
@@ -159,9 +641,226 @@ def _parse_record(data):
         if kw=="event":
             return data['event']
     
-    kws = TYPE_SCHEME[data['interaction']].keys()
-    
-    return Record(**dict((kw, kwargs(kw)) for kw in kws))
+    record_type = RECORD_TYPES[data['interaction']]
+
+    return record_type(**dict((kw, kwargs(kw)) for kw in record_type.parameters))
+
+
+def _is_plain_datetime(s):
+    """
+    True if ``s`` is exactly ``YYYY-MM-DD HH:MM:SS``, with digits and
+    separators where ``datetime.strptime`` expects them and a year
+    ``datetime`` can represent (numpy also accepts year zero).
+    """
+    return s is not None and len(s) == 19 and s[4] == '-' and s[7] == '-' and \
+        s[10] == ' ' and s[13] == ':' and s[16] == ':' and s[:4] != '0000' and \
+        (s[:4] + s[5:7] + s[8:10] + s[11:13] + s[14:16] + s[17:]).isdigit()
+
+
+def _parse_datetime(s):
+    """
+    Parse a ``YYYY-MM-DD HH:MM:SS`` timestamp by slicing its digits. Other
+    strings go through ``datetime.strptime``, which raises the usual errors.
+    """
+    if _is_plain_datetime(s):
+        return datetime(int(s[:4]), int(s[5:7]), int(s[8:10]),
+                        int(s[11:13]), int(s[14:16]), int(s[17:]))
+    return datetime.strptime(s, _DATETIME_FORMAT)
+
+
+def _datetime64(column):
+    """
+    Parse a column of ``YYYY-MM-DD HH:MM:SS`` timestamps with NumPy in one
+    call. Returns None if some values are not in this format, so that they
+    are parsed (or rejected) by :meth:`_parse_datetime` instead.
+    """
+    if all(_is_plain_datetime(s) for s in column):
+        try:
+            return np.array(column, dtype='datetime64[s]')
+        except ValueError:
+            pass
+    return None
+
+
+def _parse_datetimes(column):
+    parsed = _datetime64(column)
+    if parsed is None:
+        return map(_parse_datetime, column)
+    return parsed.astype(object).tolist()
+
+
+def _parse_timestamps(column):
+    """
+    Parse a column of timestamps to microseconds since the epoch.
+    """
+    parsed = _datetime64(column)
+    if parsed is None:
+        return np.array([to_microseconds(_parse_datetime(s)) for s in column], dtype=np.int64)
+    return parsed.astype('datetime64[us]').astype(np.int64)
+
+
+def _read_rows(csv_file):
+    """
+    Read the header and the rows of a CSV file. Empty lines are skipped and
+    short rows are padded with None, as ``csv.DictReader`` does.
+    """
+    reader = csv.reader(csv_file)
+    header = next(reader, [])
+    width = len(header)
+    rows = [row if len(row) >= width else row + [None] * (width - len(row))
+            for row in reader if row]
+    return dict((name, i) for i, name in enumerate(header)), rows
+
+
+def _column(columns, rows, field):
+    if field not in columns:
+        raise KeyError(field)
+    k = columns[field]
+    return [row[k] for row in rows]
+
+
+def _intern(values):
+    """
+    Share a single string object between the equal values of a column. The
+    table only lives for the column, unlike the process-wide ``STRINGS``
+    used by columnar records.
+    """
+    table = {}
+    return [table.setdefault(v, v) for v in values]
+
+
+def _convert_records(interaction, columns, rows):
+    record_type = RECORD_TYPES[interaction]
+    values = []
+    for field in record_type.parameters:
+        if field == 'interaction':
+            values.append([interaction] * len(rows))
+        elif field == 'datetime':
+            values.append(_parse_datetimes(_column(columns, rows, field)))
+        elif field == 'duration':
+            values.append(map(int, _column(columns, rows, field)))
+        elif field in ('correspondent_id', 'position', 'event'):
+            values.append(_intern(_column(columns, rows, field)))
+        else:
+            values.append(_column(columns, rows, field))
+
+    # Records are filled one field at a time through the slots of the record
+    # class, instead of calling __init__ with keyword arguments for each row
+    records = map(object.__new__, [record_type] * len(rows))
+    for field, column in zip(record_type.parameters, values):
+        map(getattr(record_type, field).__set__, records, column)
+    return records
+
+
+def _convert_columnar(interaction, columns, rows, strings):
+    # Unknown types raise a KeyError, as with Record objects
+    record_type = RECORD_TYPES[interaction]
+
+    data = np.empty(len(rows), dtype=RECORD_DTYPE)
+    data['interaction'] = INTERACTIONS.index(interaction)
+    data['direction'] = -1
+    data['duration'] = np.nan
+    for field in ('correspondent_id', 'position', 'event'):
+        data[field] = -1
+
+    for field in record_type.parameters:
+        if field == 'datetime':
+            data[field] = _parse_timestamps(_column(columns, rows, field))
+        elif field == 'duration':
+            data[field] = np.array(_column(columns, rows, field)).astype(np.int64)
+        elif field == 'direction':
+            data[field] = [DIRECTIONS.index(d) if d in DIRECTIONS else -1
+                           for d in _column(columns, rows, field)]
+        elif field in ('correspondent_id', 'position', 'event'):
+            data[field] = map(strings.code, _column(columns, rows, field))
+
+    return data
+
+
+def _group_rows(columns, rows):
+    """
+    Return the row indices of each interaction type, in order of first
+    appearance. The indices are None if all the rows have the same type.
+    """
+    kinds = _column(columns, rows, 'interaction') if rows else []
+
+    groups = OrderedDict()
+    if len(set(kinds)) == 1:
+        groups[kinds[0]] = None
+    else:
+        for k, interaction in enumerate(kinds):
+            groups.setdefault(interaction, []).append(k)
+    return groups
+
+
+def read_records(csv_file, columnar=False, strings=STRINGS):
+    """
+    Parse all the records of a CSV file in bulk.
+
+    The header is mapped to columns once, and each column is converted in a
+    single pass: timestamps in the ``YYYY-MM-DD HH:MM:SS`` format are parsed
+    by slicing, and durations are converted together. The records are the
+    same as parsing every row of ``csv.DictReader`` with ``_parse_record``,
+    and the same errors are raised for unparsable values.
+
+    Parameters
+    ----------
+    csv_file : file
+        An open CSV file, with a header row.
+    columnar : bool, default False
+        If True, returns a :class:`~bandicoot.columnar.ColumnarRecords`
+        instead of a list of Record objects.
+    strings : StringTable
+        The table used to code the correspondent ids, stops and events of
+        columnar records.
+
+    Returns
+    -------
+    The records, in the order of the file.
+    """
+    columns, rows = _read_rows(csv_file)
+    groups = _group_rows(columns, rows)
+
+    if columnar:
+        data = np.empty(len(rows), dtype=RECORD_DTYPE)
+        for interaction, idx in groups.items():
+            if idx is None:
+                data = _convert_columnar(interaction, columns, rows, strings)
+            else:
+                data[idx] = _convert_columnar(interaction, columns, [rows[k] for k in idx], strings)
+        return ColumnarRecords(data, strings)
+
+    records = [None] * len(rows)
+    for interaction, idx in groups.items():
+        if idx is None:
+            records = _convert_records(interaction, columns, rows)
+        else:
+            for k, r in zip(idx, _convert_records(interaction, columns, [rows[k] for k in idx])):
+                records[k] = r
+    return records
+
+
+def unique_records(records):
+    """
+    Sort records by datetime and remove duplicates.
+
+    Records are sorted (stably) on their datetime, and each record is only
+    compared to the records sharing its datetime, so no record needs to be
+    hashed. Columnar records are deduplicated on their integer-coded rows.
+    """
+    if isinstance(records, ColumnarRecords):
+        return records.unique()
+
+    result = []
+    same_time = []  # Records kept for the current datetime
+    for r in sorted(records, key=lambda r: r.datetime):
+        if same_time and same_time[0].datetime != r.datetime:
+            same_time = []
+        if r not in same_time:
+            same_time.append(r)
+            result.append(r)
+
+    return result
 
 
 def filter_record(records, interaction_type):
@@ -169,8 +868,9 @@ def filter_record(records, interaction_type):
 
     Parameters
     ----------
-    records : list
-        A list of Record objects
+    records : list or ColumnarRecords
+        A list of Record objects, or records stored in columns, which are
+        checked with vectorized tests.
 
     interaction_type : str
         The interaction type of the list of records
@@ -178,12 +878,13 @@ def filter_record(records, interaction_type):
     Returns
     -------
 
-    records, ignored : (object list, dict)
-        A tuple of filtered records, and a dictionary counting the missings
-        fields.
+    records, ignored, bad_records : (object list, dict, list)
+        A tuple of filtered records, a dictionary counting the missings
+        fields, and the list of records which were removed. Each removed
+        record is listed once, even if several of its fields are invalid.
     """
     def sort_records(records):
-        sorted_min_records = sorted(set(records), key=lambda r: r.datetime)
+        sorted_min_records = unique_records(records)
         num_dup = len(records) - len(sorted_min_records)
         if num_dup > 0:
             print warning_str(
@@ -202,29 +903,44 @@ def filter_record(records, interaction_type):
         ('event', 0)
     ])
 
-    bad_records = []
+    if isinstance(records, ColumnarRecords):
+        # One mask per field, over all the records at once
+        data = records.data
+        valid = np.ones(len(data), dtype=bool)
+        for key in TYPE_SCHEME[interaction_type]:
+            passed = _COLUMN_TESTS[key](data, interaction_type)
+            ignored[key] += int(len(data) - np.count_nonzero(passed))
+            valid &= passed
+        ignored['all'] = int(len(data) - np.count_nonzero(valid))
+        bad_records = records[~valid].to_records() if ignored['all'] else []
+        return sort_records(records[valid]), ignored, bad_records
+
+    validate = _validator(interaction_type)
+    kept, bad_records = [], []
+    for r in records:
+        failed = validate(r)
+        if failed:
+            for key in failed:  # Count all fields with errors
+                ignored[key] += 1
+            ignored['all'] += 1
+            bad_records.append(r)
+        else:
+            kept.append(r)
 
-    def _filter(records):
-        global removed
-        for r in records:
-            valid = True
-            for key, test in TYPE_SCHEME[interaction_type].iteritems():
-                if not test(r):
-                    ignored[key] += 1
-                    bad_records.append(r)
-                    valid = False  # Not breaking, count all fields with errors
+    return sort_records(kept), ignored, bad_records
 
-            if valid is True:
-                yield r
-            else:
-                ignored['all'] += 1
 
-    return sort_records(list(_filter(records))), ignored, bad_records
+def _warn_ignored(ignored, name):
+    if ignored['all'] != 0:
+        print warning_str("Warning: %d %s record(s) were removed due to missing or incomplete fields." % (ignored['all'],name))
+        for k in ignored.keys():
+            if k != 'all' and ignored[k] != 0:
+                print warning_str(" " * 9 + "%s: %i %s(s) with incomplete values" % (k, ignored[k], name))
 
 
 def load(name, call_records=None, text_records=None, physical_records=None,
          screen_records=None, stop_records=None, attributes=None,
-         attributes_path=None, describe=False, warnings=False):
+         attributes_path=None, describe=False, warnings=False, columnar=False):
     """Create a new user.
 
     This function is used by read_csv. If you want to
@@ -247,6 +963,11 @@ def load(name, call_records=None, text_records=None, physical_records=None,
     attributes : dict
         A (key,value) dictionary of attributes for the current user
 
+    attributes_path : str or AttributesTable, optional
+        Where the attributes of the user and its correspondents are read.
+        If ``attributes`` is not given and this is an attributes table (see
+        :meth:`read_csv`), the attributes of the user are taken from it.
+
     describe : boolean
         If describe is True, it will print a description of the loaded user
         to the standard output. Defaults to false.
@@ -255,6 +976,10 @@ def load(name, call_records=None, text_records=None, physical_records=None,
         If warnings is equal to False, the function will not output the
         warnings on the standard output.
 
+    columnar : boolean, default False
+        If columnar is True, the records are stored in NumPy arrays. See
+        :class:`~bandicoot.columnar.ColumnarRecords`.
+
     For instance:
 
     .. code-block:: python
@@ -265,7 +990,7 @@ def load(name, call_records=None, text_records=None, physical_records=None,
 
     Will returns a new User object.
     """
-    user = User()
+    user = User(columnar=columnar)
     user.name = name
     user.attributes_path = attributes_path
 
@@ -305,13 +1030,12 @@ def load(name, call_records=None, text_records=None, physical_records=None,
         print warning_str("Warning: No data provided!")
 
     for ignored, name in due_loading:
-        if ignored['all'] != 0:
-            if warnings:
-                print warning_str("Warning: %d %s record(s) were removed due to missing or incomplete fields." % (ignored['all'],name))
-            for k in ignored.keys():
-                if k != 'all' and ignored[k] != 0 and warnings:
-                    print warning_str(" " * 9 + "%s: %i %s(s) with incomplete values" % (k, ignored[k], name))
+        if warnings:
+            _warn_ignored(ignored, name)
 
+    if attributes is None and attributes_path is not None:
+        table = attributes_table(attributes_path)
+        attributes = table.get(name) if table is not None else None
     if attributes is not None:
         user.attributes = attributes
 
@@ -321,18 +1045,121 @@ def load(name, call_records=None, text_records=None, physical_records=None,
     return user, bad_records
 
 
-def _read_network(user, records_path, attributes_path, read_function, extension=".csv"):
-    """Will not work with added/changed datatypes."""
+def _record_time(r):
+    """
+    The datetime of a record in microseconds since the epoch, from the
+    ``timestamp`` set by :class:`~bandicoot.core.User` when there is one.
+    """
+    try:
+        return r.timestamp * 10 ** 6 + r.datetime.microsecond
+    except AttributeError:
+        return to_microseconds(r.datetime)
+
+
+def _match_index(records):
+    """
+    Index records to find reciprocal records quickly (see
+    :meth:`Record.matches <bandicoot.core.Record.matches>`). Records are
+    grouped by interaction, duration and direction, and each group holds the
+    sorted times of its records, in microseconds since the epoch.
+    """
+    index = {}
+    for r in records:
+        directions = index.setdefault((r.interaction, getattr(r, 'duration', None)), {})
+        directions.setdefault(getattr(r, 'direction', None), []).append(_record_time(r))
+
+    for directions in index.values():
+        for times in directions.values():
+            times.sort()
+    return index
+
+
+def _has_match(record, index):
+    """
+    Same as ``record.has_match(records)`` for the records indexed with
+    :meth:`_match_index`: a binary search looks for a record of the same
+    interaction and duration, in another direction, less than 30 seconds
+    apart.
+    """
+    directions = index.get((record.interaction, getattr(record, 'duration', None)))
+    if directions is None:
+        return False
+
+    t = _record_time(record)
+    window = 30 * 10 ** 6
+    for direction, times in directions.iteritems():
+        if direction != getattr(record, 'direction', None) and \
+                bisect_right(times, t - window) < bisect_left(times, t + window):
+            return True
+    return False
+
+
+def _network_candidates(user, records_path, interaction, extension=".csv"):
+    """
+    The correspondents of ``user`` for one interaction type, sorted, and
+    whether they have a records file.
+    """
+    correspondents = set(r.correspondent_id for r in getattr(user, interaction + '_records'))
+    return OrderedDict((c_id, os.path.exists(_user_file(records_path, c_id, extension)))
+                       for c_id in sorted(correspondents))
+
+
+def _merge_networks(networks):
+    """
+    Merge the networks of several interaction types, given as a list of
+    ``(interaction, network)``. Correspondents found in several networks get
+    the records of each type.
+    """
+    merged = {}
+    for interaction, network in networks:
+        for c_id, correspondent in network.items():
+            if correspondent is None:
+                merged.setdefault(c_id, None)
+            elif merged.get(c_id) is None:
+                merged[c_id] = correspondent.copy()
+            else:
+                setattr(merged[c_id], interaction + '_records',
+                        getattr(correspondent, interaction + '_records'))
+                merged[c_id].ignored_records[interaction] = correspondent.ignored_records[interaction]
+    return OrderedDict(sorted(merged.items(), key=lambda t: t[0]))
+
+
+def _read_network(user, records_path, attributes_path, read_function, interaction,
+                  extension=".csv", user_cache=None):
+    """
+    Load the correspondents of ``user`` for one interaction type, and remove
+    the records of ``interaction`` type which are not reciprocated by the
+    correspondent's records.
+
+    Correspondents are taken from ``user_cache`` (a
+    :class:`~bandicoot.cache.UserCache`) when given, and copied before their
+    records are filtered.
+    """
     connections = {}
-    correspondents = Counter([record.correspondent_id for record in user.records])
+    get_records = lambda u: getattr(u, interaction + '_records')
 
     # Try to load all the possible correspondent files
-    for c_id, count in sorted(correspondents.items()):
-        correspondent_file = os.path.join(records_path, c_id + extension)
-        if os.path.exists(correspondent_file):
-            connections[c_id] = read_function(c_id, records_path, attributes_path, describe=False, network=False, warnings=False)
-        else:
+    for c_id, exists in _network_candidates(user, records_path, interaction, extension).items():
+        if not exists:
             connections[c_id] = None
+            continue
+
+        correspondent_file = _user_file(records_path, c_id, extension)
+
+        load = partial(read_function, c_id, attributes_path=attributes_path, describe=False,
+                       network=False, warnings=False, **{interaction + '_path': records_path})
+        if user_cache is None:
+            connections[c_id] = load()
+        else:
+            attributes_file = _attributes_source(attributes_path, c_id, extension)
+            key = (c_id, interaction, records_path, attributes_file)
+            connections[c_id] = user_cache.get(
+                key, [correspondent_file, attributes_file], load).copy()
+
+    # Match indexes of the users, built on first use. A user's index is
+    # dropped once its records are filtered, as later users are checked
+    # against the filtered records.
+    indexes = {}
 
     def _is_consistent(record):
         if record.correspondent_id == user.name:
@@ -342,7 +1169,11 @@ def _read_network(user, records_path, attributes_path, read_function, extension=
         else:
             return True  # consistent by default
 
-        return True if correspondent is None else record.has_match(correspondent.records)
+        if correspondent is None:
+            return True
+        if id(correspondent) not in indexes:
+            indexes[id(correspondent)] = _match_index(get_records(correspondent))
+        return _has_match(record, indexes[id(correspondent)])
 
     def all_user_iter():
         if user.name not in connections:
@@ -353,10 +1184,11 @@ def _read_network(user, records_path, attributes_path, read_function, extension=
                 yield u
 
     # Filter records and count total number of records before/after
-    num_total_records = sum(len(u.records) for u in all_user_iter())
+    num_total_records = sum(len(get_records(u)) for u in all_user_iter())
     for u in all_user_iter():
-        u.records = filter(_is_consistent, u.records)
-    num_total_records_filtered = sum(len(u.records) for u in all_user_iter())
+        setattr(u, interaction + '_records', filter(_is_consistent, get_records(u)))
+        indexes.pop(id(u), None)
+    num_total_records_filtered = sum(len(get_records(u)) for u in all_user_iter())
 
     # Report non reciprocated records
     num_inconsistent_records = num_total_records - num_total_records_filtered
@@ -368,9 +1200,52 @@ def _read_network(user, records_path, attributes_path, read_function, extension=
     return OrderedDict(sorted(connections.items(), key=lambda t: t[0]))
 
 
+def _load_lazy_network(user, load_network):
+    """
+    Load a lazy network of ``user``, and count the out of network
+    interactions again, as the records of ``user`` which are not
+    reciprocated have been removed.
+    """
+    network = load_network()
+    user.recompute_missing_neighbors()
+    return network
+
+
+def _attributes_source(attributes_path, user_id, extension='.csv', files=None):
+    """
+    The file holding the attributes of ``user_id``: the attributes table, or
+    the user's file in the directory ``attributes_path``.
+    """
+    table = attributes_table(attributes_path)
+    if table is not None:
+        return table.path
+    if attributes_path is not None:
+        return _user_file(attributes_path, user_id, extension, files)
+    return None
+
+
+def _read_attributes(attributes_path, user_id, files=None):
+    """
+    Read the attributes of a user, from the attributes table or from the
+    ``key, value`` attributes file of the user, or return None if there are
+    none.
+    """
+    table = attributes_table(attributes_path)
+    if table is not None:
+        return table.get(user_id)
+    if attributes_path is not None:
+        try:
+            with _open_file(_user_file(attributes_path, user_id, files=files), files) as csv_file:
+                return dict((d['key'], d['value']) for d in csv.DictReader(csv_file))
+        except IOError:
+            pass
+    return None
+
+
 def read_csv(user_id, call_path=None, text_path=None, physical_path=None,
              screen_path=None, stop_path=None, attributes_path=None,
-             network=False, describe=True, warnings=True, errors=False):
+             network=False, describe=True, warnings=True, errors=False,
+             columnar=False, cache=None, network_cache=None, files=None):
     """
     Load user records from a CSV file.
 
@@ -383,15 +1258,32 @@ def read_csv(user_id, call_path=None, text_path=None, physical_path=None,
     *_path : str
         Path of the directory all the user record files.
 
-    attributes_path : str, optional
+    attributes_path : str or AttributesTable, optional
         Path of the directory containing attributes files (``key, value`` CSV
         file). Attributes can for instance be variables such as like, age, or
         gender. Attributes can be helpful to compute specific metrics.
 
-    network : bool, optional
+        It can also be the path of a single table with the attributes of all
+        the users (a CSV file with a ``user_id`` column, or a .npz file), or
+        an :class:`~bandicoot.attributes.AttributesTable`. The table is
+        loaded once per process, see
+        :meth:`~bandicoot.attributes.read_attributes_table`.
+
+    network : bool or 'lazy', optional
         If network is True, bandicoot loads the network of the user's
         correspondants from the same path. Defaults to False.
 
+        With 'lazy', ``user.network`` and the networks of each type
+        (``user.network_call``, ...) are
+        :class:`~bandicoot.core.LazyNetwork` mappings: correspondents are
+        loaded, and non reciprocated records removed, the first time one of
+        them is accessed, e.g. by :meth:`bandicoot.network.clustering_coefficient_unweighted`.
+        Until then, the user's records are not filtered and
+        ``percent_outofnetwork_*`` only check which correspondents have a
+        records file. :meth:`bandicoot.utils.all` loads the network first
+        when ``network=True``, so that indicators are the same in both
+        modes.
+
     describe : boolean
         If describe is True, it will print a description of the loaded user to
         the standard output.
@@ -400,6 +1292,27 @@ def read_csv(user_id, call_path=None, text_path=None, physical_path=None,
         If errors is True, returns a tuple (user, errors), where user is the
         user object and errors are the records which could not be loaded.
 
+    columnar : boolean
+        If columnar is True, the records are stored in NumPy arrays instead of
+        lists of Record objects. Defaults to False.
+
+    cache : DiskCache, optional
+        A :class:`~bandicoot.cache.DiskCache`. The user is loaded from the
+        cache if its files did not change since it was stored, and stored in
+        the cache otherwise. The cache is not used if errors is True, as
+        ignored records are not stored.
+
+    network_cache : UserCache, optional
+        The :class:`~bandicoot.cache.UserCache` of correspondents used when
+        network is True, so that their files are parsed once for all the
+        users loaded. Defaults to the cache shared by the process,
+        ``bandicoot.cache.network_cache``.
+
+    files : dict, optional
+        The content of the user's files, by file name, read instead of the
+        files themselves. This is used by
+        :class:`~bandicoot.batch.PrefetchLoader` to read files in advance.
+
 
     Examples
     --------
@@ -415,47 +1328,79 @@ def read_csv(user_id, call_path=None, text_path=None, physical_path=None,
     Notes
     -----
     - The csv files can be single, or double quoted if needed.
+    - Files compressed with gzip, bzip2 or xz (e.g. ``user_id.csv.gz``) are
+      read as well, and decompressed while reading.
     - Empty cells are filled with ``None``. For example, if the column
       ``duration`` is empty for one record, its value will be ``None``.
       Other values such as ``"N/A"``, ``"None"``, ``"null"`` will be
       considered as a text.
     """
-    def _reader(datatype_path, file_type=1):
+    def _reader(datatype_path):
         if datatype_path is not None:
-            user_datatype = os.path.join(datatype_path, user_id + '.csv')
+            user_datatype = _user_file(datatype_path, user_id, files=files)
             try:
-                with open(user_datatype, 'rb') as csv_file:
-                    reader = csv.DictReader(csv_file)
-                    return map(_parse_record, reader) if file_type == 1 else \
-                        dict((d['key'], d['value']) for d in reader)
+                with _open_file(user_datatype, files) as csv_file:
+                    return read_records(csv_file, columnar=columnar)
             except IOError:
                 pass
         return None
 
-    call_records = _reader(call_path, 1)
-    text_records = _reader(text_path, 1)
-    physical_records = _reader(physical_path, 1)
-    screen_records = _reader(screen_path, 1)
-    stop_records = _reader(stop_path, 1)
-    attributes = _reader(attributes_path, 2)
-
-    user, bad_records = load(
-        user_id, call_records, text_records, physical_records, screen_records,
-        stop_records, attributes, attributes_path=attributes_path,
-        describe=False, warnings=warnings
-    )
+    # Cached users are checked against the files they were read from
+    sources = [_user_file(path, user_id, files=files) if path is not None else None
+               for path in [call_path, text_path, physical_path, screen_path,
+                            stop_path]]
+    sources.append(_attributes_source(attributes_path, user_id, files=files))
+    user = cache.load(user_id, sources, columnar) if cache is not None and not errors else None
+
+    if user is not None:
+        user.attributes_path = attributes_path
+        for _type in ['call', 'text', 'physical', 'screen', 'stop']:
+            if warnings and user.ignored_records[_type] is not None:
+                _warn_ignored(user.ignored_records[_type], _type)
+    else:
+        call_records = _reader(call_path)
+        text_records = _reader(text_path)
+        physical_records = _reader(physical_path)
+        screen_records = _reader(screen_path)
+        stop_records = _reader(stop_path)
+        attributes = _read_attributes(attributes_path, user_id, files)
+
+        user, bad_records = load(
+            user_id, call_records, text_records, physical_records, screen_records,
+            stop_records, attributes, attributes_path=attributes_path,
+            describe=False, warnings=warnings, columnar=columnar
+        )
+        if cache is not None:
+            cache.save(user_id, sources, user)
 
     # Loads the network
-    if network is True:
-        if call_records is not None:
-            user.network_call = _read_network(
-                user, call_path, attributes_path, read_csv)
-        if call_records is not None:
-            user.network_text = _read_network(
-                user, text_path, attributes_path, read_csv)
-        if physical_records is not None:
-            user.network_physical = _read_network(
-                user, physical_path, attributes_path, read_csv)
+    if network:
+        if network_cache is None:
+            network_cache = bc.cache.network_cache
+
+        networks = []
+        for interaction, path in [('call', call_path), ('text', text_path),
+                                  ('physical', physical_path)]:
+            if user.ignored_records[interaction] is None:
+                continue
+            load_network = partial(_read_network, user, path, attributes_path, read_csv,
+                                   interaction, user_cache=network_cache)
+            if network == 'lazy':
+                user_network = LazyNetwork(_network_candidates(user, path, interaction),
+                                           partial(_load_lazy_network, user, load_network))
+            else:
+                user_network = load_network()
+            setattr(user, 'network_' + interaction, user_network)
+            networks.append((interaction, user_network))
+
+        if network == 'lazy':
+            candidates = {}
+            for _, user_network in networks:
+                for c_id in user_network:
+                    candidates[c_id] = candidates.get(c_id, False) or user_network.exists(c_id)
+            user.network = LazyNetwork(candidates, partial(_merge_networks, networks))
+        else:
+            user.network = _merge_networks(networks)
         user.recompute_missing_neighbors()
 
     if describe:
@@ -464,3 +1409,173 @@ def read_csv(user_id, call_path=None, text_path=None, physical_path=None,
     if errors:
         return user, bad_records
     return user
+
+
+def _write_run(rows, tmp_dir):
+    f = tempfile.TemporaryFile(dir=tmp_dir)
+    for row in rows:
+        marshal.dump(row, f)
+    f.seek(0)
+    return f
+
+
+def _sorted_runs(rows, key, run_size, tmp_dir, fan_in=64):
+    """
+    Split ``rows`` in runs of at most ``run_size`` rows, each sorted (stably)
+    by ``key`` and written to a temporary file.
+
+    Runs are merged as they are written: once ``fan_in`` runs of the same
+    level exist, they are merged into a single run of the next level. At
+    most ``fan_in`` runs per level are open at a time, and the runs are
+    returned in the order of their rows in ``rows``.
+    """
+    levels = []
+    while True:
+        run = list(itertools.islice(rows, run_size))
+        if not run:
+            break
+        run.sort(key=lambda row: row[key])
+        f = _write_run(run, tmp_dir)
+
+        level = 0
+        while True:
+            if level == len(levels):
+                levels.append([])
+            levels[level].append(f)
+            if len(levels[level]) < fan_in:
+                break
+            f = _write_run(_merge_runs(levels[level], key), tmp_dir)
+            for merged in levels[level]:
+                merged.close()
+            levels[level] = []
+            level += 1
+
+    # Higher levels hold the first rows
+    runs = [f for level in reversed(levels) for f in level]
+    while len(runs) > fan_in:
+        f = _write_run(_merge_runs(runs[:fan_in], key), tmp_dir)
+        for merged in runs[:fan_in]:
+            merged.close()
+        runs[:fan_in] = [f]
+    return runs
+
+
+def _merge_runs(runs, key):
+    """
+    Merge sorted runs into a single stream of rows sorted by ``key``. Rows
+    with the same key are kept in their order in the original file.
+    """
+    def _decorate(i, f):
+        while True:
+            try:
+                row = marshal.load(f)
+            except EOFError:
+                return
+            yield row[key], i, row
+
+    for _, _, row in heapq.merge(*[_decorate(i, f) for i, f in enumerate(runs)]):
+        yield row
+
+
+def _load_rows(user_id, columns, rows, attributes_path, describe, warnings, columnar):
+    """
+    Create a user from its rows of a :meth:`read_stream` file.
+    """
+    records = {}
+    for interaction, idx in _group_rows(columns, rows).items():
+        interaction_rows = rows if idx is None else [rows[k] for k in idx]
+        if columnar:
+            records[interaction] = ColumnarRecords(
+                _convert_columnar(interaction, columns, interaction_rows, STRINGS), STRINGS)
+        else:
+            records[interaction] = _convert_records(interaction, columns, interaction_rows)
+
+    user, _ = load(
+        user_id, records.get('call'), records.get('text'), records.get('physical'),
+        records.get('screen'), records.get('stop'),
+        _read_attributes(attributes_path, user_id), attributes_path=attributes_path,
+        describe=describe, warnings=warnings, columnar=columnar
+    )
+    return user
+
+
+def read_stream(path, user_column='user_id', grouped=False, attributes_path=None,
+                describe=False, warnings=False, columnar=False,
+                run_size=1000000, tmp_dir=None, fan_in=64):
+    """
+    Read the records of many users from a single CSV file, and yield the
+    users one at a time.
+
+    The file has a header, a ``user_column`` column with the id of the user
+    owning each record, and the columns of :meth:`read_csv` files. Records
+    of all interaction types can be mixed.
+
+    Parameters
+    ----------
+
+    path : str
+        Path of the CSV file, which can be compressed (.gz, .bz2 or .xz).
+
+    user_column : str, default 'user_id'
+        Name of the column with the user ids.
+
+    grouped : bool, default False
+        If True, the rows of each user must be contiguous in the file (for
+        instance if the file is sorted by user), and the file is read in a
+        single pass. Otherwise, the rows are first sorted by user with an
+        external merge sort, using temporary files of ``run_size`` rows
+        created in ``tmp_dir``, merged ``fan_in`` files at a time.
+
+    attributes_path : str or AttributesTable, optional
+        The attributes files or table, as in :meth:`read_csv`.
+
+    describe, warnings, columnar : bool
+        See :meth:`read_csv`.
+
+    Notes
+    -----
+    Only the records of one user are kept in memory at a time (and at most
+    ``run_size`` rows while sorting the file), so the memory used depends on
+    the largest user rather than on the size of the file. With
+    ``grouped=True``, the ids of the users already read are also kept, to
+    check that the records of each user are contiguous.
+
+    Examples
+    --------
+
+    >>> for user in bandicoot.io.read_stream('records.csv', grouped=True):
+    ...     print user.name, len(user.call_records)
+    """
+    with _open_input(path) as csv_file:
+        reader = csv.reader(csv_file)
+        header = next(reader, [])
+        columns = dict((name, i) for i, name in enumerate(header))
+        if user_column not in columns:
+            raise KeyError(user_column)
+        key = columns[user_column]
+
+        # Empty lines are skipped and short rows are padded, as in read_csv
+        width = len(header)
+        rows = (row if len(row) >= width else row + [None] * (width - len(row))
+                for row in reader if row)
+
+        runs = []
+        try:
+            if not grouped:
+                runs = _sorted_runs(rows, key, run_size, tmp_dir, fan_in)
+                rows = _merge_runs(runs, key)
+
+            # Sorted rows need no check: each user id appears once
+            seen = set() if grouped else None
+            for user_id, user_rows in itertools.groupby(rows, key=lambda row: row[key]):
+                if seen is not None:
+                    if user_id in seen:
+                        raise ValueError("The records of user {} are not contiguous. "
+                                         "Use grouped=False for files which are not "
+                                         "grouped by user.".format(user_id))
+                    seen.add(user_id)
+                yield _load_rows(user_id, columns, list(user_rows), attributes_path,
+                                 describe, warnings, columnar)
+        finally:
+            for f in runs:
+                f.close()
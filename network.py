@@ -5,6 +5,7 @@ from itertools import groupby, combinations
 from functools import partial
 from datetime import datetime, timedelta
 from bandicoot_dev.utils import all
+from bandicoot_dev.attributes import attributes_table
 
 
 def _round_half_hour(record):
@@ -15,23 +16,27 @@ def _round_half_hour(record):
     return datetime(k.year, k.month, k.day, k.hour, k.minute, 0)
 
 
+def _records(user):
+    return list(user.call_records) + list(user.text_records)
+
+
 def _count_interaction(user, interaction=None, direction='out'):
     if interaction is 'duration':
         d = defaultdict(int)
-        for r in user.records:
+        for r in _records(user):
             if r.direction == direction and r.interaction == 'call':
                 d[r.correspondent_id] += r.duration
         return d
 
     if interaction is None:
         keyfn = lambda x: x.correspondent_id
-        records = (r for r in user.records if r.direction == direction)
+        records = (r for r in _records(user) if r.direction == direction)
         chunks = groupby(sorted(records, key=keyfn), key=keyfn)
         # Count the number of distinct half-hour blocks for each user
         return Counter({c_id: len(set((_round_half_hour(i) for i in items))) for c_id, items in chunks})
 
     if interaction in ['call', 'text']:
-        filtered = [x.correspondent_id for x in user.records if x.interaction == interaction and x.direction == direction]
+        filtered = [x.correspondent_id for x in _records(user) if x.interaction == interaction and x.direction == direction]
     else:
         raise ValueError("{} is not a correct value of interaction, only 'call'"
                          ", 'text', and 'duration' are accepted".format(interaction))
@@ -250,6 +255,10 @@ def assortativity_attributes(user):
 
     matrix = matrix_undirected_unweighted(user)
 
+    # With an attributes table, the attributes of the correspondents are
+    # looked up in the table
+    table = attributes_table(user.attributes_path)
+
     neighbors = [k for k in user.network.keys() if k != user.name]
     neighbors_attrbs = {}
     for i, u_name in enumerate(matrix_index(user)):
@@ -257,8 +266,9 @@ def assortativity_attributes(user):
         if correspondent is None or u_name == user.name or matrix[0][i] == 0:
             continue
 
-        if correspondent.has_attributes:
-            neighbors_attrbs[correspondent.name] = correspondent.attributes
+        attributes = table.get(u_name) if table is not None else correspondent.attributes
+        if attributes:
+            neighbors_attrbs[u_name] = attributes
 
     assortativity = {}
     for a in user.attributes:
@@ -107,10 +107,11 @@ def to_csv(punchcards, filename, digits=5):
 
 def read_csv(filename):
     """
-    Read a list of punchcards from a CSV file.
+    Read a list of punchcards from a CSV file, which can be compressed with
+    gzip, bzip2 or xz (``.gz``, ``.bz2`` or ``.xz`` extension).
     """
 
-    with open(filename, 'rb') as f:
+    with bc.io._open_input(filename) as f:
         r = csv.reader(f)
         next(r)  # remove header
         pc = list(r)
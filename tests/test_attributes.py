@@ -0,0 +1,82 @@
+"""
+Tests for bandicoot.attributes (population attributes tables).
+"""
+
+import bandicoot as bc
+import unittest
+import tempfile
+import shutil
+import os
+
+
+class TestAttributesTable(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.samples = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'samples')
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.attributes = os.path.join(self.samples, 'attributes')
+        self.table = os.path.join(self.dir, 'attributes.csv')
+        with open(self.table, 'w') as f:
+            f.write("individual_id,user_id,gender,age\n")
+            for user_id in ['u_test2', 'ego', 'A']:
+                attributes = bc.io._read_attributes(self.attributes, user_id)
+                f.write("%s,%s,%s,%s\n" % (attributes['individual_id'], user_id,
+                                           attributes['gender'], attributes['age']))
+            f.write("7atr8f53fg00,B,,\n")
+
+        self.calls = os.path.join(self.dir, 'call')
+        os.mkdir(self.calls)
+        for user_id, correspondent, direction, reverse in [('ego', 'A', 'out', 'in'),
+                                                            ('A', 'ego', 'in', 'out')]:
+            with open(os.path.join(self.calls, user_id + '.csv'), 'w') as f:
+                f.write("interaction,direction,correspondent_id,datetime,duration\n")
+                f.write("call,%s,%s,2014-03-01 10:00:00,12\n" % (direction, correspondent))
+                f.write("call,%s,%s,2014-03-02 10:00:00,12\n" % (reverse, correspondent))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _expected(self, user_id):
+        attributes = bc.io._read_attributes(self.attributes, user_id)
+        return dict((k, attributes[k]) for k in ['individual_id', 'gender', 'age'])
+
+    def test_table(self):
+        table = bc.attributes.read_attributes_table(self.table)
+        self.assertIs(bc.attributes.read_attributes_table(self.table), table)
+        self.assertEqual(len(table), 4)
+        self.assertEqual(list(table.ids), ['A', 'B', 'ego', 'u_test2'])
+        self.assertEqual(table.get('ego'), self._expected('ego'))
+        self.assertEqual(table.get('B'), {'individual_id': '7atr8f53fg00'})
+        self.assertEqual(table.get('C', {}), {})
+        self.assertNotIn('C', table)
+
+        path = os.path.join(self.dir, 'attributes.npz')
+        table.save(path)
+        loaded = bc.attributes.read_attributes_table(path)
+        for user_id in ['A', 'B', 'ego', 'u_test2', 'C']:
+            self.assertEqual(loaded.get(user_id), table.get(user_id))
+
+    def test_duplicates(self):
+        with open(self.table, 'a') as f:
+            f.write("7atr8f53fg00,A,,\n")
+        self.assertRaises(ValueError, bc.attributes.AttributesTable.from_csv, self.table)
+
+    def test_read_csv(self):
+        user = bc.read_csv("ego", self.calls, attributes_path=self.table,
+                           describe=False, warnings=False)
+        self.assertEqual(user.attributes, self._expected('ego'))
+
+        user = bc.read_csv("C", self.calls, attributes_path=self.table,
+                           describe=False, warnings=False)
+        self.assertEqual(user.attributes, {})
+
+    def test_network(self):
+        table = bc.attributes.AttributesTable.from_csv(self.table)
+        user = bc.read_csv("ego", self.calls, attributes_path=table, network=True,
+                           describe=False, warnings=False)
+        self.assertEqual(user.attributes, self._expected('ego'))
+        self.assertEqual(user.network['A'].attributes, self._expected('A'))
+        self.assertEqual(bc.network.assortativity_attributes(user),
+                         {'individual_id': 0, 'gender': 0, 'age': 1})
@@ -0,0 +1,167 @@
+"""
+Tests for bandicoot.batch (computing many users in parallel).
+"""
+
+import bandicoot as bc
+import unittest
+import tempfile
+import shutil
+import functools
+import csv
+import os
+
+
+def _number_of_records(user):
+    if len(user.call_records) == 0:
+        raise ValueError("No records for %s." % user.name)
+    return {'name': user.name, 'records': len(user.call_records) + len(user.text_records)}
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.dir, 'call'))
+        for u in range(5):
+            with open(os.path.join(self.dir, 'call', 'u%d.csv' % u), 'w') as f:
+                f.write("interaction,direction,correspondent_id,datetime,duration\n")
+                for i in range(u + 1):
+                    f.write("call,in,A,2014-03-0%d 10:00:00,12\n" % (i + 1))
+        self.loader = functools.partial(bc.read_csv, call_path=os.path.join(self.dir, 'call'),
+                                        describe=False, warnings=False)
+        self.users = ['u%d' % u for u in range(5)] + ['missing']
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _check(self, results):
+        results = sorted(results, key=lambda r: r['name'])
+        self.assertEqual([r['name'] for r in results], sorted(self.users))
+        self.assertEqual(results[0]['error'], True)
+        self.assertEqual(results[0]['error_type'], 'ValueError')
+        self.assertEqual([r['records'] for r in results[1:]], [1, 2, 3, 4, 5])
+
+    def test_in_process(self):
+        self._check(bc.batch.run(self.users, self.loader, workers=0, chunksize=2,
+                                 compute=_number_of_records))
+
+    def test_pool(self):
+        self._check(bc.batch.run(iter(self.users), self.loader, workers=2, chunksize=1,
+                                 max_in_flight=1, compute=_number_of_records))
+
+    def test_csv_output(self):
+        path = os.path.join(self.dir, 'out.csv')
+        counts = bc.batch.run(reversed(self.users), self.loader, workers=0, chunksize=1,
+                              output=path, compute=_number_of_records)
+        self.assertEqual(counts, {'users': 6, 'errors': 1})
+
+        with open(path) as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(rows[0]['error_type'], 'ValueError')
+        for row in rows[1:]:
+            self.assertEqual(row['error'], '')
+        self._check([dict(r, records=int(r['records'] or 0),
+                          error=r['error'] == 'True') for r in rows])
+
+    def test_indicators(self):
+        results = bc.batch.run(['u4'], self.loader, workers=0, split_week=True)
+        self.assertEqual(results[0]['name'], 'u4')
+        self.assertEqual(results[0]['reporting']['number_of_call_records'], 5)
+        self.assertTrue(results[0]['reporting']['split_week'])
+
+    def test_estimate(self):
+        chunks = list(bc.batch._chunks(self.users, 4, lambda u: 3 if u == 'u1' else 1))
+        self.assertEqual(chunks, [['u0', 'u1'], ['u2', 'u3', 'u4', 'missing']])
+
+    def test_size_hint(self):
+        hint = bc.batch._size_hint(self.loader)
+        self.assertEqual(hint('missing'), 0)
+        self.assertGreater(hint('u4'), hint('u0'))
+        self.assertEqual(bc.batch.PrefetchLoader(call_path=os.path.join(self.dir, 'call')).size('u4'),
+                         hint('u4'))
+        self.assertIsNone(bc.batch._size_hint(_number_of_records))
+
+        # Chunks hold about 2 users of average size, so the small users
+        # following a large one are grouped
+        sizes = {'u0': 1, 'u1': 9, 'u2': 1, 'u3': 1, 'u4': 1, 'missing': 1}
+        chunks = list(bc.batch._chunks(self.users, 2, lambda u: sizes[u] - 1, relative=True))
+        self.assertEqual(chunks, [['u0', 'u1'], ['u2', 'u3', 'u4', 'missing']])
+        self.assertEqual(list(bc.batch._chunks(self.users, 2, None, relative=True)),
+                         [['u0', 'u1'], ['u2', 'u3'], ['u4', 'missing']])
+
+    def test_jsonl_output(self):
+        path = os.path.join(self.dir, 'out.jsonl.gz')
+        counts = bc.batch.run(self.users, self.loader, workers=0, output=path,
+                              compute=_number_of_records)
+        self.assertEqual(counts, {'users': 6, 'errors': 1})
+        self._check(list(bc.io.read_jsonl(path)))
+
+        for name in ['out.jsonl', 'out.jsonl.bz2', 'out.jsonl.xz']:
+            self.assertTrue(bc.batch._is_jsonl(name))
+        for name in ['out.csv', 'out.csv.xz', 'out.xz']:
+            self.assertFalse(bc.batch._is_jsonl(name))
+
+    def test_prefetch(self):
+        loader = bc.batch.PrefetchLoader(call_path=os.path.join(self.dir, 'call'), prefetch=2,
+                                         describe=False, warnings=False)
+        loader.prefetch(self.users)
+        self.assertEqual(len(loader._pending), 2)
+
+        for user_id in self.users + ['u0']:
+            user = loader(user_id)
+            self.assertLessEqual(len(loader._pending), 2)
+            self.assertEqual([r._key() for r in user.call_records],
+                             [r._key() for r in self.loader(user_id).call_records])
+        loader.close()
+
+        stats = loader.stats()
+        self.assertEqual((stats['prefetched'], stats['direct']), (6, 1))
+        self.assertAlmostEqual(stats['hidden_time'], stats['read_time'] - stats['wait_time'])
+
+    def test_prefetch_out_of_order(self):
+        loader = bc.batch.PrefetchLoader(call_path=os.path.join(self.dir, 'call'), prefetch=2,
+                                         describe=False, warnings=False)
+        loader.prefetch(self.users)
+
+        # Skipped users are forgotten and do not fill the prefetch slots
+        for user_id in [self.users[1], self.users[4], self.users[0], self.users[5]]:
+            user = loader(user_id)
+            self.assertEqual([r._key() for r in user.call_records],
+                             [r._key() for r in self.loader(user_id).call_records])
+            self.assertNotIn(self.users[0], loader._pending)
+
+        self.assertEqual(list(loader._pending), [])
+        self.assertEqual(list(loader._queued), [])
+        stats = loader.stats()
+        self.assertEqual((stats['prefetched'], stats['direct']), (2, 2))
+        loader.close()
+
+    def test_prefetch_pool(self):
+        loader = bc.batch.PrefetchLoader(call_path=os.path.join(self.dir, 'call'),
+                                         describe=False, warnings=False)
+        self._check(bc.batch.run(self.users, loader, workers=2, chunksize=3,
+                                 compute=_number_of_records))
+        # The counters of the workers are added to the parent's loader
+        self.assertEqual(loader.prefetched, 6)
+        self.assertGreater(loader.stats()['read_time'], 0)
+
+        self._check(bc.batch.run(self.users, loader, workers=0, chunksize=3,
+                                 compute=_number_of_records))
+        self.assertEqual(loader.prefetched, 12)
+        # The loader belongs to the caller and is still usable
+        self.assertTrue(loader._workers)
+        self._check(bc.batch.run(self.users, loader, workers=0, chunksize=3,
+                                 compute=_number_of_records))
+        self.assertEqual(loader.prefetched, 18)
+        loader.close()
+        self.assertEqual(loader._workers, [])
+
+    def test_prefetch_chunks(self):
+        # Reading threads are kept between chunks
+        loader = bc.batch.PrefetchLoader(call_path=os.path.join(self.dir, 'call'),
+                                         describe=False, warnings=False)
+        bc.batch._run_chunk(loader, _number_of_records, self.users[:3])
+        workers = list(loader._workers)
+        self.assertTrue(workers)
+        bc.batch._run_chunk(loader, _number_of_records, self.users[3:])
+        self.assertEqual(loader._workers, workers)
+        loader.close()
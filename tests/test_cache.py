@@ -0,0 +1,131 @@
+"""
+Tests for bandicoot.cache (on-disk cache of parsed users).
+"""
+
+import bandicoot as bc
+import unittest
+import tempfile
+import shutil
+import os
+
+
+class TestDiskCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        for name, content in [
+                ('call', "interaction,direction,correspondent_id,datetime,duration\n"
+                         "call,in,A,2014-03-02 10:00:00,12\n"
+                         "call,out,B,2014-03-01 10:00:00,1\n"
+                         "call,in,A,2014-03-02 10:00:00,12\n"
+                         "call,up,B,2014-03-01 11:00:00,3\n"),
+                ('stop', "interaction,datetime,duration,position,event\n"
+                         "stop,2014-03-01 23:59:59,3600,s1,campus\n"),
+                ('attributes', "key,value\nage,25\n")]:
+            os.mkdir(os.path.join(self.dir, name))
+            with open(os.path.join(self.dir, name, 'u1.csv'), 'w') as f:
+                f.write(content)
+        self.cache = bc.cache.DiskCache(os.path.join(self.dir, 'cache'))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _read(self, **kwargs):
+        path = lambda name: os.path.join(self.dir, name)
+        return bc.read_csv('u1', call_path=path('call'), text_path=path('text'),
+                           stop_path=path('stop'), attributes_path=path('attributes'),
+                           describe=False, warnings=False, cache=self.cache, **kwargs)
+
+    def _summary(self, user):
+        return ([r._key() for r in user.call_records], [r._key() for r in user.stop_records],
+                user.ignored_records, user.attributes, user.supported_types,
+                user.start_time, user.end_time)
+
+    def test_hit(self):
+        cold = self._read()
+        self.assertEqual(self.cache.stats(), {'hits': 0, 'misses': 1})
+
+        warm = self._read()
+        self.assertEqual(self.cache.stats(), {'hits': 1, 'misses': 1})
+        self.assertEqual(self._summary(warm), self._summary(cold))
+        self.assertEqual(type(warm.call_records[0]).__name__, 'CallRecord')
+
+        columnar = self._read(columnar=True)
+        self.assertEqual(self.cache.stats(), {'hits': 2, 'misses': 1})
+        self.assertEqual(self._summary(columnar), self._summary(cold))
+
+    def test_unsafe_user_id(self):
+        for user_id in ['../u1', 'a/b', '..']:
+            filename = self.cache._filename(user_id, [None])
+            self.assertEqual(os.path.dirname(filename), self.cache.path)
+            self.assertNotIn(user_id, os.path.basename(filename))
+
+        user = bc.io.load('../u1', call_records=[], describe=False, warnings=False)[0]
+        self.cache.save('../u1', [None], user)
+        self.assertEqual(self.cache.load('../u1', [None]).name, '../u1')
+        self.assertFalse(os.path.exists(os.path.join(self.dir, 'u1.npz')))
+
+    def test_invalidation(self):
+        self._read()
+        with open(os.path.join(self.dir, 'call', 'u1.csv'), 'a') as f:
+            f.write("call,in,C,2014-03-03 10:00:00,5\n")
+
+        user = self._read()
+        self.assertEqual(self.cache.stats(), {'hits': 0, 'misses': 2})
+        self.assertEqual(len(user.call_records), 3)
+
+        self._read()
+        self.assertEqual(self.cache.stats(), {'hits': 1, 'misses': 2})
+
+
+class TestUserCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        header = "interaction,direction,correspondent_id,datetime,duration\n"
+        for name, content in [
+                ('u1', "call,out,A,2014-03-02 10:00:00,12\n"
+                       "call,in,B,2014-03-02 11:00:00,5\n"),
+                ('u2', "call,out,A,2014-03-05 10:00:00,3\n"),
+                ('A', "call,in,u1,2014-03-02 10:00:00,12\n"
+                      "call,out,u2,2014-03-03 10:00:00,3\n"
+                      "call,out,C,2014-03-04 10:00:00,1\n")]:
+            with open(os.path.join(self.dir, name + '.csv'), 'w') as f:
+                f.write(header + content)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _read(self, user_id, cache):
+        return bc.read_csv(user_id, call_path=self.dir, network=True, describe=False,
+                           warnings=False, network_cache=cache)
+
+    def test_shared(self):
+        cache = bc.cache.UserCache()
+        u1, u2 = self._read('u1', cache), self._read('u2', cache)
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1, 'evictions': 0,
+                                         'users': 1, 'records': 3})
+
+        # Filtering the network of u2 does not change the cached user
+        self.assertEqual(len(u1.network_call['A'].call_records), 3)
+        self.assertEqual(len(u2.network_call['A'].call_records), 2)
+        self.assertEqual(len(u2.call_records), 0)
+
+        uncached = bc.cache.UserCache(max_users=0)
+        for user in [u1, u2]:
+            expected = self._read(user.name, uncached)
+            self.assertEqual([r._key() for r in user.network_call['A'].call_records],
+                             [r._key() for r in expected.network_call['A'].call_records])
+        self.assertEqual(uncached.stats()['hits'], 0)
+
+    def test_invalidation(self):
+        cache = bc.cache.UserCache()
+        self._read('u1', cache)
+        with open(os.path.join(self.dir, 'A.csv'), 'a') as f:
+            f.write("call,out,D,2014-03-06 10:00:00,1\n")
+        self.assertEqual(len(self._read('u1', cache).network_call['A'].call_records), 4)
+        self.assertEqual(cache.stats()['misses'], 2)
+
+    def test_eviction(self):
+        cache = bc.cache.UserCache(max_records=2)
+        self._read('u1', cache)
+        self.assertEqual(cache.stats(), {'hits': 0, 'misses': 1, 'evictions': 1,
+                                         'users': 0, 'records': 0})
@@ -0,0 +1,162 @@
+"""
+Tests for bandicoot.columnar (NumPy-backed record storage).
+"""
+
+import bandicoot as bc
+from bandicoot.io import CallRecord
+import unittest
+import datetime
+from StringIO import StringIO
+
+
+def _records():
+    start = datetime.datetime(2014, 3, 2, 22, 15)
+    return [
+        CallRecord(interaction='call', direction='out', correspondent_id='A',
+               datetime=start + datetime.timedelta(hours=5), duration=120),
+        CallRecord(interaction='call', direction='in', correspondent_id='B',
+               datetime=start, duration=0),
+        CallRecord(interaction='call', direction='in', correspondent_id='A',
+               datetime=start + datetime.timedelta(days=9), duration=31)
+    ]
+
+
+class TestColumnar(unittest.TestCase):
+    def setUp(self):
+        self.user = bc.User()
+        self.user.call_records = _records()
+
+        self.columnar_user = bc.User(columnar=True)
+        self.columnar_user.call_records = _records()
+
+    def test_timestamp(self):
+        d = datetime.datetime(2014, 3, 2, 22, 15, 7)
+        self.assertEqual(bc.columnar.to_timestamp(d), 1393798507)
+        self.assertEqual(bc.columnar.from_timestamp(1393798507), d)
+
+    def test_microseconds(self):
+        d = datetime.datetime(2014, 3, 2, 22, 15, 7, 250000)
+        self.assertEqual(bc.columnar.to_microseconds(d), 1393798507250000)
+        self.assertEqual(bc.columnar.from_microseconds(1393798507250000), d)
+
+        records = [CallRecord(interaction='call', direction='in', correspondent_id='A',
+                              datetime=d, duration=1)]
+        store = bc.columnar.ColumnarRecords.from_records(records, bc.columnar.StringTable())
+        self.assertEqual(store[0].datetime, d)
+        self.assertEqual(store.to_records()[0].datetime, d)
+        self.assertEqual(store[0].timestamp, 1393798507)
+        self.assertEqual(store.to_records()[0].timestamp, 1393798507)
+
+    def test_store(self):
+        store = self.columnar_user.call_records
+        self.assertIsInstance(store, bc.columnar.ColumnarRecords)
+        self.assertEqual(store.data.dtype, bc.columnar.RECORD_DTYPE)
+        self.assertEqual(len(store), 3)
+        self.assertEqual(list(store.strings.decode(store.data['correspondent_id'])), ['B', 'A', 'A'])
+        self.assertEqual(len(set(store.data['correspondent_id'])), 2)
+
+    def test_views(self):
+        self.assertEqual(list(self.columnar_user.call_records),
+                         list(self.user.call_records))
+        self.assertEqual(self.columnar_user.call_records[-1],
+                         self.user.call_records[-1])
+        self.assertEqual(list(self.columnar_user.call_records[1:]),
+                         self.user.call_records[1:])
+
+    def test_times(self):
+        self.assertEqual(self.columnar_user.start_time, self.user.start_time)
+        self.assertEqual(self.columnar_user.end_time, self.user.end_time)
+        self.assertTrue(self.columnar_user.supported_types['call'])
+
+    def test_indicators(self):
+        for f in [bc.individual.number_of_contacts, bc.individual.duration,
+                  bc.individual.number_of_interactions]:
+            self.assertEqual(f(self.columnar_user, groupby=None),
+                             f(self.user, groupby=None))
+
+    def test_kernels(self):
+        texts = [bc.io.TextRecord(interaction='text', direction=d, correspondent_id='A',
+                                  datetime=datetime.datetime(2014, 3, 3 + i, 1 + 7 * i))
+                 for i, d in enumerate(['in', 'out', 'out'])]
+        stops = [bc.io.StopRecord(interaction='stop', datetime=datetime.datetime(2014, 3, 2 + i, 9),
+                                  duration=0.1 * (i + 1), position='s1', event=e)
+                 for i, e in enumerate(['campus', 'other', 'campus'])]
+        for user in [self.user, self.columnar_user]:
+            user.text_records = texts
+            user.stop_records = stops
+            user.night_start = datetime.time(22, 15, 0, 1)
+
+        ind = bc.individual
+        for f, kwargs in [(ind.number_of_interactions, {'perday': True}),
+                          (ind.balance_of_interactions, {}),
+                          (ind.percent_nocturnal, {}),
+                          (ind.ratio_call_text, {'direction': 'in'}),
+                          (ind.number_of_contacts, {'perday': True}),
+                          (ind.active_days, {}),
+                          (ind.time_at_campus, {'perday': True})]:
+            for groupby in [None, 'week']:
+                self.assertEqual(repr(f(self.columnar_user, groupby=groupby, summary=None, **kwargs)),
+                                 repr(f(self.user, groupby=groupby, summary=None, **kwargs)))
+
+        self.assertEqual(bc.columnar.sequential_sum([0.1] * 10), sum([0.1] * 10))
+        self.assertNotEqual(repr(bc.columnar.sequential_sum([0.1] * 10)), repr(1.0))
+
+    def test_ratio_call_text_without_texts(self):
+        # No incoming texts: the ratio is None on both paths, not a ZeroDivisionError
+        text = bc.io.TextRecord(interaction='text', direction='out', correspondent_id='A',
+                                datetime=datetime.datetime(2014, 3, 3))
+        for user in [self.user, self.columnar_user]:
+            user.text_records = [text]
+            result = bc.individual.ratio_call_text(user, groupby=None, summary=None, direction='in')
+            self.assertEqual(result['allweek']['allday']['text+call'], None)
+            result = bc.individual.ratio_call_text(user, groupby=None, summary=None, direction='out')
+            self.assertEqual(result['allweek']['allday']['text+call'], 1.0)
+
+    def test_unique(self):
+        records = _records()
+        store = bc.columnar.ColumnarRecords.from_records(
+            records + records[:2], bc.columnar.StringTable())
+        unique = store.unique()
+        self.assertEqual(len(unique), 3)
+        self.assertEqual(list(unique), sorted(records, key=lambda r: r.datetime))
+
+
+class TestStringTable(unittest.TestCase):
+    def test_codes(self):
+        table = bc.columnar.StringTable()
+        self.assertEqual([table.code(s) for s in ['A', 'B', 'A', None]], [0, 1, 0, -1])
+        self.assertEqual(list(table.decode([1, -1, 0])), ['B', None, 'A'])
+        self.assertIs(table.intern(''.join(['A'])), table.string(0))
+
+    def test_shared_table(self):
+        user = bc.User(columnar=True)
+        user.call_records = _records()
+        self.assertIs(user.strings, bc.columnar.STRINGS)
+        self.assertEqual(list(bc.columnar.STRINGS.decode(user.call_records.data['correspondent_id'])),
+                         ['B', 'A', 'A'])
+
+    def test_object_records(self):
+        content = ("interaction,direction,correspondent_id,datetime,duration\n"
+                   "call,in,not_shared,2014-03-02 10:00:00,12\n"
+                   "call,out,not_shared,2014-03-02 11:00:00,1\n")
+        size = len(bc.columnar.STRINGS)
+        records = bc.io.read_records(StringIO(content))
+        self.assertEqual(len(bc.columnar.STRINGS), size)
+        self.assertIs(records[0].correspondent_id, records[1].correspondent_id)
+
+    def test_count_codes(self):
+        self.assertEqual(list(bc.columnar.count_codes([3, 1, 3, 3])), [1, 3])
+        self.assertEqual(list(bc.columnar.count_codes([10 ** 6, 0, 0])), [2, 1])
+
+    def test_group_by_empty(self):
+        records = bc.columnar.ColumnarRecords.from_records([], bc.columnar.STRINGS)
+        self.assertEqual(records.group_by('correspondent_id'), {})
+
+    def test_interaction_grouper(self):
+        user = bc.User(columnar=True)
+        user.call_records = _records()
+        groups = bc.individual._interaction_grouper(user.call_records)
+        expected = bc.individual._interaction_grouper(sorted(_records(), key=lambda r: r.datetime))
+        self.assertEqual(groups.keys(), expected.keys())
+        for key in expected:
+            self.assertEqual(list(groups[key]), expected[key])
@@ -5,6 +5,7 @@ Tests for bandicoot.core (User, Position, and Record classes)
 import bandicoot as bc
 import unittest
 import datetime
+from StringIO import StringIO
 from testing_tools import parse_dict
 import os
 
@@ -58,3 +59,127 @@ class TestTowers(unittest.TestCase):
         towers = {key: tuple(value) for (key, value) in towers.items()}
 
         self.assertDictEqual(self.user.antennas, towers)
+
+
+class TestRecordTypes(unittest.TestCase):
+    def setUp(self):
+        self.kwargs = {
+            'interaction': 'call',
+            'direction': 'in',
+            'correspondent_id': 'A',
+            'datetime': datetime.datetime(2014, 8, 20, 20, 30, 37),
+            'duration': 137
+        }
+
+    def test_slots(self):
+        self.assertEqual(bc.io.CallRecord.parameters, ('interaction', 'direction', 'correspondent_id', 'datetime', 'duration'))
+        self.assertEqual(bc.io.CallRecord.__slots__, bc.io.CallRecord.parameters + ('timestamp', ))
+        self.assertFalse(hasattr(bc.io.TextRecord(interaction='text'), 'duration'))
+        self.assertRaises(TypeError, bc.io.TextRecord, duration=1)
+
+    def test_equality(self):
+        record = bc.io.CallRecord(**self.kwargs)
+        self.assertEqual(record, bc.io.CallRecord(**self.kwargs))
+        self.assertEqual(hash(record), hash(bc.io.CallRecord(**self.kwargs)))
+        self.assertNotEqual(record, bc.io.CallRecord(**dict(self.kwargs, duration=1)))
+        self.assertTrue(repr(record).startswith("Record(interaction='call', direction='in'"))
+
+    def test_equality_plain_record(self):
+        record = bc.io.read_records(StringIO(
+            "interaction,direction,correspondent_id,datetime,duration\n"
+            "call,in,A,2014-08-20 20:30:37,137\n"))[0]
+        plain = bc.core.Record(**dict(self.kwargs, correspondent_id='A'))
+        self.assertEqual(record, plain)
+        self.assertEqual(plain, record)
+        self.assertEqual(hash(record), hash(plain))
+        self.assertNotEqual(record, bc.core.Record(**dict(self.kwargs, correspondent_id='B')))
+        self.assertNotEqual(record, bc.core.Record(interaction='call'))
+
+    def test_matches(self):
+        record = bc.io.CallRecord(**self.kwargs)
+        other = bc.io.CallRecord(**dict(self.kwargs, direction='out', datetime=self.kwargs['datetime'] + datetime.timedelta(seconds=20)))
+        self.assertTrue(record.matches(other))
+        self.assertTrue(record.has_match([other]))
+
+    def test_pickle(self):
+        import pickle
+        record = bc.io.CallRecord(**self.kwargs)
+        for protocol in range(3):
+            self.assertEqual(pickle.loads(pickle.dumps(record, protocol)), record)
+
+    def test_unique_records(self):
+        first = bc.io.CallRecord(**self.kwargs)
+        second = bc.io.CallRecord(**dict(self.kwargs, correspondent_id='B'))
+        later = bc.io.CallRecord(**dict(self.kwargs, datetime=self.kwargs['datetime'] + datetime.timedelta(hours=1)))
+        records = [later, first, second, bc.io.CallRecord(**self.kwargs), later]
+        self.assertEqual(bc.io.unique_records(records), [first, second, later])
+
+    def test_position_hash(self):
+        self.assertEqual(hash(bc.core.Position(stop='1', location=(1, 2))),
+                         hash(bc.core.Position(stop='1')))
+        self.assertEqual(len(set([bc.core.Position(location=(1, 2)), bc.core.Position(location=(1, 2))])), 1)
+
+    def test_timestamp(self):
+        user = bc.User()
+        user.call_records = [bc.io.CallRecord(**self.kwargs)]
+        self.assertEqual(user.call_records[0].timestamp, 1408566637)
+
+
+class TestAppendRecords(unittest.TestCase):
+    def setUp(self):
+        start = datetime.datetime(2014, 3, 2, 10)
+        self.records = [
+            bc.io.CallRecord(interaction='call', direction='in', correspondent_id=str(i % 3),
+                             datetime=start + datetime.timedelta(hours=7 * i), duration=10 * i)
+            for i in range(12)]
+
+    def _check(self, user, expected):
+        self.assertEqual([r._key() for r in user.call_records],
+                         [r._key() for r in expected])
+        self.assertEqual(user.start_time['call'], expected[0].datetime)
+        self.assertEqual(user.end_time['call'], expected[-1].datetime)
+        self.assertEqual(user.end_time['any'], expected[-1].datetime)
+        self.assertTrue(user.supported_types['call'])
+
+    def test_append(self):
+        for columnar in [False, True]:
+            user = bc.User(columnar=columnar)
+            user.append_records('call', self.records[:5])
+            # Overlapping, unsorted and duplicated records
+            user.append_records('call', self.records[9:] + self.records[3:9])
+            self._check(user, self.records)
+
+    def test_append_invalid(self):
+        user = bc.User()
+        user.call_records = self.records[:6]
+        bad = bc.io.CallRecord(interaction='call', direction='in', correspondent_id=None,
+                               datetime=self.records[6].datetime, duration=1)
+        self.assertEqual(user.append_records('call', self.records[6:] + [bad]), [bad])
+        self.assertEqual(user.ignored_records['call']['correspondent_id'], 1)
+        self._check(user, self.records)
+
+    def test_append_invalidation(self):
+        user = bc.User()
+        user.call_records = self.records[:6]
+        user.text_records = [bc.io.TextRecord(interaction='text', direction='in', correspondent_id='0',
+                                              datetime=self.records[0].datetime)]
+        bc.helper.group.group_records(user, 'text')
+        call_index = user.time_index('call')
+
+        user.append_records('call', self.records[3:5])
+        self.assertIn(('text', ), [k[0] for k in user._group_cache])
+        self.assertIsNot(user.time_index('call'), call_index)
+
+        user.append_records('call', self.records[6:])
+        self.assertEqual(len(user._group_cache), 0)
+
+    def test_append_copy(self):
+        for columnar in [False, True]:
+            user = bc.User(columnar=columnar)
+            user.call_records = self.records[:3]
+            bc.helper.group.group_records(user, 'call')
+            cache = dict(user._group_cache)
+
+            user.copy().append_records('call', self.records[3:5])
+            self._check(user, self.records[:3])
+            self.assertEqual(dict(user._group_cache), cache)
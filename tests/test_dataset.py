@@ -0,0 +1,77 @@
+"""
+Tests for bandicoot.dataset (memory-mapped population files).
+"""
+
+import bandicoot as bc
+import unittest
+import tempfile
+import pickle
+import numpy as np
+from test_columnar import _records
+
+
+class TestDataset(unittest.TestCase):
+    def setUp(self):
+        stop = bc.io.StopRecord(interaction='stop', datetime=_records()[0].datetime,
+                                duration=30, position='s1', event='campus')
+        self.u1, _ = bc.io.load('u1', call_records=_records(), stop_records=[stop])
+        self.u1.attributes = {'age': '25'}
+        self.u2, _ = bc.io.load('u2', text_records=[], columnar=True)
+
+        self.file = tempfile.NamedTemporaryFile()
+        bc.io.write_dataset(self.file.name, iter([self.u1, self.u2]))
+        self.dataset = bc.io.open_dataset(self.file.name)
+
+    def _summary(self, user):
+        return ([r._key() for r in user.call_records], [r._key() for r in user.stop_records],
+                user.ignored_records, user.attributes, user.supported_types,
+                user.start_time, user.end_time)
+
+    def test_users(self):
+        self.assertEqual(len(self.dataset), 2)
+        self.assertEqual(list(self.dataset), ['u1', 'u2'])
+        self.assertIn('u2', self.dataset)
+
+        for original in [self.u1, self.u2]:
+            self.assertEqual(self._summary(self.dataset[original.name]), self._summary(original))
+            self.assertEqual(self._summary(self.dataset.load(original.name, columnar=False)),
+                             self._summary(original))
+
+    def test_views(self):
+        user = self.dataset['u1']
+        self.assertTrue(np.may_share_memory(user.call_records.data, self.dataset.records))
+        self.assertEqual(bc.individual.number_of_contacts(user, groupby=None),
+                         bc.individual.number_of_contacts(self.u1, groupby=None))
+
+    def test_pickle(self):
+        dataset = pickle.loads(pickle.dumps(self.dataset))
+        self.assertEqual(self._summary(dataset['u1']), self._summary(self.u1))
+
+    def test_index(self):
+        self.assertNotIn('u3', self.dataset)
+        self.assertRaises(KeyError, self.dataset.load, 'u3')
+        self.assertEqual(self.dataset.size('u1'), 4)
+        self.assertEqual(self.dataset.size('u2'), 0)
+
+    def test_many_users(self):
+        users = []
+        for i in [3, 1, 10, 2]:
+            user, _ = bc.io.load('u%d' % i, call_records=_records()[:i % 3 + 1])
+            users.append(user)
+        bc.io.write_dataset(self.file.name, users)
+        dataset = bc.io.open_dataset(self.file.name)
+
+        self.assertEqual(dataset.user_ids(), ['u3', 'u1', 'u10', 'u2'])
+        for user in users:
+            self.assertEqual(self._summary(dataset[user.name]), self._summary(user))
+
+    def test_hand_built_user(self):
+        user = bc.User()
+        user.name = 'u3'
+        user.call_records = _records()
+        bc.io.write_dataset(self.file.name, [user])
+        dataset = bc.io.open_dataset(self.file.name)
+
+        for columnar in [True, False]:
+            loaded = dataset.load('u3', columnar=columnar)
+            self.assertEqual(self._summary(loaded), self._summary(user))
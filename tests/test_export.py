@@ -2,6 +2,10 @@ import bandicoot as bc
 import unittest
 from testing_tools import parse_dict, file_equality, metric_suite, compare_dict
 import tempfile
+import shutil
+import gzip
+import bz2
+import csv
 import os
 from collections import OrderedDict as OD
 
@@ -61,3 +65,82 @@ class TestExport(unittest.TestCase):
 
         bc.io.to_json([dict1, dict2], tmp_file.name)
         self.assertTrue(file_equality(tmp_file.name, "samples/to_json_same_keys.json"))
+
+
+class TestCSVWriter(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.rows = [OD([("name", "u1"), ("a", 1.123456789), ("b", OD([("x", None)]))]),
+                     OD([("name", "u2"), ("a", 2), ("c", "late")])]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _read(self, filename, opener=open):
+        f = opener(os.path.join(self.dir, filename))
+        try:
+            return list(csv.reader(f))
+        finally:
+            f.close()
+
+    def test_sample(self):
+        with bc.io.CSVWriter(os.path.join(self.dir, 'out.csv'), sample=1) as w:
+            w.writerows(self.rows)
+
+        self.assertEqual(w.count, 2)
+        self.assertEqual(w.spilled, 1)
+        self.assertEqual(self._read('out.csv'),
+                         [['name', 'a', 'b__x'], ['u1', '1.12346', ''], ['u2', '2', '']])
+        self.assertEqual(self._read('out.extra.csv'),
+                         [['name', 'column', 'value'], ['u2', 'c', 'late']])
+
+    def test_fields(self):
+        path = os.path.join(self.dir, 'out.csv.gz')
+        with bc.io.CSVWriter(path, fields=['name', 'c']) as w:
+            w.writerows(iter(self.rows))
+
+        self.assertEqual(self._read('out.csv.gz', gzip.open),
+                         [['name', 'c'], ['u1', ''], ['u2', 'late']])
+        self.assertEqual(self._read('out.extra.csv.gz', gzip.open),
+                         [['name', 'column', 'value'], ['u1', 'a', '1.12346'],
+                          ['u1', 'b__x', ''], ['u2', 'a', '2']])
+
+    def test_to_csv_iterator(self):
+        path = os.path.join(self.dir, 'out.csv.bz2')
+        bc.io.to_csv(iter(self.rows), path)
+        self.assertEqual(self._read('out.csv.bz2', bz2.BZ2File),
+                         [['name', 'a', 'b__x', 'c'], ['u1', '1.12346', '', ''],
+                          ['u2', '2', '', 'late']])
+
+
+class TestJSONLines(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.rows = [OD([("name", "u1"), ("b", OD([("x", None), ("a", 1.5)]))]),
+                     OD([("name", "u2"), ("a", 2)])]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_round_trip(self):
+        for filename in ['out.jsonl', 'out.jsonl.gz', 'out.jsonl.bz2']:
+            path = os.path.join(self.dir, filename)
+            bc.io.to_jsonl(iter(self.rows), path)
+            self.assertEqual(list(bc.io.read_jsonl(path)), self.rows)
+
+    def test_append(self):
+        path = os.path.join(self.dir, 'out.jsonl.gz')
+        bc.io.to_jsonl(self.rows[0], path)
+        with bc.io.JSONLinesWriter(path, append=True) as w:
+            w.write(self.rows[1])
+        self.assertEqual(list(bc.io.read_jsonl(path)), self.rows)
+
+        with gzip.open(path) as f:
+            self.assertEqual(f.read().count('\n'), 2)
+
+    def test_incomplete_line(self):
+        path = os.path.join(self.dir, 'out.jsonl')
+        bc.io.to_jsonl(self.rows, path)
+        with open(path, 'a') as f:
+            f.write('{"name": "u3", "a"')
+        self.assertEqual(list(bc.io.read_jsonl(path)), self.rows)
@@ -178,3 +178,119 @@ class MissingTests(unittest.TestCase):
 
     def test_total_records(self):
         self.assertEqual(len(self.user.records), 1)
+
+
+class TimeIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.records = [
+            bc.io.CallRecord(interaction='call', direction='in', correspondent_id='1', datetime=datetime.datetime(2014, 8, 24, 23, 0), duration=1),
+            bc.io.CallRecord(interaction='call', direction='in', correspondent_id='1', datetime=datetime.datetime(2014, 8, 25, 12, 0), duration=1),
+            bc.io.CallRecord(interaction='call', direction='in', correspondent_id='1', datetime=datetime.datetime(2014, 9, 1, 6, 0), duration=1)
+        ]
+        self.user = bc.User()
+        self.user.call_records = self.records
+
+    def test_columns(self):
+        index = self.user.time_index('call')
+        self.assertEqual(list(index['weekend']), [True, False, False])
+        self.assertEqual(list(index['night']), [True, False, True])
+        self.assertEqual(len(set(index['week'])), 3)
+        self.assertEqual(len(set(index['month'])), 2)
+        self.assertEqual(len(set(index['day'])), 3)
+
+    def test_invalidation(self):
+        index = self.user.time_index('call')
+        self.assertIs(self.user.time_index('call'), index)
+
+        self.user.weekend.append(1)
+        self.assertEqual(list(self.user.time_index('call')['weekend']), [True, True, True])
+
+        self.user.night_start = datetime.time(5)
+        self.assertEqual(list(self.user.time_index('call')['night']), [False, False, True])
+
+        self.user.call_records = self.records[:2]
+        self.assertEqual(len(self.user.time_index('call')['night']), 2)
+
+    def test_columnar_batches(self):
+        user = bc.User(columnar=True)
+        user.call_records = self.records
+        groups = list(group_records(user, 'call', groupby='week', part_of_day='day'))
+        self.assertFalse(any(isinstance(g, list) for g in groups))
+        self.assertEqual([[r._key() for r in g] for g in groups],
+                         [[r._key() for r in g] for g in group_records(self.user, 'call', groupby='week', part_of_day='day')])
+
+    def test_bins(self):
+        grouping = group_records(self.user, 'call', groupby='day')
+        self.assertEqual([len(g) for g in grouping], [1, 1] + [0] * 6 + [1])
+
+        grouping = group_records(self.user, 'call', groupby='week')
+        self.assertEqual([len(g) for g in grouping], [1, 1, 1])
+
+        grouping = group_records(self.user, 'call', groupby=datetime.timedelta(hours=12))
+        self.assertEqual([len(g) for g in grouping], [1, 0, 1] + [0] * 12 + [1])
+
+    def test_group_cache(self):
+        groups = list(group_records(self.user, 'call', groupby='week'))
+        self.assertEqual((self.user.group_cache_hits, self.user.group_cache_misses), (0, 1))
+
+        self.assertEqual(list(group_records(self.user, 'call', groupby='week')), groups)
+        self.assertIs(list(group_records(self.user, 'call', groupby='week'))[0], groups[0])
+        self.assertEqual((self.user.group_cache_hits, self.user.group_cache_misses), (2, 1))
+
+        self.user.weekend = [7]
+        list(group_records(self.user, 'call', groupby='week'))
+        self.user.call_records = self.records[1:]
+        self.assertEqual(len(list(group_records(self.user, 'call', groupby=None))[0]), 2)
+        self.assertEqual(self.user.group_cache_misses, 3)
+
+    def test_group_cache_size(self):
+        self.user.group_cache_size = 2
+        for groupby in [None, 'day', 'week', 'day']:
+            list(group_records(self.user, 'call', groupby=groupby))
+        self.assertEqual(len(self.user._group_cache), 2)
+        self.assertEqual(self.user.group_cache_misses, 3)
+
+
+class ExecutionPlanTests(unittest.TestCase):
+    def setUp(self):
+        self.user = bc.User()
+        self.user.call_records = [
+            bc.io.CallRecord(interaction='call', direction=d, correspondent_id=c,
+                             datetime=datetime.datetime(2014, 8, 20 + i, 3 * i, 0), duration=10 * i)
+            for i, (d, c) in enumerate([('in', '1'), ('out', '2'), ('out', '1'), ('in', '3')])]
+        self.user.text_records = [
+            bc.io.TextRecord(interaction='text', direction='out', correspondent_id='1',
+                             datetime=datetime.datetime(2014, 8, 20, 0, 30))]
+        self.functions = [(bc.individual.number_of_contacts, 'distribution_scalar'),
+                          (bc.individual.percent_initiated_conversations, 'distribution_summarystats'),
+                          (bc.individual.duration, 'distribution_scalar'),
+                          (bc.individual.number_of_interactions, 'distribution_scalar')]
+
+    def test_results(self):
+        for groupby, summary in [('week', 'default'), (None, 'extended'), ('day', 'extended')]:
+            plan = bc.helper.group.ExecutionPlan(self.user, groupby=groupby, split_week=True, split_day=True)
+            # Ungrouped indicators return a single value
+            functions = [(f, t if groupby else t.replace('distribution_', ''))
+                         for f, t in self.functions]
+            for fun, datatype in functions:
+                plan.add(fun, datatype)
+            results = list(plan.run(summary=summary))
+            self.assertEqual([name for name, _, _ in results], [f.__name__ for f, _ in self.functions])
+
+            for (fun, datatype), (_, metric, _) in zip(functions, results):
+                kwargs = dict(groupby=groupby, datatype=datatype, split_week=True, split_day=True)
+                try:
+                    expected = fun(self.user, summary=summary, **kwargs)
+                except ValueError:
+                    expected = fun(self.user, **kwargs)
+                self.assertEqual(metric, expected)
+
+    def test_shared_groups(self):
+        plan = bc.helper.group.ExecutionPlan(self.user, split_week=True)
+        for fun, datatype in self.functions:
+            plan.add(fun, datatype)
+        list(plan.run())
+        interactions = [('call',), ('text',), ('text', 'call')]
+        self.assertEqual(sorted(plan.groups), sorted((i, part, 'allday') for i in interactions
+                                                     for part in ['allweek', 'weekday', 'weekend']))
+        self.assertEqual(self.user.group_cache_misses, 9)
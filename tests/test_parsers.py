@@ -9,7 +9,12 @@ from StringIO import StringIO
 import sys
 import datetime
 import csv
+import gzip
+import bz2
+import subprocess
 import os
+import shutil
+import tempfile
 
 class TestParsers(unittest.TestCase):
     @classmethod
@@ -76,3 +81,312 @@ class TestParsers(unittest.TestCase):
             'is_subscriber': 'True',
             'individual_id': '7atr8f53fg41'
         })
+
+
+class TestNetworkMatching(unittest.TestCase):
+    def test_has_match(self):
+        start = datetime.datetime(2014, 3, 2, 10)
+        records = [bc.io.CallRecord(interaction='call', direction=d, correspondent_id='A',
+                                    datetime=start + datetime.timedelta(seconds=s), duration=dur)
+                   for d, s, dur in [('in', 0, 10), ('out', 29, 10), ('out', 30, 10),
+                                     ('in', 45, 10), ('out', 50, 20), ('in', 200, 20)]]
+        others = [bc.io.CallRecord(interaction='call', direction=d, correspondent_id='B',
+                                   datetime=start + datetime.timedelta(seconds=s), duration=10)
+                  for d, s in [('out', -29), ('in', 15), ('in', 59), ('out', 75)]]
+        texts = [bc.io.TextRecord(interaction='text', direction='out', correspondent_id='B',
+                                  datetime=start)]
+
+        index = bc.io._match_index(records)
+        for r in records + others + texts:
+            self.assertEqual(bc.io._has_match(r, index), r.has_match(records), r)
+
+    def test_has_match_timestamps(self):
+        # Records of a user have a timestamp, and the window keeps microseconds
+        start = datetime.datetime(2014, 3, 2, 10, 0, 0, 900000)
+        user = bc.User()
+        user.call_records = [bc.io.CallRecord(interaction='call', direction='in', correspondent_id='A',
+                                              datetime=start, duration=10)]
+        others = [bc.io.CallRecord(interaction='call', direction='out', correspondent_id='B',
+                                   datetime=start + datetime.timedelta(microseconds=us), duration=10)
+                  for us in [29999999, 30000000, 29200000]]
+        index = bc.io._match_index(user.call_records)
+        self.assertEqual([bc.io._has_match(r, index) for r in others], [True, False, True])
+        self.assertEqual([r.has_match(user.call_records) for r in others], [True, False, True])
+
+
+class TestLazyNetwork(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        files = {
+            ('call', 'ego'): ["call,out,A,2014-03-02 10:00:00,5",
+                              "call,out,B,2014-03-02 11:00:00,5",
+                              "call,in,C,2014-03-02 12:00:00,5"],
+            ('call', 'A'): ["call,in,ego,2014-03-02 10:00:00,5",
+                            "call,out,B,2014-03-02 13:00:00,5"],
+            ('call', 'B'): ["call,in,A,2014-03-02 13:00:00,5"],
+            ('text', 'ego'): ["text,out,A,2014-03-02 09:00:00,"],
+            ('text', 'A'): ["text,in,ego,2014-03-02 09:00:00,"]
+        }
+        for (interaction, name), lines in files.items():
+            if not os.path.isdir(os.path.join(self.dir, interaction)):
+                os.mkdir(os.path.join(self.dir, interaction))
+            with open(os.path.join(self.dir, interaction, name + '.csv'), 'w') as f:
+                f.write("interaction,direction,correspondent_id,datetime,duration\n")
+                f.write("\n".join(lines))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _read(self, network):
+        return bc.read_csv('ego', os.path.join(self.dir, 'call'), os.path.join(self.dir, 'text'),
+                           network=network, describe=False, warnings=False,
+                           network_cache=bc.cache.UserCache(max_users=0))
+
+    def test_lazy(self):
+        user = self._read('lazy')
+        self.assertFalse(user.network.loaded)
+        self.assertEqual(list(user.network), ['A', 'B', 'C'])
+        self.assertEqual([user.network.exists(c) for c in 'ABC'], [True, True, False])
+        self.assertEqual(user.percent_outofnetwork_contacts, 1 / 3.)
+        self.assertEqual(len(user.call_records), 3)
+
+        bc.individual.number_of_contacts(user)
+        self.assertFalse(user.network.loaded)
+
+        # Loading the network removes the call to B, which is not reciprocated
+        self.assertEqual(len(user.network['A'].call_records), 2)
+        self.assertEqual(len(user.network['A'].text_records), 1)
+        self.assertIsNone(user.network['C'])
+        self.assertTrue(user.network_call.loaded)
+        self.assertEqual(len(user.call_records), 2)
+        self.assertEqual(user.percent_outofnetwork_calls, 1 / 2.)
+
+    def test_same_network(self):
+        lazy, eager = self._read('lazy'), self._read(True)
+        self.assertEqual(list(lazy.network), list(eager.network))
+        for c_id in lazy.network:
+            if eager.network[c_id] is None:
+                self.assertIsNone(lazy.network[c_id])
+                continue
+            for interaction in ['call', 'text']:
+                records = lambda u: [r._key() for r in getattr(u.network[c_id], interaction + '_records')]
+                self.assertEqual(records(lazy), records(eager))
+        self.assertEqual([r._key() for r in lazy.call_records],
+                         [r._key() for r in eager.call_records])
+
+    def test_same_indicators(self):
+        lazy, eager = self._read('lazy'), self._read(True)
+        self.assertEqual(bc.utils.all(lazy, network=True, flatten=True),
+                         bc.utils.all(eager, network=True, flatten=True))
+
+
+class TestCompressedInput(unittest.TestCase):
+    content = ("interaction,direction,correspondent_id,datetime,duration\n"
+               "call,in,A,2014-03-02 10:00:00,12\n"
+               "call,out,B,2014-03-01 10:00:00,1\n")
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        for name in ['plain', 'gz', 'bz2', 'xz', 'attributes']:
+            os.mkdir(os.path.join(self.dir, name))
+
+        path = lambda name, ext: os.path.join(self.dir, name, 'u1.csv' + ext)
+        with open(path('plain', ''), 'w') as f:
+            f.write(self.content)
+        with gzip.open(path('gz', '.gz'), 'wb') as f:
+            f.write(self.content)
+        with gzip.open(path('attributes', '.gz'), 'wb') as f:
+            f.write("key,value\nage,25\n")
+        f = bz2.BZ2File(path('bz2', '.bz2'), 'wb')
+        f.write(self.content)
+        f.close()
+        try:
+            subprocess.check_call(['xz', '-k', path('plain', '')])
+            os.rename(path('plain', '.xz'), path('xz', '.xz'))
+            self.xz = True
+        except OSError:
+            self.xz = False
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _read(self, name):
+        return bc.read_csv('u1', os.path.join(self.dir, name), describe=False, warnings=False,
+                           attributes_path=os.path.join(self.dir, 'attributes'))
+
+    def test_read_csv(self):
+        expected = [r._key() for r in self._read('plain').call_records]
+        self.assertEqual(len(expected), 2)
+        for name in ['gz', 'bz2', 'xz'] if self.xz else ['gz', 'bz2']:
+            user = self._read(name)
+            self.assertEqual([r._key() for r in user.call_records], expected)
+            self.assertEqual(user.attributes, {'age': '25'})
+
+    def test_read_stream(self):
+        content = "user_id," + self.content.replace("\n", "\nu1,").rstrip("u1,")
+        path = os.path.join(self.dir, 'records.csv.gz')
+        with gzip.open(path, 'wb') as f:
+            f.write(content)
+        users = list(bc.io.read_stream(path))
+        self.assertEqual(len(users[0].call_records), 2)
+
+    def test_gzip_output(self):
+        path = os.path.join(self.dir, 'output.csv.gz')
+        for append in [False, True]:
+            f = bc.io._open_output(path, append=append)
+            # The gzip file owns, and closes, the file it writes to
+            inner = f.myfileobj
+            self.assertIs(inner, f.fileobj)
+            f.write(self.content)
+            f.close()
+            self.assertTrue(inner.closed)
+        with gzip.open(path) as f:
+            self.assertEqual(f.read(), self.content * 2)
+
+
+class TestFilterRecord(unittest.TestCase):
+    content = "\n".join([
+        "interaction,direction,correspondent_id,datetime,duration,position,event",
+        "call,in,A,2014-03-02 10:00:00,12,,",
+        "call,up,,2014-03-02 11:00:00,3,,",
+        "text,out,B,2014-03-02 09:00:00,,,",
+        "stop,,,2014-03-01 23:59:59,3600,s1,",
+        "call,in,A,2014-03-02 10:00:00,12,,"
+    ])
+
+    def _records(self):
+        return bc.io.read_records(StringIO(self.content)) + [bc.io.CallRecord(
+            interaction='call', direction='out', correspondent_id='B',
+            datetime=datetime.datetime(2014, 3, 2, 12), duration=None)]
+
+    def test_validator(self):
+        records = self._records()
+        for interaction, scheme in bc.io.TYPE_SCHEME.items():
+            validate = bc.io._validator(interaction)
+            for r in records:
+                expected = tuple(key for key in bc.io._FIELD_ORDER if key in scheme
+                                 and not scheme[key](Record(**dict(
+                                     (f, getattr(r, f, None)) for f in bc.io._FIELD_ORDER))))
+                self.assertEqual(validate(r), expected)
+
+        # Missing fields are tested as None
+        record = bc.io.CallRecord(interaction='call', direction='in', datetime=datetime.datetime.now())
+        self.assertEqual(bc.io._validator('call')(record), ('correspondent_id', 'duration'))
+
+    def test_columnar(self):
+        records, ignored, bad = bc.io.filter_record(self._records(), 'call')
+        self.assertEqual(len(records), 1)
+        self.assertEqual(ignored, {'all': 4, 'interaction': 2, 'direction': 2,
+                                   'correspondent_id': 1, 'duration': 2, 'datetime': 0,
+                                   'position': 0, 'event': 0})
+        self.assertEqual(len(bad), 4)
+
+        columnar = bc.columnar.ColumnarRecords.from_records(self._records(),
+                                                            bc.columnar.StringTable())
+        c_records, c_ignored, c_bad = bc.io.filter_record(columnar, 'call')
+        self.assertEqual([r._key() for r in c_records], [r._key() for r in records])
+        self.assertEqual(c_ignored, ignored)
+        # Invalid directions are stored as missing in columns
+        self.assertEqual([(r.interaction, r.datetime) for r in c_bad],
+                         [(r.interaction, r.datetime) for r in bad])
+
+
+class TestReadRecords(unittest.TestCase):
+    content = "\n".join([
+        "interaction,direction,correspondent_id,datetime,duration,position,event",
+        "call,in,A,2014-03-02 10:00:00,12,,",
+        "text,out,B,2014-03-02 09:00:00,,,",
+        "",
+        "call,out,A,2014-3-2 8:05:09,0,,",
+        "stop,,,2014-03-01 23:59:59,3600,s1,campus",
+        "call,out,,2014-03-02 11:00:00,7"
+    ])
+
+    def test_same_records(self):
+        expected = map(bc.io._parse_record, csv.DictReader(StringIO(self.content)))
+        records = bc.io.read_records(StringIO(self.content))
+        self.assertEqual([type(r).__name__ for r in records],
+                         [type(r).__name__ for r in expected])
+        self.assertEqual(records, expected)
+
+        columnar = bc.io.read_records(StringIO(self.content), columnar=True)
+        self.assertEqual([r._key() for r in columnar], [r._key() for r in expected])
+
+    def test_errors(self):
+        for content in ["interaction,datetime,duration\nscreen,2014-03-02 10:00:00,\n",
+                        "interaction,datetime,duration\nscreen,2014-03-02 10:00,1\n",
+                        "interaction,datetime\nscreen,2014-03-02 10:00:00\n"]:
+            for columnar in [False, True]:
+                self.assertRaises((ValueError, KeyError), bc.io.read_records,
+                                  StringIO(content), columnar)
+
+    def test_same_errors(self):
+        header = "interaction,direction,correspondent_id,datetime,duration\n"
+        for row in ["call,in,A,-014-01-01 10:00:00,1", "call,in,A,0000-01-01 10:00:00,1",
+                    "sms,in,A,2014-03-02 10:00:00,1"]:
+            content = header + row + "\n"
+            try:
+                map(bc.io._parse_record, csv.DictReader(StringIO(content)))
+            except Exception as e:
+                expected = type(e)
+            for columnar in [False, True]:
+                self.assertRaises(expected, bc.io.read_records, StringIO(content), columnar)
+
+    def test_empty(self):
+        self.assertEqual(bc.io.read_records(StringIO("")), [])
+        self.assertEqual(len(bc.io.read_records(StringIO("interaction,datetime\n"), columnar=True)), 0)
+
+
+class TestReadStream(unittest.TestCase):
+    content = "\n".join([
+        "user_id,interaction,direction,correspondent_id,datetime,duration",
+        "u2,call,in,A,2014-03-02 10:00:00,12",
+        "u1,text,out,B,2014-03-02 09:00:00,",
+        "u2,text,in,B,2014-03-01 09:00:00,",
+        "u1,call,out,,2014-03-02 11:00:00,7",
+        "u3,call,out,A,2014-03-02 11:00:00,7",
+        "u1,text,in,A,2014-03-01 09:00:00,"
+    ])
+
+    def setUp(self):
+        self.file = tempfile.NamedTemporaryFile()
+        self.file.write(self.content)
+        self.file.flush()
+
+    def _summary(self, users):
+        return [(u.name, [r._key() for r in u.call_records],
+                 [r._key() for r in u.text_records], u.ignored_records) for u in users]
+
+    def test_external_sort(self):
+        users = list(bc.io.read_stream(self.file.name, run_size=2))
+        self.assertEqual([u.name for u in users], ['u1', 'u2', 'u3'])
+        self.assertEqual(users[0].ignored_records['call']['correspondent_id'], 0)
+        self.assertEqual([r.datetime.day for r in users[0].text_records], [1, 2])
+        self.assertIsNone(users[2].ignored_records['text'])
+
+        columnar = list(bc.io.read_stream(self.file.name, run_size=4, columnar=True))
+        self.assertEqual(self._summary(columnar), self._summary(users))
+
+    def test_merge_levels(self):
+        rows = iter([[str(k % 7), str(k)] for k in range(50)])
+        runs = bc.io._sorted_runs(rows, 0, 2, None, fan_in=3)
+        self.assertLessEqual(len(runs), 3)
+
+        merged = list(bc.io._merge_runs(runs, 0))
+        self.assertEqual(merged, sorted([[str(k % 7), str(k)] for k in range(50)],
+                                        key=lambda row: row[0]))
+
+        users = list(bc.io.read_stream(self.file.name, run_size=1, fan_in=2))
+        self.assertEqual(self._summary(users), self._summary(bc.io.read_stream(self.file.name)))
+
+    def test_grouped(self):
+        lines = self.content.split("\n")
+        grouped = tempfile.NamedTemporaryFile()
+        grouped.write("\n".join(lines[:1] + sorted(lines[1:], key=lambda l: l[:2])))
+        grouped.flush()
+
+        users = list(bc.io.read_stream(grouped.name, grouped=True))
+        self.assertEqual(self._summary(users),
+                         self._summary(bc.io.read_stream(self.file.name)))
+
+        self.assertRaises(ValueError, list, bc.io.read_stream(self.file.name, grouped=True))
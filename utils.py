@@ -1,9 +1,8 @@
 from bandicoot_dev.helper.tools import OrderedDict, warning_str, Inc_avg
-from bandicoot_dev.helper.group import group_records, DATE_GROUPERS
+from bandicoot_dev.helper.group import group_records, bin_column, ExecutionPlan
 import bandicoot_dev as bc
 
 from functools import partial
-from datetime import datetime as dt
 
 
 def flatten(d, parent_key='', separator='__'):
@@ -90,13 +89,18 @@ def all(user, groupby='week', summary='default', dist=False, network=False, spat
     number of records with faulty values for each columns.
     """
 
+    # Loading a lazy network removes the user's records which are not
+    # reciprocated, so it is loaded before computing any indicator
+    if network and isinstance(user.network, bc.core.LazyNetwork):
+        user.network.load()
+
     # Warn the user if they are selecting weekly and there's only one week
     if groupby is not None:
-        record_types = [user.call_records, user.text_records, user.physical_records, user.screen_records, user.stop_records]
-        for records in record_types:
-            if len(records) < 1:
+        for interaction in ['call', 'text', 'physical', 'screen', 'stop']:
+            bins = bin_column(user.time_index(interaction), groupby)
+            if len(bins) < 1:
                 continue
-            if len(set(DATE_GROUPERS[groupby](r.datetime) for r in records)) <= 1:
+            if len(set(bins)) <= 1:
                 print warning_str('Grouping by {0}, but all data is from the same {0}!'.format(groupby))
     scalar_type = 'distribution_scalar' if not dist else 'scalar'
     summary_type = 'distribution_summarystats' if not dist else 'summarystats'
@@ -202,28 +206,19 @@ def all(user, groupby='week', summary='default', dist=False, network=False, spat
     else:
         functions = individual_functions
 
-    fun_times = dict()
+    # Records are grouped once for all the indicators
+    plan = ExecutionPlan(user, groupby=groupby, split_week=split_week, split_day=split_day)
     for fun, datatype in functions:
-        start = dt.now()
-        try:
-            metric = fun(
-                user, groupby=groupby, summary=summary, datatype=datatype,
-                split_week=split_week, split_day=split_day
-            )
-        except ValueError:
-            metric = fun(
-                user, groupby=groupby, datatype=datatype,
-                split_week=split_week, split_day=split_day
-            )
-            
+        plan.add(fun, datatype)
+
+    fun_times = dict()
+    for name, metric, indicator_time in plan.run(summary=summary):
         if len(metric) < 1:
             continue
-        
-        indicator_time = (dt.now() - start).microseconds * 1e-6
 
-        fun_times[fun.__name__] = indicator_time
-        returned[fun.__name__] = metric
-    
+        fun_times[name] = indicator_time
+        returned[name] = metric
+
     for n, t in sorted(fun_times.items(), key=lambda x: x[1])[-5:]:
         print warning_str("%s is slow - time: %.2f" % (n, t))
 